@@ -0,0 +1,358 @@
+"""This module contains a compact binary serialization of infrasys based systems.
+
+The binary file holds the same data model as the JSON file written by `to_json`, so reading it
+goes through the same `from_dict` path, including data format upgrades. Components are
+packed by schema, i.e. the field names and metadata of a component type are stored once and
+every component is a row of values. Composed component references and quantities are
+replaced by compact tagged lists, unit names and types are stored once in lookup tables and
+quantity arrays are stored as raw numpy buffers. The payload is compressed with zstd when the
+`zstandard` package is installed, with zlib otherwise.
+"""
+
+from pathlib import Path
+from typing import Any, Callable
+import struct
+import zlib
+
+from infrasys.exceptions import ISConflictingArguments, ISFileExists
+from infrasys.utils.sqlite import backup
+from loguru import logger
+import numpy as np
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+MAGIC = b"GDMB"
+FORMAT_VERSION = 1
+
+_COMPONENT = "\x00c"
+_QUANTITY = "\x00q"
+_ARRAY_QUANTITY = "\x00a"
+_ESCAPED_LIST = "\x00l"
+
+_QUANTITY_KEYS = {"value", "units", "__metadata__"}
+_QUANTITY_METADATA_KEYS = {"module", "type", "serialized_type"}
+_COMPONENT_METADATA_KEYS = {"module", "type", "serialized_type", "uuid"}
+
+
+def _compress_zlib(payload: bytes) -> bytes:
+    return zlib.compress(payload, 1)
+
+
+def _compress_zstd(payload: bytes) -> bytes:
+    return zstandard.ZstdCompressor().compress(payload)
+
+
+def _decompress_zstd(payload: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+
+_CODECS: dict[str, tuple[int, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "none": (0, bytes, bytes),
+    "zlib": (1, _compress_zlib, zlib.decompress),
+    "zstd": (2, _compress_zstd, _decompress_zstd),
+}
+
+
+def _get_codec(compression: str | None) -> tuple[str, int, Callable[[bytes], bytes]]:
+    if compression is None:
+        compression = "zstd" if zstandard is not None else "zlib"
+    if compression not in _CODECS:
+        msg = f"Unsupported {compression=}, choose one of {list(_CODECS)}."
+        raise ValueError(msg)
+    if compression == "zstd" and zstandard is None:
+        msg = "zstd compression requires the zstandard package: pip install zstandard"
+        raise ImportError(msg)
+    codec_id, compress, _ = _CODECS[compression]
+    return compression, codec_id, compress
+
+
+class _Packer:
+    """Replaces the repeated parts of serialized components by indices into lookup tables."""
+
+    def __init__(self):
+        self.schemas: dict[tuple[bytes, tuple[str, ...]], int] = {}
+        self.types: dict[tuple[str, str], int] = {}
+        self.units: dict[str, int] = {}
+        self.arrays: list[list] = []
+        self.buffers: list[bytes] = []
+        self.offset = 0
+
+    def _index(self, table: dict, key: Any) -> int:
+        index = table.get(key)
+        if index is None:
+            index = table[key] = len(table)
+        return index
+
+    def _pack_array(self, value: list) -> int | None:
+        """Stores a list of numbers as a numpy buffer if it converts back identically."""
+        if not value:
+            return None
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return None
+        if array.dtype.kind not in "if" or orjson.dumps(array.tolist()) != orjson.dumps(value):
+            return None
+        data = np.ascontiguousarray(array).tobytes()
+        self.arrays.append([array.dtype.str, list(array.shape), self.offset])
+        self.buffers.append(data)
+        self.offset += len(data)
+        return len(self.arrays) - 1
+
+    def pack_value(self, value: Any) -> Any:
+        if isinstance(value, list):
+            items = [self.pack_value(item) for item in value]
+            if items and isinstance(items[0], str) and items[0].startswith("\x00"):
+                return [_ESCAPED_LIST, *items]
+            return items
+        if not isinstance(value, dict):
+            return value
+
+        metadata = value.get("__metadata__")
+        if isinstance(metadata, dict):
+            serialized_type = metadata.get("serialized_type")
+            if (
+                serialized_type == "composed_component"
+                and len(value) == 1
+                and metadata.keys() == _COMPONENT_METADATA_KEYS
+            ):
+                type_id = self._index(self.types, (metadata["module"], metadata["type"]))
+                return [_COMPONENT, type_id, metadata["uuid"]]
+            if (
+                serialized_type == "quantity"
+                and value.keys() == _QUANTITY_KEYS
+                and metadata.keys() == _QUANTITY_METADATA_KEYS
+                and isinstance(value["units"], str)
+            ):
+                type_id = self._index(self.types, (metadata["module"], metadata["type"]))
+                unit_id = self._index(self.units, value["units"])
+                magnitude = value["value"]
+                array_id = self._pack_array(magnitude) if isinstance(magnitude, list) else None
+                if array_id is not None:
+                    return [_ARRAY_QUANTITY, type_id, unit_id, array_id]
+                return [_QUANTITY, type_id, unit_id, self.pack_value(magnitude)]
+        return {key: self.pack_value(item) for key, item in value.items()}
+
+    def pack_record(self, record: dict[str, Any]) -> list:
+        """Returns a component as its schema index followed by its field values."""
+        schema = (orjson.dumps(record.get("__metadata__")), tuple(record))
+        values = [self.pack_value(item) for key, item in record.items() if key != "__metadata__"]
+        return [self._index(self.schemas, schema), *values]
+
+    def tables(self) -> dict[str, Any]:
+        return {
+            "schemas": [[orjson.loads(metadata), list(keys)] for metadata, keys in self.schemas],
+            "types": [list(key) for key in self.types],
+            "units": list(self.units),
+            "arrays": self.arrays,
+        }
+
+
+class _Unpacker:
+    """Reverses `_Packer`."""
+
+    def __init__(self, tables: dict[str, Any], buffer: memoryview):
+        self.schemas = tables["schemas"]
+        self.types = tables["types"]
+        self.units = tables["units"]
+        self.arrays = tables["arrays"]
+        self.buffer = buffer
+
+    def _unpack_array(self, array_id: int) -> list:
+        dtype, shape, offset = self.arrays[array_id]
+        count = int(np.prod(shape)) if shape else 1
+        array = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+        return array.reshape(shape).tolist()
+
+    def unpack_value(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: self.unpack_value(item) for key, item in value.items()}
+        if not isinstance(value, list):
+            return value
+        tag = value[0] if value and isinstance(value[0], str) else None
+        if tag == _COMPONENT:
+            module, type_name = self.types[value[1]]
+            return {
+                "__metadata__": {
+                    "module": module,
+                    "type": type_name,
+                    "serialized_type": "composed_component",
+                    "uuid": value[2],
+                }
+            }
+        if tag in (_QUANTITY, _ARRAY_QUANTITY):
+            module, type_name = self.types[value[1]]
+            magnitude = (
+                self._unpack_array(value[3])
+                if tag == _ARRAY_QUANTITY
+                else self.unpack_value(value[3])
+            )
+            return {
+                "value": magnitude,
+                "units": self.units[value[2]],
+                "__metadata__": {
+                    "module": module,
+                    "type": type_name,
+                    "serialized_type": "quantity",
+                },
+            }
+        if tag == _ESCAPED_LIST:
+            value = value[1:]
+        return [self.unpack_value(item) for item in value]
+
+    def unpack_record(self, row: list) -> dict[str, Any]:
+        metadata, keys = self.schemas[row[0]]
+        values = iter(row[1:])
+        return {
+            key: dict(metadata) if key == "__metadata__" else self.unpack_value(next(values))
+            for key in keys
+        }
+
+
+def pack_system_data(system_data: dict[str, Any], compression: str | None = None) -> bytes:
+    """Encodes the serialized form of a system, as written by `to_json`, into bytes.
+
+    Parameters
+    ----------
+    system_data : dict[str, Any]
+        System data in serialized form.
+    compression : str, optional
+        "zstd", "zlib" or "none", by default zstd if zstandard is installed, zlib otherwise.
+
+    Returns
+    -------
+    bytes
+        Header followed by the compressed payload.
+    """
+    _, codec_id, compress = _get_codec(compression)
+    packer = _Packer()
+    data = {
+        key: value
+        for key, value in system_data.items()
+        if key not in ("components", "supplemental_attributes")
+    }
+    data["components"] = [packer.pack_record(x) for x in system_data["components"]]
+    data["supplemental_attributes"] = [
+        packer.pack_record(x) for x in system_data["supplemental_attributes"]
+    ]
+    data["__tables__"] = packer.tables()
+    structure = orjson.dumps(data)
+    payload = b"".join([struct.pack("<Q", len(structure)), structure, *packer.buffers])
+    return MAGIC + struct.pack("<BB", FORMAT_VERSION, codec_id) + compress(payload)
+
+
+def unpack_system_data(content: bytes) -> dict[str, Any]:
+    """Decodes bytes written by `pack_system_data` into the serialized form of a system."""
+    if content[:4] != MAGIC:
+        msg = "Not a binary GDM system file."
+        raise ValueError(msg)
+    version, codec_id = struct.unpack_from("<BB", content, 4)
+    if version > FORMAT_VERSION:
+        msg = f"Binary format version {version} is newer than the supported {FORMAT_VERSION}."
+        raise ValueError(msg)
+    name = next(name for name, codec in _CODECS.items() if codec[0] == codec_id)
+    if name == "zstd" and zstandard is None:
+        msg = "Reading zstd compressed files requires the zstandard package."
+        raise ImportError(msg)
+    payload = memoryview(_CODECS[name][2](content[6:]))
+    (length,) = struct.unpack_from("<Q", payload)
+    data = orjson.loads(payload[8 : 8 + length])
+    unpacker = _Unpacker(data.pop("__tables__"), payload[8 + length :])
+    data["components"] = [unpacker.unpack_record(x) for x in data["components"]]
+    data["supplemental_attributes"] = [
+        unpacker.unpack_record(x) for x in data["supplemental_attributes"]
+    ]
+    return data
+
+
+def serialize_system_data(system, filename: Path, overwrite: bool) -> dict[str, Any]:
+    """Returns the serialized form of a system written by `to_json` and writes its time series.
+
+    The system data is built the same way as in infrasys `System.to_json`, but it is neither
+    encoded to JSON nor written to a file. Time series are written to a directory at the same
+    level as filename, like `to_json`.
+    """
+    if filename.exists() and not overwrite:
+        msg = f"{filename=} already exists. Choose a different path or set overwrite=True."
+        raise ISFileExists(msg)
+
+    filename.parent.mkdir(exist_ok=True)
+    time_series_dir = filename.parent / (filename.stem + "_time_series")
+    time_series_dir.mkdir(exist_ok=True)
+    system_data: dict[str, Any] = {
+        "name": system.name,
+        "description": system.description,
+        "uuid": str(system.uuid),
+        "data_format_version": system.data_format_version,
+        "components": [x.model_dump_custom() for x in system._component_mgr.iter_all()],
+        "supplemental_attributes": [
+            x.model_dump_custom() for x in system._supplemental_attr_mgr.iter_all()
+        ],
+        "time_series": {"directory": time_series_dir.name},
+    }
+    extra = system.serialize_system_attributes()
+    intersection = set(extra).intersection(system_data)
+    if intersection:
+        msg = f"Extra attributes from parent class collide with System: {intersection}"
+        raise ISConflictingArguments(msg)
+    system_data.update(extra)
+
+    backup(system._con, time_series_dir / system.DB_FILENAME)
+    system._time_series_mgr.serialize(
+        system_data["time_series"], time_series_dir, db_name=system.DB_FILENAME
+    )
+    return system_data
+
+
+class BinarySerializationMixin:
+    """Adds `to_binary` and `from_binary` to infrasys `System` subclasses."""
+
+    def to_binary(
+        self, filename: Path | str, overwrite: bool = False, compression: str | None = None
+    ) -> None:
+        """Write the system to a compressed binary file.
+
+        Time series are written to a directory at the same level as filename, like `to_json`.
+
+        Parameters
+        ----------
+        filename : Path | str
+            Filename to write. If the parent directory does not exist, it will be created.
+        overwrite : bool
+            Set to True to overwrite the file if it already exists.
+        compression : str, optional
+            "zstd", "zlib" or "none", by default zstd if zstandard is installed, zlib
+            otherwise.
+
+        Examples
+        --------
+        >>> system.to_binary("systems/system1.gdmb")
+        """
+        filename = Path(filename)
+        system_data = serialize_system_data(self, filename, overwrite)
+        filename.write_bytes(pack_system_data(system_data, compression))
+        logger.info("Wrote system data to {}", filename)
+
+    @classmethod
+    def from_binary(cls, filename: Path | str, upgrade_handler: Callable | None = None, **kwargs):
+        """Deserialize a system from a file written by `to_binary`.
+
+        Parameters
+        ----------
+        filename : Path | str
+            Binary file containing the system data.
+        upgrade_handler : Callable | None
+            Optional function to handle data format upgrades, same as in `from_json`.
+
+        Examples
+        --------
+        >>> system = DistributionSystem.from_binary("systems/system1.gdmb")
+        """
+        data = unpack_system_data(Path(filename).read_bytes())
+        return cls.from_dict(
+            data, Path(filename).parent, upgrade_handler=upgrade_handler, **kwargs
+        )
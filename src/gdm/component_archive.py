@@ -0,0 +1,344 @@
+"""This module contains a compressed component archive supporting random access.
+
+Components are grouped by type and stored in independently compressed blocks, followed by a
+footer with the system attributes and an index of every component by UUID, type and name.
+Looking up a component or scanning a type only decompresses the blocks holding them and the
+components they refer to. The file layout is::
+
+    MAGIC | format version | codec | block ... | footer | footer offset | footer size | MAGIC
+"""
+
+from collections import OrderedDict, defaultdict
+from importlib import import_module
+from pathlib import Path
+from typing import Any, Callable, Iterator, Type
+from uuid import UUID
+import importlib.metadata
+import mmap
+import struct
+
+from infrasys import Component
+from infrasys.exceptions import ISNotStored, ISOperationNotAllowed
+from infrasys.serialization import TYPE_METADATA, SerializedType
+from loguru import logger
+import orjson
+
+from gdm.binary_serialization import _CODECS, _get_codec, serialize_system_data, zstandard
+
+MAGIC = b"GDMA"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sBB")
+_TRAILER = struct.Struct("<QQ4s")
+
+
+def write_component_archive(
+    system_data: dict[str, Any],
+    filename: Path | str,
+    block_size: int = 256,
+    compression: str | None = None,
+) -> None:
+    """Writes the serialized form of a system, as written by `to_json`, to an archive.
+
+    Parameters
+    ----------
+    system_data : dict[str, Any]
+        System data in serialized form.
+    filename : Path | str
+        Archive file to write.
+    block_size : int, optional
+        Maximum number of components per compressed block, by default 256.
+    compression : str, optional
+        "zstd", "zlib" or "none", by default zstd if zstandard is installed, zlib otherwise.
+    """
+    _, codec_id, compress = _get_codec(compression)
+    by_type: dict[tuple[str, str], list[dict[str, Any]]] = defaultdict(list)
+    for record in system_data["components"]:
+        metadata = record[TYPE_METADATA]
+        by_type[(metadata["module"], metadata["type"])].append(record)
+
+    blocks: list[list[int]] = []
+    index: list[list] = []
+    with open(filename, "wb") as f_out:
+        f_out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, codec_id))
+        for (module, type_name), records in by_type.items():
+            for start in range(0, len(records), block_size):
+                block = records[start : start + block_size]
+                payload = compress(orjson.dumps(block))
+                block_id = len(blocks)
+                blocks.append([f_out.tell(), len(payload)])
+                f_out.write(payload)
+                index.extend(
+                    [record["uuid"], module, type_name, record.get("name"), block_id, position]
+                    for position, record in enumerate(block)
+                )
+
+        footer = {key: value for key, value in system_data.items() if key != "components"}
+        footer["__blocks__"] = blocks
+        footer["__index__"] = index
+        payload = compress(orjson.dumps(footer))
+        offset = f_out.tell()
+        f_out.write(payload)
+        f_out.write(_TRAILER.pack(offset, len(payload), MAGIC))
+
+
+class ComponentArchive:
+    """Reader of component archives giving access to single components and types.
+
+    Components are constructed and validated on request along with the components they refer
+    to. Constructed components are cached, so components sharing a reference share the same
+    object, and they are not attached to a system.
+
+    Parameters
+    ----------
+    filename : Path | str
+        Archive written by `to_archive`.
+    use_mmap : bool, optional
+        Read blocks through a memory map instead of file reads, by default False.
+    cache_size : int, optional
+        Number of decompressed blocks kept in memory, by default 16.
+
+    Examples
+    --------
+    >>> with ComponentArchive("feeders/feeder1.gdma") as archive:
+    ...     bus = archive.get_component(DistributionBus, "bus1")
+    ...     loads = list(archive.get_components(DistributionLoad))
+    """
+
+    def __init__(self, filename: Path | str, use_mmap: bool = False, cache_size: int = 16):
+        self.filename = Path(filename)
+        self._file = open(self.filename, "rb")
+        self._mmap = None
+        self._cache_size = cache_size
+        self._blocks_cache: OrderedDict[int, list[dict[str, Any]]] = OrderedDict()
+        self._components: dict[UUID, Component] = {}
+        self._types: dict[tuple[str, str], type] = {}
+        try:
+            if use_mmap:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._read_footer()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_footer(self) -> None:
+        magic, version, codec_id = _HEADER.unpack(self._read(0, _HEADER.size))
+        if magic != MAGIC:
+            msg = f"{self.filename} is not a component archive."
+            raise ValueError(msg)
+        if version > FORMAT_VERSION:
+            msg = f"Archive format version {version} is newer than the supported {FORMAT_VERSION}."
+            raise ValueError(msg)
+        name = next(name for name, codec in _CODECS.items() if codec[0] == codec_id)
+        if name == "zstd" and zstandard is None:
+            msg = "Reading zstd compressed archives requires the zstandard package."
+            raise ImportError(msg)
+        self._decompress = _CODECS[name][2]
+
+        size = self.filename.stat().st_size
+        offset, length, magic = _TRAILER.unpack(self._read(size - _TRAILER.size, _TRAILER.size))
+        if magic != MAGIC:
+            msg = f"{self.filename} is truncated."
+            raise ValueError(msg)
+        footer = orjson.loads(self._decompress(self._read(offset, length)))
+        self._blocks = footer.pop("__blocks__")
+        self._by_uuid: dict[UUID, tuple[int, int]] = {}
+        self._by_type: dict[tuple[str, str], list[UUID]] = defaultdict(list)
+        self._by_name: dict[tuple[str, str, str | None], list[UUID]] = defaultdict(list)
+        for uuid, module, type_name, name, block_id, position in footer.pop("__index__"):
+            uuid = UUID(uuid)
+            self._by_uuid[uuid] = (block_id, position)
+            self._by_type[(module, type_name)].append(uuid)
+            self._by_name[(module, type_name, name)].append(uuid)
+        self.system_data = footer
+
+    def __enter__(self) -> "ComponentArchive":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the archive file."""
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def _read(self, offset: int, length: int) -> bytes:
+        if self._mmap is not None:
+            return self._mmap[offset : offset + length]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def _get_block(self, block_id: int) -> list[dict[str, Any]]:
+        block = self._blocks_cache.get(block_id)
+        if block is None:
+            offset, length = self._blocks[block_id]
+            block = orjson.loads(self._decompress(self._read(offset, length)))
+            self._blocks_cache[block_id] = block
+            if len(self._blocks_cache) > self._cache_size:
+                self._blocks_cache.popitem(last=False)
+        else:
+            self._blocks_cache.move_to_end(block_id)
+        return block
+
+    def _get_type(self, module: str, type_name: str) -> type:
+        key = (module, type_name)
+        if key not in self._types:
+            self._types[key] = getattr(import_module(module), type_name)
+        return self._types[key]
+
+    def get_record(self, uuid: UUID) -> dict[str, Any]:
+        """Returns the serialized form of the component with the UUID."""
+        if uuid not in self._by_uuid:
+            msg = f"No component with {uuid=} is stored"
+            raise ISNotStored(msg)
+        block_id, position = self._by_uuid[uuid]
+        return self._get_block(block_id)[position]
+
+    def _convert(self, value: Any) -> Any:
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            return [self._convert(item) for item in value]
+        if not isinstance(value, dict) or TYPE_METADATA not in value:
+            return value
+        metadata = value[TYPE_METADATA]
+        if metadata["serialized_type"] == SerializedType.COMPOSED_COMPONENT.value:
+            return self.get_component_by_uuid(UUID(metadata["uuid"]))
+        if metadata["serialized_type"] == SerializedType.QUANTITY.value:
+            quantity_type = self._get_type(metadata["module"], metadata["type"])
+            return quantity_type(value["value"], value["units"])
+        return value
+
+    def _check_data_format_version(self) -> None:
+        version = self.system_data.get("data_format_version")
+        current_version = importlib.metadata.version("grid-data-models")
+        if version != current_version:
+            msg = (
+                f"{self.filename} has data format version {version}, components can only be "
+                f"constructed from version {current_version}. Use `from_archive` to upgrade it."
+            )
+            raise ISOperationNotAllowed(msg)
+
+    def get_component_by_uuid(self, uuid: UUID) -> Any:
+        """Returns the component with the UUID, constructing it on first access.
+
+        Raises
+        ------
+        ISOperationNotAllowed
+            Raised if the archive data format version is not the installed one, components
+            are not upgraded on this path.
+        """
+        component = self._components.get(uuid)
+        if component is None:
+            self._check_data_format_version()
+            record = self.get_record(uuid)
+            metadata = record[TYPE_METADATA]
+            component_type = self._get_type(metadata["module"], metadata["type"])
+            values = {
+                key: self._convert(value) for key, value in record.items() if key != TYPE_METADATA
+            }
+            component = self._components[uuid] = component_type(**values)
+        return component
+
+    def get_component(self, component_type: Type[Component], name: str) -> Any:
+        """Returns the component with the passed type and name.
+
+        Raises
+        ------
+        ISNotStored
+            Raised if no component matches the inputs.
+        ISOperationNotAllowed
+            Raised if more than one component match the inputs.
+        """
+        uuids = self._by_name.get((component_type.__module__, component_type.__name__, name))
+        if not uuids:
+            msg = f"{component_type.__name__}.{name} is not stored"
+            raise ISNotStored(msg)
+        if len(uuids) > 1:
+            msg = f"There is more than one {component_type} with {name=}."
+            raise ISOperationNotAllowed(msg)
+        return self.get_component_by_uuid(uuids[0])
+
+    def get_components(
+        self, *component_types: Type[Component], filter_func: Callable | None = None
+    ) -> Iterator[Any]:
+        """Returns the components of the types, including subtypes, block by block."""
+        for (module, type_name), uuids in self._by_type.items():
+            if not issubclass(self._get_type(module, type_name), component_types):
+                continue
+            for uuid in uuids:
+                component = self.get_component_by_uuid(uuid)
+                if filter_func is None or filter_func(component):
+                    yield component
+
+    def list_component_types(self) -> list[type]:
+        """Returns the types of the stored components."""
+        return [self._get_type(module, type_name) for module, type_name in self._by_type]
+
+    def get_num_components(self) -> int:
+        """Returns the number of stored components."""
+        return len(self._by_uuid)
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        """Returns the serialized form of every component, block by block."""
+        for block_id in range(len(self._blocks)):
+            yield from self._get_block(block_id)
+
+
+class ArchiveSerializationMixin:
+    """Adds `to_archive` and `from_archive` to infrasys `System` subclasses."""
+
+    def to_archive(
+        self,
+        filename: Path | str,
+        overwrite: bool = False,
+        block_size: int = 256,
+        compression: str | None = None,
+    ) -> None:
+        """Write the system to a component archive, see `ComponentArchive` to read it.
+
+        Time series are written to a directory at the same level as filename, like `to_json`.
+
+        Parameters
+        ----------
+        filename : Path | str
+            Filename to write. If the parent directory does not exist, it will be created.
+        overwrite : bool
+            Set to True to overwrite the file if it already exists.
+        block_size : int, optional
+            Maximum number of components per compressed block, by default 256. Smaller
+            blocks make single component lookups cheaper and compress less.
+        compression : str, optional
+            "zstd", "zlib" or "none", by default zstd if zstandard is installed, zlib
+            otherwise.
+
+        Examples
+        --------
+        >>> system.to_archive("feeders/feeder1.gdma")
+        """
+        filename = Path(filename)
+        system_data = serialize_system_data(self, filename, overwrite)
+        write_component_archive(system_data, filename, block_size, compression)
+        logger.info("Wrote system data to {}", filename)
+
+    @classmethod
+    def from_archive(cls, filename: Path | str, upgrade_handler: Callable | None = None, **kwargs):
+        """Deserialize a whole system from a file written by `to_archive`.
+
+        Parameters
+        ----------
+        filename : Path | str
+            Component archive containing the system data.
+        upgrade_handler : Callable | None
+            Optional function to handle data format upgrades, same as in `from_json`.
+
+        Examples
+        --------
+        >>> system = DistributionSystem.from_archive("feeders/feeder1.gdma")
+        """
+        with ComponentArchive(filename) as archive:
+            data = dict(archive.system_data)
+            data["components"] = list(archive.iter_records())
+        return cls.from_dict(
+            data, Path(filename).parent, upgrade_handler=upgrade_handler, **kwargs
+        )
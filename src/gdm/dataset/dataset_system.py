@@ -5,12 +5,13 @@ from uuid import UUID
 
 from infrasys import System, Component
 
+from gdm.binary_serialization import BinarySerializationMixin
 from gdm.exceptions import GDMIncompatibleInstanceError
 from gdm.dataset.cost_model import CostModel
 import gdm
 
 
-class DatasetSystem(System):
+class DatasetSystem(BinarySerializationMixin, System):
     """Class interface for dataset system."""
 
     def __init__(self, *args, catalog_cost_mapping: dict[str, list[str]] | None = None, **kwargs):
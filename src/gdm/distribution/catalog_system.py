@@ -2,8 +2,10 @@ import importlib.metadata
 
 from infrasys import System
 
+from gdm.binary_serialization import BinarySerializationMixin
 
-class CatalogSystem(System):
+
+class CatalogSystem(BinarySerializationMixin, System):
     """Class interface for catalog system."""
 
     def __init__(self, *args, **kwargs):
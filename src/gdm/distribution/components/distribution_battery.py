@@ -120,8 +120,9 @@ class DistributionBattery(InServiceDistributionComponentBase):
             the aggregate of the provided instances.
         """
         phases = set()
+        is_split_phase_bus = bool({Phase.S1, Phase.S2} & set(bus.phases))
         for battery in instances:
-            if {Phase.S1, Phase.S2} & set(battery.phases):
+            if {Phase.S1, Phase.S2} & set(battery.phases) and not is_split_phase_bus:
                 parent_phase = split_phase_mapping[battery.name]
                 phases = phases.union(set(parent_phase))
             else:
@@ -130,7 +131,7 @@ class DistributionBattery(InServiceDistributionComponentBase):
         return DistributionBattery(
             name=name,
             bus=bus,
-            phases=list(phases),
+            phases=sorted(phases),
             equipment=BatteryEquipment(
                 name=f"{name}_battery_equipment",
                 rated_energy=sum(inst.equipment.rated_energy for inst in instances),
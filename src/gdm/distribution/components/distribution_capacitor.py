@@ -59,14 +59,15 @@ class DistributionCapacitor(InServiceDistributionComponentBase):
         split_phase_mapping: dict[str, set[Phase]],
     ) -> "DistributionCapacitor":
         phase_caps = defaultdict(list)
+        is_split_phase_bus = bool({Phase.S1, Phase.S2} & set(bus.phases))
         for cap in instances:
-            if {Phase.S1, Phase.S2} & set(cap.phases):
+            if {Phase.S1, Phase.S2} & set(cap.phases) and not is_split_phase_bus:
                 parent_phase = split_phase_mapping[cap.uuid]
                 split_cap = PhaseCapacitorEquipment.split(
                     PhaseCapacitorEquipment.aggregate(cap.equipment.phase_capacitors, name=""),
                     len(parent_phase),
                 )
-                for phase in parent_phase:
+                for phase in sorted(parent_phase):
                     phase_caps[phase].append(split_cap)
                 continue
             for phase, phase_load in zip(cap.phases, cap.equipment.phase_capacitors):
@@ -44,14 +44,15 @@ class DistributionLoad(InServiceDistributionComponentBase):
         split_phase_mapping: dict[str, set[Phase]],
     ) -> Self:
         phase_loads = defaultdict(list)
+        is_split_phase_bus = bool({Phase.S1, Phase.S2} & set(bus.phases))
         for load in instances:
-            if {Phase.S1, Phase.S2} & set(load.phases):
+            if {Phase.S1, Phase.S2} & set(load.phases) and not is_split_phase_bus:
                 parent_phase = split_phase_mapping[load.name]
                 split_load = PhaseLoadEquipment.split(
                     PhaseLoadEquipment.aggregate(load.equipment.phase_loads, name=""),
                     len(parent_phase),
                 )
-                for phase in parent_phase:
+                for phase in sorted(parent_phase):
                     phase_loads[phase].append(split_load)
                 continue
             for phase, phase_load in zip(load.phases, load.equipment.phase_loads):
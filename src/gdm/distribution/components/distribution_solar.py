@@ -97,8 +97,9 @@ class DistributionSolar(InServiceDistributionComponentBase):
         split_phase_mapping: dict[str, set[Phase]],
     ) -> "DistributionSolar":
         phases = set()
+        is_split_phase_bus = bool({Phase.S1, Phase.S2} & set(bus.phases))
         for solar in instances:
-            if {Phase.S1, Phase.S2} & set(solar.phases):
+            if {Phase.S1, Phase.S2} & set(solar.phases) and not is_split_phase_bus:
                 parent_phase = split_phase_mapping[solar.name]
                 phases = phases.union(set(parent_phase))
             else:
@@ -107,7 +108,7 @@ class DistributionSolar(InServiceDistributionComponentBase):
         return DistributionSolar(
             name=name,
             bus=bus,
-            phases=list(phases),
+            phases=sorted(phases),
             equipment=SolarEquipment(
                 name=f"{name}_solar_equipment",
                 rated_power=sum(inst.equipment.rated_power for inst in instances),
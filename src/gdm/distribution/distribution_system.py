@@ -1,15 +1,16 @@
 """This module contains distribution system."""
 
 from collections import defaultdict
-from typing import Annotated, Type
+from typing import Annotated, Any, Type
+from uuid import UUID
 import importlib.metadata
+import copy
 from pathlib import Path
-import tempfile
 import random
 
 from infrasys.time_series_models import TimeSeriesData, SingleTimeSeries
-from shapely import Point, LineString, union_all
-from infrasys import Component, System
+from shapely import union_all
+from infrasys import Component, SupplementalAttribute, System
 from pydantic import BaseModel, Field
 import plotly.graph_objects as go
 from loguru import logger
@@ -46,8 +47,57 @@ from gdm.exceptions import (
     NonuniqueCommponentsTypesInParallel,
     MultipleOrEmptyVsourceFound,
 )
+from infrasys.time_series_manager import TimeSeriesManager
+from infrasys import TIME_SERIES_ASSOCIATIONS_TABLE
+from infrasys.utils.sqlite import create_in_memory_db
 from infrasys.exceptions import ISNotStored
 
+from gdm.distribution.time_series_storage import SharedTimeSeriesStorage
+from gdm.binary_serialization import BinarySerializationMixin
+from gdm.component_archive import ArchiveSerializationMixin
+from gdm.streaming_serialization import StreamingDeserializationMixin
+from gdm.parallel_deserialization import ParallelDeserializationMixin
+from gdm.trusted_serialization import TrustedDeserializationMixin
+
+
+def _copy_model_graph(value: Any, copies: dict[int, Any]) -> Any:
+    """Copies models and containers reachable from value, sharing immutable leaves.
+
+    copies maps the id of every model already copied to its copy, so a model referenced from
+    several places is copied once and the references stay shared.
+    """
+    if isinstance(value, BaseModel):
+        if id(value) in copies:
+            return copies[id(value)]
+        model_copy = value.model_copy()
+        copies[id(value)] = model_copy
+        for field in type(value).model_fields:
+            field_value = getattr(value, field)
+            field_copy = _copy_model_graph(field_value, copies)
+            if field_copy is not field_value:
+                # Bypasses validate_assignment, the values were validated on the original.
+                model_copy.__dict__[field] = field_copy
+        return model_copy
+    if isinstance(value, list):
+        return [_copy_model_graph(item, copies) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy_model_graph(item, copies) for key, item in value.items()}
+    if isinstance(getattr(value, "magnitude", None), np.ndarray) or isinstance(value, np.ndarray):
+        return copy.copy(value)
+    return value
+
+
+def _to_magnitudes(quantities: list, units: str) -> np.ndarray:
+    """Returns the magnitudes of quantities in units, converting once per distinct unit."""
+    magnitudes = np.empty(len(quantities), dtype=float)
+    rows_by_units: dict[Any, list[int]] = defaultdict(list)
+    for i, quantity in enumerate(quantities):
+        rows_by_units[quantity.units].append(i)
+    for quantity_units, rows in rows_by_units.items():
+        values = np.array([quantities[i].magnitude for i in rows], dtype=float)
+        magnitudes[rows] = type(quantities[rows[0]])(values, quantity_units).to(units).magnitude
+    return magnitudes
+
 
 class UserAttributes(BaseModel):
     """Data model for single time series data user attributes."""
@@ -64,7 +114,14 @@ class UserAttributes(BaseModel):
     ]
 
 
-class DistributionSystem(System):
+class DistributionSystem(
+    TrustedDeserializationMixin,
+    ParallelDeserializationMixin,
+    StreamingDeserializationMixin,
+    ArchiveSerializationMixin,
+    BinarySerializationMixin,
+    System,
+):
     """Class interface for distribution system."""
 
     def __init__(self, *args, **kwargs):
@@ -226,7 +283,7 @@ class DistributionSystem(System):
         self,
         subtree_system: "DistributionSystem",
         parent_components: list[Component],
-        bus_names: list[DistributionBus],
+        bus_names: set[str],
     ):
         for component in parent_components:
             if isinstance(
@@ -234,17 +291,45 @@ class DistributionSystem(System):
                 (DistributionBranchBase, DistributionTransformerBase),
             ):
                 nodes = {bus.name for bus in component.buses}
-                if not nodes.issubset(set(bus_names)):
+                if not nodes.issubset(bus_names):
                     continue
             if not subtree_system.has_component(component):
                 subtree_system.add_component(component)
 
+    def _create_shared_time_series_system(self, name: str | None) -> "DistributionSystem":
+        """Returns an empty system whose time series storage references this system's storage."""
+        con = create_in_memory_db()
+        time_series_manager = TimeSeriesManager(
+            con, storage=SharedTimeSeriesStorage(self.time_series.storage)
+        )
+        return DistributionSystem(
+            auto_add_composed_components=True,
+            name=name,
+            con=con,
+            time_series_manager=time_series_manager,
+        )
+
+    def _link_time_series(
+        self,
+        target_system: "DistributionSystem",
+        component: Component,
+        time_series_type: Type[TimeSeriesData],
+    ) -> None:
+        """Attaches time series of a component to target system without copying the arrays."""
+        storage = target_system.time_series.storage
+        for metadata in self.list_time_series_metadata(
+            component, time_series_type=time_series_type
+        ):
+            storage.link_time_series(metadata)
+            target_system.time_series.metadata_store.add(metadata, component)
+
     def get_subsystem(
         self,
         bus_names: list[str],
         name: str,
         keep_timeseries: bool = False,
         time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+        share_timeseries: bool = True,
     ) -> "DistributionSystem":
         """Method to get subsystem from list of buses.
 
@@ -258,28 +343,54 @@ class DistributionSystem(System):
             Set this flag to retain timeseries data associated with the component.
         time_series_type: Type[TimeSeriesData]
             Type of time series data. Defaults to: SingleTimeSeries
+        share_timeseries: bool
+            If True, retained time series reference the arrays stored in this system instead of
+            copying them. Time series added to the subsystem afterwards are stored separately.
+            The arrays are shared, not copied on write: time series removed from this system
+            can no longer be read from the subsystem and raise `ISNotStored`, set it to False
+            to remove time series from this system while the subsystem is in use.
+            Defaults to: True
         Returns
         -------
         DistributionSystem
         """
-        tree = self.get_directed_graph()
-        subtree = tree.subgraph(bus_names)
-        subtree_system = DistributionSystem(auto_add_composed_components=True, name=name)
-        for u, v, _ in subtree.edges(data=True):
-            parent_components = self.list_parent_components(
-                self.get_component(DistributionBus, u)
-            ) + self.list_parent_components(self.get_component(DistributionBus, v))
-            self._add_to_subsystem(subtree_system, parent_components, bus_names)
-
-        for u in subtree.nodes():
+        return self._build_subsystem(
+            self.get_directed_graph(),
+            bus_names,
+            name,
+            keep_timeseries=keep_timeseries,
+            time_series_type=time_series_type,
+            share_timeseries=share_timeseries,
+        )
+
+    def _build_subsystem(
+        self,
+        tree: nx.MultiDiGraph,
+        bus_names: list[str],
+        name: str,
+        keep_timeseries: bool = False,
+        time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+        share_timeseries: bool = True,
+    ) -> "DistributionSystem":
+        """Builds the subsystem of `get_subsystem` from an already computed directed graph."""
+        bus_name_set = set(bus_names)
+        if keep_timeseries and share_timeseries:
+            subtree_system = self._create_shared_time_series_system(name)
+        else:
+            subtree_system = DistributionSystem(auto_add_composed_components=True, name=name)
+
+        for u in tree.subgraph(bus_names).nodes():
             parent_components = self.list_parent_components(self.get_component(DistributionBus, u))
-            self._add_to_subsystem(subtree_system, parent_components, bus_names)
+            self._add_to_subsystem(subtree_system, parent_components, bus_name_set)
 
         if keep_timeseries:
             for comp in subtree_system.get_components(
                 Component,
                 filter_func=lambda x: self.has_time_series(x, time_series_type=time_series_type),
             ):
+                if share_timeseries:
+                    self._link_time_series(subtree_system, comp, time_series_type)
+                    continue
                 ts_metadata = self.list_time_series_metadata(
                     comp, time_series_type=time_series_type
                 )
@@ -471,8 +582,30 @@ class DistributionSystem(System):
         ----
         - Logs the process of identifying and mapping split-phase transformers.
         """
+        tree = self.get_directed_graph()
+        bus_model_types = self.get_model_types_with_field_type(DistributionBus)
+        return self._get_split_phase_mapping(
+            tree, self._get_bus_component_mapping(bus_model_types)
+        )
+
+    def _get_bus_component_mapping(
+        self, model_types: list[Type[Component]]
+    ) -> dict[str, list[Component]]:
+        """Returns components of the given single bus model types grouped by bus name."""
+        bus_component_mapping = defaultdict(list)
+        for model_type in model_types:
+            for component in self.get_components(model_type):
+                bus_component_mapping[component.bus.name].append(component)
+        return bus_component_mapping
+
+    def _get_split_phase_mapping(
+        self,
+        tree: nx.MultiDiGraph,
+        bus_component_mapping: dict[str, list[Component]],
+    ) -> dict[str, set[Phase]]:
+        """Builds the split phase mapping from an already computed directed graph and
+        bus to component mapping."""
         split_phase_map = {}
-        original_tree = self.get_directed_graph()
         split_phase_trs: list[DistributionTransformer] = list(
             self.get_components(
                 DistributionTransformer,
@@ -484,17 +617,20 @@ class DistributionSystem(System):
                 bus.name for bus in tr.buses if Phase.S1 in bus.phases or Phase.S2 in bus.phases
             }.pop()
             hv_bus = (set([bus.name for bus in tr.buses]) - set([lv_bus])).pop()
-            lv_system = self.get_subsystem(
-                list(nx.descendants(original_tree, lv_bus)) + [lv_bus], name=""
-            )
-            bus_model_types = self.get_model_types_with_field_type(DistributionBus)
-            for model_type in bus_model_types:
-                for asset in lv_system.get_components(model_type):
-                    split_phase_map[asset.name] = set(
-                        self.get_component(DistributionBus, hv_bus).phases
-                    )
+            hv_phases = set(self.get_component(DistributionBus, hv_bus).phases)
+            for bus_name in nx.descendants(tree, lv_bus) | {lv_bus}:
+                for asset in bus_component_mapping.get(bus_name, []):
+                    split_phase_map[asset.name] = set(hv_phases)
         return split_phase_map
 
+    def _get_bus_coordinates(self) -> tuple[list[DistributionBus], np.ndarray]:
+        """Returns the buses and an array of their coordinates, one row per bus."""
+        buses: list[DistributionBus] = list(self.get_components(DistributionBus))
+        coordinates = np.array(
+            [(bus.coordinate.x, bus.coordinate.y) for bus in buses], dtype=float
+        ).reshape(-1, 2)
+        return buses, coordinates
+
     def _build_edge_geodataframe(self, graph) -> gpd.GeoDataFrame:
         """
         Builds a GeoDataFrame containing edge information for distribution edges.
@@ -508,38 +644,62 @@ class DistributionSystem(System):
         Returns:
             gpd.GeoDataFrame: A GeoDataFrame with edge information and geometries.
         """
+        buses, coordinates = self._get_bus_coordinates()
+        bus_index = {bus.name: i for i, bus in enumerate(buses)}
+        components = {
+            (type(component), component.name): component
+            for component_type in (DistributionBranchBase, DistributionTransformerBase)
+            for component in self.get_components(component_type)
+        }
+        edges = list(graph.edges(data=True))
+        ends = np.array([(bus_index[u], bus_index[v]) for u, v, _ in edges], dtype=int)
+        ends = ends.reshape(-1, 2)
+        # Edges with a bus at the origin have no coordinates.
+        mask = np.any(coordinates[ends[:, 0]] != 0, axis=1) & np.any(
+            coordinates[ends[:, 1]] != 0, axis=1
+        )
+        ends = ends[mask]
+        edges = [edge for edge, keep in zip(edges, mask) if keep]
+        segments = coordinates[ends]
+
+        phase_labels: dict[tuple, str] = {}
+        lengths = np.full(len(edges), 15.0)
+        lines: dict[int, Any] = {}
         edge_data = defaultdict(list)
-        system_crs = None
-        for u, v, data in graph.edges(data=True):
-            bus1 = self.get_component(DistributionBus, u)
-            bus2 = self.get_component(DistributionBus, v)
-            x1, y1 = bus1.coordinate.x, bus1.coordinate.y
-            x2, y2 = bus2.coordinate.x, bus2.coordinate.y
-
-            if not ((x1 == 0 and y1 == 0) or (x2 == 0 and y2 == 0)):
-                component = self.get_component(data["type"], data["name"])
-                if isinstance(component, DistributionTransformer):
-                    phases = [",".join([phs.value for phs in w]) for w in component.winding_phases]
-                    phases = "\n".join(phases)
-                    length = 15.0
-                else:
-                    phases = ",".join([phs.value for phs in component.phases])
-                    length = component.length.to("foot").magnitude
-                edge_data["Phases"].append(phases)
-                edge_data["Name"].append(data["name"])
-                edge_data["Length"].append(length)
-                edge_data["Type"].append(data["type"].__name__)
-                edge_data["X"].append([x1, x2])
-                edge_data["Y"].append([y1, y2])
-                system_crs = bus1.coordinate.crs
-
-        edge_df = pd.DataFrame(edge_data)
-        geometry = [
-            LineString([Point(x, y) for x, y in zip(xs, ys)])
-            for xs, ys in zip(edge_df["X"], edge_df["Y"])
-        ]
+        for i, (_, _, data) in enumerate(edges):
+            component = components[(data["type"], data["name"])]
+            if isinstance(component, DistributionTransformer):
+                phases = tuple(tuple(w) for w in component.winding_phases)
+                if phases not in phase_labels:
+                    phase_labels[phases] = "\n".join(
+                        ",".join(phs.value for phs in w) for w in phases
+                    )
+            else:
+                phases = tuple(component.phases)
+                if phases not in phase_labels:
+                    phase_labels[phases] = ",".join(phs.value for phs in phases)
+                lines[i] = component.length
+            edge_data["Phases"].append(phase_labels[phases])
+            edge_data["Name"].append(data["name"])
+            edge_data["Type"].append(data["type"].__name__)
+        if lines:
+            lengths[list(lines)] = _to_magnitudes(list(lines.values()), "foot")
+
+        edge_df = pd.DataFrame(
+            {
+                "Phases": edge_data["Phases"],
+                "Name": edge_data["Name"],
+                "Length": lengths,
+                "Type": edge_data["Type"],
+                "X": segments[:, :, 0].tolist(),
+                "Y": segments[:, :, 1].tolist(),
+            }
+        )
+        system_crs = buses[ends[-1, 0]].coordinate.crs if len(ends) else None
         gdf_edges = gpd.GeoDataFrame(
-            edge_df, geometry=geometry, crs="EPSG:4326" if system_crs is None else system_crs
+            edge_df,
+            geometry=shapely.linestrings(segments),
+            crs="EPSG:4326" if system_crs is None else system_crs,
         )
         return gdf_edges
 
@@ -556,22 +716,30 @@ class DistributionSystem(System):
         Returns:
             gpd.GeoDataFrame: A GeoDataFrame with node information and geometries.
         """
-        node_data = defaultdict(list)
-        system_crs = None
-        for bus in self.get_components(DistributionBus):
-            if bus.coordinate.x != 0 and bus.coordinate.y != 0:
-                node_data["Name"].append(bus.name)
-                node_data["Type"].append(DistributionBus.__name__)
-                node_data["kV"].append(bus.rated_voltage.to("kilovolt").magnitude)
-                node_data["Phases"].append(",".join([phs.value for phs in bus.phases]))
-                node_data["X"].append(bus.coordinate.x)
-                node_data["Y"].append(bus.coordinate.y)
-                system_crs = bus.coordinate.crs
-
-        nodes_df = pd.DataFrame(node_data)
+        buses, coordinates = self._get_bus_coordinates()
+        mask = np.all(coordinates != 0, axis=1)
+        buses = [bus for bus, keep in zip(buses, mask) if keep]
+        coordinates = coordinates[mask]
+
+        phase_labels: dict[tuple, str] = {}
+        for bus in buses:
+            phases = tuple(bus.phases)
+            if phases not in phase_labels:
+                phase_labels[phases] = ",".join(phs.value for phs in phases)
+        nodes_df = pd.DataFrame(
+            {
+                "Name": [bus.name for bus in buses],
+                "Type": DistributionBus.__name__,
+                "kV": _to_magnitudes([bus.rated_voltage for bus in buses], "kilovolt"),
+                "Phases": [phase_labels[tuple(bus.phases)] for bus in buses],
+                "X": coordinates[:, 0],
+                "Y": coordinates[:, 1],
+            }
+        )
+        system_crs = buses[-1].coordinate.crs if buses else None
         gdf_nodes = gpd.GeoDataFrame(
             nodes_df,
-            geometry=gpd.points_from_xy(nodes_df.X, nodes_df.Y),
+            geometry=shapely.points(coordinates),
             crs="EPSG:4326" if system_crs is None else system_crs,
         )
         return gdf_nodes
@@ -846,21 +1014,70 @@ class DistributionSystem(System):
                 )
             )
 
-    def deepcopy(self) -> "DistributionSystem":
-        """Returns a deep copy of the distribution system."""
-        system = None
-        with tempfile.TemporaryDirectory() as tmpdir:
-            self.to_json(Path(tmpdir) / "test.json")
-            system = DistributionSystem.from_json(Path(tmpdir) / "test.json")
-            system.auto_add_composed_components = True
+    def deepcopy(self, share_timeseries: bool = False) -> "DistributionSystem":
+        """Returns a deep copy of the distribution system.
+
+        Components and supplemental attributes are copied in memory and keep their UUIDs. A
+        sub-component shared by several components, e.g. an equipment, is copied once and stays
+        shared in the copy. Immutable values such as scalar quantities and enums are reused
+        instead of being copied.
 
-        # @dan how do i get this to work?
+        Parameters
+        ----------
+        share_timeseries : bool, optional
+            Read the time series arrays of the copy from this system's storage instead of
+            duplicating them, by default False. Arrays added to or removed from the copy do not
+            affect this system, but this system must keep the shared arrays, see
+            `get_subsystem`.
 
-        # system = DistributionSystem(auto_add_composed_components=True)
-        # for component in self.iter_all_components():
-        #     new_component = self.deepcopy_component(component)
-        #     system.add_component(new_component)
+        Returns
+        -------
+        DistributionSystem
+            The copied system.
+        """
+        if share_timeseries:
+            system = self._create_shared_time_series_system(self.name)
+        else:
+            system = DistributionSystem(auto_add_composed_components=True, name=self.name)
+        system.description = self.description
+        system.data_format_version = self.data_format_version
+
+        copies: dict[int, Any] = {}
+        system.add_components(
+            *(_copy_model_graph(component, copies) for component in self.iter_all_components()),
+            deserialization_in_progress=True,
+        )
+        for attribute in self.get_supplemental_attributes(SupplementalAttribute):
+            attribute_copy = _copy_model_graph(attribute, copies)
+            for component in self.get_components_with_supplemental_attribute(attribute):
+                system.add_supplemental_attribute(
+                    system.get_component_by_uuid(component.uuid), attribute_copy
+                )
 
+        metadata_store = self.time_series.metadata_store
+        storage = system.time_series.storage
+        copied_arrays: set[UUID] = set()
+        owner_rows = metadata_store.sql(
+            f"SELECT DISTINCT owner_uuid FROM {TIME_SERIES_ASSOCIATIONS_TABLE}"
+        )
+        for (owner_uuid,) in owner_rows:
+            owner_uuid = UUID(owner_uuid)
+            try:
+                owner = self.get_component_by_uuid(owner_uuid)
+                owner_copy = system.get_component_by_uuid(owner_uuid)
+            except ISNotStored:
+                owner = self.get_supplemental_attribute_by_uuid(owner_uuid)
+                owner_copy = system.get_supplemental_attribute_by_uuid(owner_uuid)
+            for metadata in metadata_store.list_metadata(owner):
+                if metadata.time_series_uuid not in copied_arrays:
+                    if share_timeseries:
+                        storage.link_time_series(metadata)
+                    else:
+                        storage.add_time_series(
+                            metadata, self.time_series.storage.get_time_series(metadata)
+                        )
+                    copied_arrays.add(metadata.time_series_uuid)
+                system.time_series.metadata_store.add(metadata, owner_copy)
         return system
 
     def convert_geometry_to_matrix_representation(
@@ -948,6 +1165,8 @@ class DistributionSystem(System):
                     raise NonuniqueCommponentsTypesInParallel(
                         f"Only same models types can be connected in parallel."
                         f"\n{models} type model connected in parallel between nodes {u} and {v}."
+                        "\nParallel line branches can be combined with "
+                        "gdm.distribution.model_reduction.collapse_parallel_branches."
                     )
             else:
                 reduced_cycles.append(cycle)
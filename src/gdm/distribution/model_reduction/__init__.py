@@ -1,2 +1,21 @@
 from gdm.distribution.model_reduction.reducer import reduce_to_primary_system
 from gdm.distribution.model_reduction.reducer import reduce_to_three_phase_system
+from gdm.distribution.model_reduction.reducer import reduce_system
+from gdm.distribution.model_reduction.reduction_context import ReductionContext
+from gdm.distribution.model_reduction.selectors import (
+    BusSelector,
+    BusTable,
+    bus_names,
+    der_above,
+    in_feeders,
+    min_phases,
+    voltage_above,
+    within_distance,
+)
+from gdm.distribution.model_reduction.series_branches import merge_series_branches
+from gdm.distribution.model_reduction.parallel_branches import collapse_parallel_branches
+from gdm.distribution.model_reduction.report import (
+    ReductionReport,
+    SystemSummary,
+    benchmark_reduction,
+)
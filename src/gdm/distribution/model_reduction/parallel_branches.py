@@ -0,0 +1,167 @@
+"""This module collapses parallel branches into single equivalent branches."""
+
+from collections import defaultdict
+
+from loguru import logger
+import numpy as np
+
+from gdm.distribution.components.base.distribution_switch_base import DistributionSwitchBase
+from gdm.distribution.components.base.distribution_branch_base import DistributionBranchBase
+from gdm.distribution.components.matrix_impedance_recloser import MatrixImpedanceRecloser
+from gdm.distribution.components.matrix_impedance_branch import MatrixImpedanceBranch
+from gdm.distribution.components.matrix_impedance_switch import MatrixImpedanceSwitch
+from gdm.distribution.components.matrix_impedance_fuse import MatrixImpedanceFuse
+from gdm.distribution.components.geometry_branch import GeometryBranch
+from gdm.distribution.model_reduction.series_branches import MERGEABLE_BRANCH_TYPES
+from gdm.distribution.equipment.matrix_impedance_branch_equipment import (
+    MatrixImpedanceBranchEquipment,
+)
+from gdm.distribution.distribution_system import DistributionSystem
+from gdm.distribution.enums import Phase
+from gdm.quantities import (
+    CapacitancePULength,
+    ResistancePULength,
+    ReactancePULength,
+    Current,
+)
+
+PARALLEL_BRANCH_TYPES = (
+    *MERGEABLE_BRANCH_TYPES,
+    MatrixImpedanceSwitch,
+    MatrixImpedanceFuse,
+    MatrixImpedanceRecloser,
+)
+
+
+def _embed(matrix: np.ndarray, phases: list[Phase], all_phases: list[Phase]) -> np.ndarray:
+    """Places a matrix ordered by phases into a zero matrix ordered by all_phases."""
+    index = [all_phases.index(phase) for phase in phases]
+    embedded = np.zeros((len(all_phases), len(all_phases)), dtype=matrix.dtype)
+    embedded[np.ix_(index, index)] = matrix
+    return embedded
+
+
+def _is_collapsible(branch: DistributionBranchBase) -> bool:
+    """Return True for in service line and closed switch branches."""
+    if type(branch) not in PARALLEL_BRANCH_TYPES or not branch.in_service:
+        return False
+    return not isinstance(branch, DistributionSwitchBase) or all(branch.is_closed)
+
+
+def _collapse_branches(branches: list[DistributionBranchBase]) -> DistributionBranchBase | None:
+    """Returns the branch equivalent to branches connected in parallel.
+
+    Series admittances and shunt capacitances of the branches are added up and the result is
+    expressed per unit length of the first branch. A branch with a singular impedance, e.g. a
+    jumper or a zero impedance switch, short circuits the others and is returned as is. None
+    is returned if no such branch covers all the phases.
+    """
+    segments = [
+        branch.to_matrix_representation() if isinstance(branch, GeometryBranch) else branch
+        for branch in branches
+    ]
+    phases = sorted({phase for branch in segments for phase in branch.phases})
+    impedances = [
+        (
+            branch.equipment.r_matrix.to("ohm/km").magnitude
+            + 1j * branch.equipment.x_matrix.to("ohm/km").magnitude
+        )
+        * branch.length.to("km").magnitude
+        for branch in segments
+    ]
+    short_circuits = [
+        branch
+        for branch, impedance in zip(branches, impedances)
+        if np.linalg.matrix_rank(impedance) < len(impedance)
+    ]
+    if short_circuits:
+        return next((branch for branch in short_circuits if sorted(branch.phases) == phases), None)
+
+    admittance = np.zeros((len(phases), len(phases)), dtype=complex)
+    capacitance = np.zeros((len(phases), len(phases)))
+    for branch, impedance in zip(segments, impedances):
+        admittance += _embed(np.linalg.inv(impedance), branch.phases, phases)
+        capacitance += _embed(
+            branch.equipment.c_matrix.to("nanofarad/km").magnitude
+            * branch.length.to("km").magnitude,
+            branch.phases,
+            phases,
+        )
+
+    first = branches[0]
+    length = first.length.to("km").magnitude
+    impedance = np.linalg.inv(admittance) / length
+    return MatrixImpedanceBranch(
+        name=first.name,
+        buses=first.buses,
+        length=first.length,
+        phases=phases,
+        substation=first.substation,
+        feeder=first.feeder,
+        in_service=first.in_service,
+        equipment=MatrixImpedanceBranchEquipment(
+            name=f"{first.name}_equipment",
+            construction=segments[0].equipment.construction,
+            r_matrix=ResistancePULength(impedance.real, "ohm/km"),
+            x_matrix=ReactancePULength(impedance.imag, "ohm/km"),
+            c_matrix=CapacitancePULength(capacitance / length, "nanofarad/km"),
+            ampacity=Current(
+                sum(branch.equipment.ampacity.to("ampere").magnitude for branch in segments),
+                "ampere",
+            ),
+        ),
+    )
+
+
+def collapse_parallel_branches(dist_system: DistributionSystem) -> dict[str, list[str]]:
+    """Replaces line branches connecting the same pair of buses by one branch, in place.
+
+    `MatrixImpedanceBranch`, `GeometryBranch` and closed matrix impedance switch, fuse and
+    recloser instances are indexed by their bus pair in a single pass. Every pair with more
+    than one branch is replaced by a `MatrixImpedanceBranch` whose series admittance and shunt
+    capacitance are the sums over the parallel branches and whose ampacity is the sum of their
+    ampacities. Branches over different phases are combined over the union of their phases.
+    When a branch of the pair has a singular impedance, e.g. a jumper or a zero impedance
+    switch, it short circuits the others and is kept alone, the pair is left as it is if that
+    branch does not cover all the phases. Transformers, open switches and out of service
+    branches are left as they are.
+
+    Parameters
+    ----------
+    dist_system : DistributionSystem
+        System to simplify.
+
+    Returns
+    -------
+    dict[str, list[str]]
+        Mapping of equivalent branch names to the names of the branches they replace.
+    """
+    bus_pair_index: dict[frozenset[str], list[DistributionBranchBase]] = defaultdict(list)
+    for branch in dist_system.get_components(DistributionBranchBase, filter_func=_is_collapsible):
+        bus_pair_index[frozenset(bus.name for bus in branch.buses)].append(branch)
+
+    provenance: dict[str, list[str]] = {}
+    for branches in bus_pair_index.values():
+        if len(branches) < 2:
+            continue
+        branches = sorted(branches, key=lambda x: x.name)
+        names = [branch.name for branch in branches]
+        equivalent = _collapse_branches(branches)
+        if equivalent is None:
+            logger.warning(
+                f"Parallel branches {names} are left as they are, their zero impedance "
+                "branches do not cover all the phases."
+            )
+            continue
+        if not dist_system.has_component(equivalent):
+            dist_system.add_component(equivalent)
+        for branch in branches:
+            if branch is not equivalent:
+                dist_system.remove_component(branch)
+        provenance[equivalent.name] = names
+
+    logger.info(
+        f"Collapsed {sum(len(v) for v in provenance.values())} parallel branches "
+        f"into {len(provenance)} branches."
+    )
+    return provenance
@@ -1,7 +1,12 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from typing import Any, Iterable, Iterator, Type, Union, Callable
+from uuid import UUID
+import multiprocessing
 import uuid
-from typing import Type, Union, Callable
 
 from infrasys.time_series_models import SingleTimeSeries, TimeSeriesData
+from infrasys import Component
 import networkx as nx
 
 from gdm.distribution.components.distribution_bus import DistributionBus
@@ -12,6 +17,9 @@ from gdm.distribution.distribution_system import (
     DistributionSystem,
     UserAttributes,
 )
+from gdm.distribution.model_reduction.reduction_context import ReductionContext
+from gdm.parallel_deserialization import _Decoder, _encode_model
+from gdm.distribution.model_reduction.selectors import BusSelector, BusTable
 from gdm.distribution.enums import Phase
 from gdm.distribution.sys_functools import (
     get_aggregated_load_timeseries,
@@ -22,7 +30,9 @@ from gdm.distribution.sys_functools import (
 
 def _get_three_phase_buses(
     dist_system: DistributionSystem,
+    context: ReductionContext | None = None,
 ) -> list[str]:
+    context = context or ReductionContext(dist_system)
     three_phase_buses = [
         bus.name
         for bus in dist_system.get_components(
@@ -30,9 +40,7 @@ def _get_three_phase_buses(
             filter_func=lambda x: set((Phase.A, Phase.B, Phase.C)).issubset(x.phases),
         )
     ]
-    graph = dist_system.get_undirected_graph()
-
-    subgraph = graph.subgraph(three_phase_buses)
+    subgraph = context.undirected_graph.subgraph(three_phase_buses)
     connected_components = list(nx.connected_components(subgraph))
 
     max_size = 0
@@ -55,80 +63,230 @@ def _get_primary_buses(dist_system: DistributionSystem) -> list[str]:
     ]
 
 
+_TS_AGG_FUNC_MAPPER: dict[Union[Type[DistributionLoad], Type[DistributionSolar]], Callable] = {
+    DistributionLoad: get_aggregated_load_timeseries,
+    DistributionSolar: get_aggregated_solar_timeseries,
+    DistributionBattery: get_aggregated_battery_timeseries,
+}
+
+# One aggregation group: attachment bus name, model type and names of the pruned components.
+AggregationGroup = tuple[str, Type[Component], list[str]]
+
+# State inherited by forked workers, so the original system is never pickled.
+_worker_state: dict[str, Any] = {}
+
+
+def _get_aggregated_component_name(bus_name: str, model_type: Type[Component]) -> str:
+    # Names only depend on the attachment bus so the output does not depend on how the
+    # aggregation groups were distributed over workers.
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"{bus_name}/{model_type.__name__}"))
+
+
 def _get_aggregated_bus_component(
-    subtree_system: DistributionSystem,
+    components: list[Component],
     bus: DistributionBus,
     model_type: DistributionLoad | DistributionSolar,
     split_phase_mapping: dict[str, set[Phase]],
 ) -> DistributionLoad | DistributionSolar:
-    model_components = subtree_system.get_components(model_type)
     return model_type.aggregate(
-        instances=list(model_components),
+        instances=components,
         bus=bus,
-        name=str(uuid.uuid4()),
+        name=_get_aggregated_component_name(bus.name, model_type),
+        split_phase_mapping=split_phase_mapping,
+    )
+
+
+def _iter_aggregates(
+    dist_system: DistributionSystem,
+    groups: list[AggregationGroup],
+    split_phase_mapping: dict[str, set[Phase]],
+    agg_timeseries: bool,
+    time_series_type: Type[TimeSeriesData],
+) -> Iterator[tuple[Component, list[tuple[TimeSeriesData, dict[str, Any]]]]]:
+    """Yields the aggregated component of every group with its time series and their features."""
+    for node, model_type, component_names in groups:
+        bus = dist_system.get_component(DistributionBus, node)
+        comps = [dist_system.get_component(model_type, name) for name in component_names]
+        agg_comp = _get_aggregated_bus_component(
+            comps,
+            bus,
+            model_type=model_type,
+            split_phase_mapping=split_phase_mapping,
+        )
+        time_series = []
+        if agg_timeseries:
+            ts_metadata = dist_system.list_time_series_metadata(
+                comps[0], time_series_type=time_series_type
+            )
+            for metadata in ts_metadata:
+                ts_aggregate = _TS_AGG_FUNC_MAPPER[model_type](
+                    dist_system, comps, metadata.name, time_series_type
+                )
+                user_attr = UserAttributes.model_validate(metadata.features)
+                user_attr.use_actual = True
+                time_series.append((ts_aggregate, user_attr.model_dump()))
+        yield agg_comp, time_series
+
+
+def _add_aggregates(
+    target_system: DistributionSystem,
+    aggregates: Iterable[tuple[Component, list[tuple[TimeSeriesData, dict[str, Any]]]]],
+) -> None:
+    for agg_comp, time_series in aggregates:
+        target_system.add_component(agg_comp)
+        for ts_aggregate, features in time_series:
+            target_system.add_time_series(ts_aggregate, agg_comp, **features)
+
+
+def _init_worker(
+    dist_system: DistributionSystem,
+    shared_uuids: set[UUID],
+    split_phase_mapping: dict[str, set[Phase]],
+    agg_timeseries: bool,
+    time_series_type: Type[TimeSeriesData],
+) -> None:
+    _worker_state.update(
+        dist_system=dist_system,
+        shared_uuids=shared_uuids,
         split_phase_mapping=split_phase_mapping,
+        agg_timeseries=agg_timeseries,
+        time_series_type=time_series_type,
     )
 
 
+def _aggregate_feeder(groups: list[AggregationGroup]) -> list[tuple]:
+    """Worker entry point, aggregates the groups of one feeder of the inherited system.
+
+    Components of the reduced system, like the attachment buses, are returned as references
+    and quantities as their magnitude and units, see `gdm.parallel_deserialization`.
+    """
+    shared_uuids = _worker_state["shared_uuids"]
+    return [
+        (
+            _encode_model(agg_comp, shared_uuids),
+            [(_encode_model(ts), features) for ts, features in time_series],
+        )
+        for agg_comp, time_series in _iter_aggregates(
+            _worker_state["dist_system"],
+            groups,
+            _worker_state["split_phase_mapping"],
+            _worker_state["agg_timeseries"],
+            _worker_state["time_series_type"],
+        )
+    ]
+
+
+def _partition_by_feeder(
+    dist_system: DistributionSystem, groups: list[AggregationGroup]
+) -> dict[str, list[AggregationGroup]]:
+    """Groups the aggregation groups by the feeder of their attachment bus."""
+    feeder_groups: dict[str, list[AggregationGroup]] = defaultdict(list)
+    for group in groups:
+        bus = dist_system.get_component(DistributionBus, group[0])
+        feeder_groups[bus.feeder.name if bus.feeder else ""].append(group)
+    return {feeder: feeder_groups[feeder] for feeder in sorted(feeder_groups)}
+
+
+def _aggregate_groups_in_parallel(
+    dist_system: DistributionSystem,
+    reduced_system: DistributionSystem,
+    groups: list[AggregationGroup],
+    split_phase_mapping: dict[str, set[Phase]],
+    agg_timeseries: bool,
+    time_series_type: Type[TimeSeriesData],
+    max_workers: int,
+) -> None:
+    """Aggregates the groups feeder by feeder in forked workers.
+
+    Only the aggregation of the pruned components and their time series runs in the workers,
+    building the subsystem and selecting the attachment buses stays in the calling process.
+    Workers inherit the original system copy-on-write and only send back the aggregated
+    components and time series, which are added to the reduced system in feeder name order,
+    so the result is independent of completion order.
+    """
+    feeder_groups = _partition_by_feeder(dist_system, groups)
+    if not feeder_groups:
+        return
+    shared_uuids = {component.uuid for component in reduced_system.iter_all_components()}
+    decoder = _Decoder(reduced_system._components)
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(feeder_groups)),
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(
+            dist_system,
+            shared_uuids,
+            split_phase_mapping,
+            agg_timeseries,
+            time_series_type,
+        ),
+    ) as executor:
+        for results in executor.map(_aggregate_feeder, feeder_groups.values()):
+            _add_aggregates(
+                reduced_system,
+                (
+                    (
+                        decoder.decode(agg_comp),
+                        [(decoder.decode(ts), features) for ts, features in time_series],
+                    )
+                    for agg_comp, time_series in results
+                ),
+            )
+
+
 def _reduce_system(
     dist_system: DistributionSystem,
     bus_subset: list[DistributionBus],
     name: str,
     agg_timeseries: bool = False,
     time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+    context: ReductionContext | None = None,
+    max_workers: int = 1,
 ) -> DistributionSystem:
-    reduced_system = dist_system.get_subsystem(
-        bus_subset,
-        name,
-        keep_timeseries=agg_timeseries,
-        time_series_type=time_series_type,
-    )
+    context = context or ReductionContext(dist_system)
+    with context.timed("subsystem"):
+        reduced_system = context.get_subsystem(
+            bus_subset,
+            name,
+            keep_timeseries=agg_timeseries,
+            time_series_type=time_series_type,
+        )
+
+    with context.timed("attachment"):
+        attachment_groups: dict[str, dict[Type[Component], list[str]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for bus_name, attachment_bus in context.get_attachment_buses(set(bus_subset)).items():
+            for component in context.bus_components.get(bus_name, []):
+                attachment_groups[attachment_bus][type(component)].append(component.name)
+        groups = [
+            (node, model_type, component_names)
+            for node, subtree_components in attachment_groups.items()
+            for model_type, component_names in subtree_components.items()
+        ]
 
-    split_phase_mapping = dist_system.get_split_phase_mapping()
-    original_tree = dist_system.get_directed_graph()
-    reduced_network_tree = original_tree.subgraph(bus_subset)
-    ts_agg_func_mapper: dict[Union[Type[DistributionLoad], Type[DistributionSolar]], Callable] = {
-        DistributionLoad: get_aggregated_load_timeseries,
-        DistributionSolar: get_aggregated_solar_timeseries,
-        DistributionBattery: get_aggregated_battery_timeseries,
-    }
-    for node in reduced_network_tree.nodes():
-        if reduced_network_tree.out_degree(node) < original_tree.out_degree(node):
-            sucessors_diff = set(original_tree.successors(node)) - set(
-                reduced_network_tree.successors(node)
+    with context.timed("aggregation"):
+        if max_workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            _aggregate_groups_in_parallel(
+                dist_system,
+                reduced_system,
+                groups,
+                context.split_phase_mapping,
+                agg_timeseries,
+                time_series_type,
+                max_workers,
+            )
+        else:
+            _add_aggregates(
+                reduced_system,
+                _iter_aggregates(
+                    dist_system,
+                    groups,
+                    context.split_phase_mapping,
+                    agg_timeseries,
+                    time_series_type,
+                ),
             )
-            successors_descendants = [
-                snode
-                for successor in sucessors_diff
-                for snode in nx.descendants(original_tree, successor)
-            ] + list(sucessors_diff)
-            subtree = original_tree.subgraph(successors_descendants)
-            subtree_system = dist_system.get_subsystem(subtree.nodes, "")
-            model_types = subtree_system.get_model_types_with_field_type(DistributionBus)
-            for model_type in model_types:
-                agg_component = _get_aggregated_bus_component(
-                    subtree_system,
-                    reduced_system.get_component(DistributionBus, node),
-                    model_type=model_type,
-                    split_phase_mapping=split_phase_mapping,
-                )
-                # print(model_type.__name__, agg_component)
-                reduced_system.add_component(agg_component)
-                agg_comp = reduced_system.get_component(model_type, agg_component.name)
-                if agg_timeseries:
-                    comps = list(subtree_system.get_components(model_type))
-                    ts_metadata = dist_system.list_time_series_metadata(
-                        comps[0], time_series_type=time_series_type
-                    )
-                    for metadata in ts_metadata:
-                        ts_aggregate = ts_agg_func_mapper[model_type](
-                            dist_system, comps, metadata.name, time_series_type
-                        )
-                        user_attr = UserAttributes.model_validate(metadata.features)
-                        user_attr.use_actual = True
-                        reduced_system.add_time_series(
-                            ts_aggregate, agg_comp, **user_attr.model_dump()
-                        )
     return reduced_system
 
 
@@ -137,9 +295,21 @@ def reduce_to_three_phase_system(
     name: str,
     agg_timeseries: bool = False,
     time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+    max_workers: int = 1,
+    context: ReductionContext | None = None,
 ) -> DistributionSystem:
-    three_phase_buses = _get_three_phase_buses(dist_system)
-    return _reduce_system(dist_system, three_phase_buses, name, agg_timeseries, time_series_type)
+    context = context or ReductionContext(dist_system)
+    with context.timed("bus_selection"):
+        three_phase_buses = _get_three_phase_buses(dist_system, context)
+    return _reduce_system(
+        dist_system,
+        three_phase_buses,
+        name,
+        agg_timeseries,
+        time_series_type,
+        context,
+        max_workers,
+    )
 
 
 def reduce_to_primary_system(
@@ -147,6 +317,72 @@ def reduce_to_primary_system(
     name: str,
     agg_timeseries: bool = False,
     time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+    max_workers: int = 1,
+    context: ReductionContext | None = None,
+) -> DistributionSystem:
+    context = context or ReductionContext(dist_system)
+    with context.timed("bus_selection"):
+        primary_buses = _get_primary_buses(dist_system)
+    return _reduce_system(
+        dist_system,
+        primary_buses,
+        name,
+        agg_timeseries,
+        time_series_type,
+        context,
+        max_workers,
+    )
+
+
+def reduce_system(
+    dist_system: DistributionSystem,
+    keep: BusSelector,
+    name: str,
+    agg_timeseries: bool = False,
+    time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+    max_workers: int = 1,
+    context: ReductionContext | None = None,
 ) -> DistributionSystem:
-    primary_buses = _get_primary_buses(dist_system)
-    return _reduce_system(dist_system, primary_buses, name, agg_timeseries, time_series_type)
+    """Reduces the system to the buses chosen by a selector.
+
+    Buses on the path from a selected bus to the source are kept as well so the reduced
+    system stays connected. Components of the pruned buses are aggregated onto the closest
+    kept bus upstream of them.
+
+    Parameters
+    ----------
+    dist_system : DistributionSystem
+        System to reduce.
+    keep : BusSelector
+        Selector choosing the buses to keep, e.g.
+        `voltage_above(Voltage(1, "kilovolt")) | der_above(ActivePower(100, "kilowatt"))`.
+    name : str
+        Name of the reduced system.
+    agg_timeseries : bool, optional
+        Aggregate the time series of the pruned components, by default False.
+    time_series_type : Type[TimeSeriesData], optional
+        Type of the time series to aggregate, by default SingleTimeSeries.
+    max_workers : int, optional
+        Number of worker processes aggregating the pruned components of each feeder in
+        parallel, by default 1. Building the reduced subsystem is not parallelized.
+    context : ReductionContext | None, optional
+        Precomputed reduction context of dist_system, by default None.
+
+    Returns
+    -------
+    DistributionSystem
+        The reduced system.
+    """
+    context = context or ReductionContext(dist_system)
+    with context.timed("bus_selection"):
+        selected_buses = BusTable(context).select(keep)
+        kept_buses = context.get_upstream_closure(set(selected_buses))
+    return _reduce_system(
+        dist_system,
+        kept_buses,
+        name,
+        agg_timeseries,
+        time_series_type,
+        context,
+        max_workers,
+    )
@@ -0,0 +1,151 @@
+"""This module contains the shared state used by the model reduction steps."""
+
+from contextlib import contextmanager
+from functools import cached_property
+from typing import Iterator, Type
+import time
+
+from infrasys.time_series_models import SingleTimeSeries, TimeSeriesData
+from infrasys import Component
+import networkx as nx
+
+from gdm.distribution.components.distribution_bus import DistributionBus
+from gdm.distribution.distribution_system import DistributionSystem
+from gdm.distribution.enums import Phase
+
+
+class ReductionContext:
+    """Graphs and indexes of a distribution system computed once and shared by reducers.
+
+    Every attribute is computed lazily on first access and cached afterwards, so a reducer
+    only pays for what it uses and never rebuilds a graph or a mapping.
+
+    Parameters
+    ----------
+    dist_system : DistributionSystem
+        The distribution system being reduced.
+    """
+
+    def __init__(self, dist_system: DistributionSystem):
+        self.system = dist_system
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """Adds the wall time in seconds spent inside the block to `timings[stage]`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+
+    @cached_property
+    def undirected_graph(self) -> nx.MultiGraph:
+        """Undirected graph of the system."""
+        return self.system.get_undirected_graph()
+
+    @cached_property
+    def tree(self) -> nx.MultiDiGraph:
+        """Radial directed graph of the system rooted at the source bus."""
+        return self.system.get_directed_graph()
+
+    @cached_property
+    def bus_model_types(self) -> list[Type[Component]]:
+        """Model types connected to a single bus, e.g. loads, solars and capacitors."""
+        return self.system.get_model_types_with_field_type(DistributionBus)
+
+    @cached_property
+    def bus_components(self) -> dict[str, list[Component]]:
+        """Single bus components grouped by bus name."""
+        return self.system._get_bus_component_mapping(self.bus_model_types)
+
+    @cached_property
+    def split_phase_mapping(self) -> dict[str, set[Phase]]:
+        """Mapping of split phase component names to the phases of the primary bus."""
+        return self.system._get_split_phase_mapping(self.tree, self.bus_components)
+
+    @cached_property
+    def _preorder(self) -> tuple[list[str], dict[str, int], dict[str, int]]:
+        """Preorder of the tree with the start and end index of every subtree in that order."""
+        order: list[str] = []
+        start: dict[str, int] = {}
+        end: dict[str, int] = {}
+        roots = [node for node, degree in self.tree.in_degree() if degree == 0]
+        for root in roots:
+            start[root] = len(order)
+            order.append(root)
+            stack = [(root, iter(self.tree.successors(root)))]
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    end[node] = len(order)
+                    stack.pop()
+                elif child not in start:
+                    start[child] = len(order)
+                    order.append(child)
+                    stack.append((child, iter(self.tree.successors(child))))
+        return order, start, end
+
+    @cached_property
+    def _is_arborescence(self) -> bool:
+        return all(len(set(self.tree.predecessors(node))) <= 1 for node in self.tree.nodes)
+
+    def descendants(self, node: str) -> list[str]:
+        """Returns all buses downstream of the node."""
+        if not self._is_arborescence:
+            return list(nx.descendants(self.tree, node))
+        order, start, end = self._preorder
+        return order[start[node] + 1 : end[node]]
+
+    def get_attachment_buses(self, kept_buses: set[str]) -> dict[str, str]:
+        """Maps every pruned bus to the closest kept bus upstream of it.
+
+        The tree is walked once in preorder so a parent is always resolved before its
+        children, and nested pruned subtrees are never revisited. Buses without a kept bus
+        upstream of them are left out.
+        """
+        attachment_buses: dict[str, str] = {}
+        order, _, _ = self._preorder
+        for node in order:
+            if node in kept_buses:
+                continue
+            for parent in self.tree.predecessors(node):
+                if parent in kept_buses:
+                    attachment_buses[node] = parent
+                    break
+                if parent in attachment_buses:
+                    attachment_buses[node] = attachment_buses[parent]
+                    break
+        return attachment_buses
+
+    def get_upstream_closure(self, buses: set[str]) -> list[str]:
+        """Returns the buses with every bus on their path to the source, in preorder.
+
+        Each path is only followed until it reaches a bus that is already included, so every
+        bus is visited once.
+        """
+        closure: set[str] = set()
+        for bus in buses:
+            node = bus
+            while node is not None and node not in closure:
+                closure.add(node)
+                node = next(iter(self.tree.predecessors(node)), None)
+        order, _, _ = self._preorder
+        return [node for node in order if node in closure]
+
+    def get_subsystem(
+        self,
+        bus_names: list[str],
+        name: str,
+        keep_timeseries: bool = False,
+        time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+    ) -> DistributionSystem:
+        """Same as `DistributionSystem.get_subsystem` but reuses the cached directed graph."""
+        return self.system._build_subsystem(
+            self.tree,
+            bus_names,
+            name,
+            keep_timeseries=keep_timeseries,
+            time_series_type=time_series_type,
+        )
@@ -0,0 +1,176 @@
+"""This module benchmarks model reductions and checks what they conserve."""
+
+from collections import Counter
+from typing import Annotated, Callable
+from pathlib import Path
+import tracemalloc
+import math
+import time
+
+from pydantic import BaseModel, Field
+from infrasys import Component
+
+from gdm.distribution.model_reduction.reduction_context import ReductionContext
+from gdm.distribution.components.distribution_solar import DistributionSolar
+from gdm.distribution.components.distribution_load import DistributionLoad
+from gdm.distribution.model_reduction.reducer import reduce_to_three_phase_system
+from gdm.distribution.distribution_system import DistributionSystem
+
+
+class SystemSummary(BaseModel):
+    """Data model for the quantities a reduction should conserve."""
+
+    component_counts: Annotated[
+        dict[str, int], Field(..., description="Number of components by type name.")
+    ]
+    load_kw: Annotated[float, Field(..., description="Total load active power in kW.")]
+    load_kvar: Annotated[float, Field(..., description="Total load reactive power in kvar.")]
+    num_customers: Annotated[int, Field(..., description="Total number of load customers.")]
+    solar_kw: Annotated[float, Field(..., description="Total solar rated power in kW.")]
+
+    @classmethod
+    def from_system(cls, dist_system: DistributionSystem) -> "SystemSummary":
+        """Summarizes a distribution system."""
+        counts = Counter(type(comp).__name__ for comp in dist_system.get_components(Component))
+        phase_loads = [
+            phase_load
+            for load in dist_system.get_components(DistributionLoad)
+            for phase_load in load.equipment.phase_loads
+        ]
+        return cls(
+            component_counts=dict(sorted(counts.items())),
+            load_kw=sum(item.real_power.to("kilowatt").magnitude for item in phase_loads),
+            load_kvar=sum(item.reactive_power.to("kilovar").magnitude for item in phase_loads),
+            num_customers=sum(item.num_customers or 0 for item in phase_loads),
+            solar_kw=sum(
+                solar.equipment.rated_power.to("kilowatt").magnitude
+                for solar in dist_system.get_components(DistributionSolar)
+            ),
+        )
+
+
+class ReductionReport(BaseModel):
+    """Data model for the performance and fidelity of a model reduction."""
+
+    reducer: Annotated[str, Field(..., description="Name of the reduction function.")]
+    stage_times: Annotated[
+        dict[str, float], Field(..., description="Wall time in seconds of each reducer stage.")
+    ]
+    total_time: Annotated[float, Field(..., description="Wall time in seconds of the reduction.")]
+    peak_memory_mb: Annotated[
+        float | None,
+        Field(None, description="Peak memory in MB allocated by Python during the reduction."),
+    ]
+    original: Annotated[SystemSummary, Field(..., description="Summary of the original system.")]
+    reduced: Annotated[SystemSummary, Field(..., description="Summary of the reduced system.")]
+    conservation: Annotated[
+        dict[str, bool],
+        Field(..., description="Whether each conserved quantity matches within tolerance."),
+    ]
+
+    @property
+    def is_conservative(self) -> bool:
+        """Returns True if every conservation check passed."""
+        return all(self.conservation.values())
+
+    def to_markdown(self) -> str:
+        """Returns the report as a Markdown document."""
+        lines = [f"# Reduction report: {self.reducer}", "", "## Performance", ""]
+        lines += ["| Stage | Wall time (s) |", "| --- | ---: |"]
+        lines += [f"| {stage} | {value:.4f} |" for stage, value in self.stage_times.items()]
+        lines += [f"| **total** | {self.total_time:.4f} |", ""]
+        if self.peak_memory_mb is not None:
+            lines += [f"Peak memory: {self.peak_memory_mb:.2f} MB", ""]
+
+        lines += ["## Conservation", "", "| Quantity | Original | Reduced | Conserved |"]
+        lines += ["| --- | ---: | ---: | :---: |"]
+        for quantity, passed in self.conservation.items():
+            original, reduced = getattr(self.original, quantity), getattr(self.reduced, quantity)
+            lines.append(
+                f"| {quantity} | {original:g} | {reduced:g} | {'yes' if passed else 'no'} |"
+            )
+
+        lines += ["", "## Component counts", "", "| Type | Original | Reduced |"]
+        lines += ["| --- | ---: | ---: |"]
+        type_names = sorted(
+            set(self.original.component_counts) | set(self.reduced.component_counts)
+        )
+        for type_name in type_names:
+            lines.append(
+                f"| {type_name} | {self.original.component_counts.get(type_name, 0)} "
+                f"| {self.reduced.component_counts.get(type_name, 0)} |"
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: Path | str) -> None:
+        """Writes the report as Markdown for a .md suffix and as JSON otherwise."""
+        filename = Path(filename)
+        if filename.suffix == ".md":
+            filename.write_text(self.to_markdown(), encoding="utf-8")
+        else:
+            filename.write_text(self.model_dump_json(indent=2), encoding="utf-8")
+
+
+def benchmark_reduction(
+    dist_system: DistributionSystem,
+    reducer: Callable[..., DistributionSystem] = reduce_to_three_phase_system,
+    trace_memory: bool = True,
+    rel_tol: float = 1e-6,
+    **kwargs,
+) -> tuple[DistributionSystem, ReductionReport]:
+    """Runs a reducer and reports its stage timings, memory and conservation checks.
+
+    Parameters
+    ----------
+    dist_system : DistributionSystem
+        System to reduce.
+    reducer : Callable[..., DistributionSystem], optional
+        Reduction function accepting a `context` keyword argument, by default
+        `reduce_to_three_phase_system`.
+    trace_memory : bool, optional
+        Track peak memory with tracemalloc, which slows the reduction down, by default True.
+    rel_tol : float, optional
+        Relative tolerance of the conservation checks, by default 1e-6.
+    **kwargs
+        Arguments passed to the reducer, e.g. `name` and `agg_timeseries`.
+
+    Returns
+    -------
+    tuple[DistributionSystem, ReductionReport]
+        The reduced system and its report.
+    """
+    kwargs.setdefault("name", f"{dist_system.name or 'system'}_reduced")
+    original = SystemSummary.from_system(dist_system)
+    context = ReductionContext(dist_system)
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with context.timed("graph"):
+            context.tree
+            context.undirected_graph
+        reduced_system = reducer(dist_system, context=context, **kwargs)
+        total_time = time.perf_counter() - start
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1e6 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    reduced = SystemSummary.from_system(reduced_system)
+    conservation = {
+        quantity: math.isclose(
+            getattr(original, quantity), getattr(reduced, quantity), rel_tol=rel_tol, abs_tol=1e-9
+        )
+        for quantity in ("load_kw", "load_kvar", "num_customers", "solar_kw")
+    }
+    report = ReductionReport(
+        reducer=getattr(reducer, "__name__", str(reducer)),
+        stage_times=dict(context.timings),
+        total_time=total_time,
+        peak_memory_mb=peak_memory_mb,
+        original=original,
+        reduced=reduced,
+        conservation=conservation,
+    )
+    return reduced_system, report
@@ -0,0 +1,141 @@
+"""This module contains composable selectors choosing the buses kept by `reduce_system`."""
+
+from functools import cached_property
+from typing import Callable, Iterable
+
+import numpy as np
+
+from gdm.distribution.components.distribution_battery import DistributionBattery
+from gdm.distribution.components.distribution_solar import DistributionSolar
+from gdm.distribution.components.distribution_bus import DistributionBus
+from gdm.distribution.model_reduction.reduction_context import ReductionContext
+from gdm.quantities import ActivePower, Distance, Voltage
+from gdm.distribution.enums import Phase
+
+
+class BusTable:
+    """Columnar view of the bus attributes selectors are evaluated on.
+
+    Every column is a numpy array aligned with `names`. Columns built from bus fields are
+    filled in a single pass over the buses, columns that need the graph or the single bus
+    components are computed on first access.
+
+    Parameters
+    ----------
+    context : ReductionContext
+        Reduction context of the system whose buses are tabulated.
+    """
+
+    def __init__(self, context: ReductionContext):
+        self.context = context
+        buses: list[DistributionBus] = list(context.system.get_components(DistributionBus))
+        self.names = np.array([bus.name for bus in buses], dtype=object)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.rated_voltage = np.array(
+            [bus.rated_voltage.to("kilovolt").magnitude for bus in buses], dtype=float
+        )
+        self.num_phases = np.array([len(set(bus.phases) - {Phase.N}) for bus in buses], dtype=int)
+        self.feeder = np.array(
+            [bus.feeder.name if bus.feeder else None for bus in buses], dtype=object
+        )
+        self.substation = np.array(
+            [bus.substation.name if bus.substation else None for bus in buses], dtype=object
+        )
+
+    @cached_property
+    def distance(self) -> np.ndarray:
+        """Distance in km from the source bus along the radial network."""
+        distance = np.full(len(self.names), np.inf)
+        order, _, _ = self.context._preorder
+        tree = self.context.tree
+        system = self.context.system
+        for node in order:
+            parent = next(iter(tree.predecessors(node)), None)
+            if parent is None:
+                distance[self.index[node]] = 0.0
+                continue
+            edge = next(iter(tree.get_edge_data(parent, node).values()))
+            length = getattr(system.get_component(edge["type"], edge["name"]), "length", None)
+            distance[self.index[node]] = distance[self.index[parent]] + (
+                length.to("km").magnitude if length is not None else 0.0
+            )
+        return distance
+
+    @cached_property
+    def der_power(self) -> np.ndarray:
+        """Rated active power in kW of the solar and battery systems connected to each bus."""
+        der_power = np.zeros(len(self.names))
+        for bus_name, components in self.context.bus_components.items():
+            for component in components:
+                if isinstance(component, (DistributionSolar, DistributionBattery)):
+                    der_power[self.index[bus_name]] += component.equipment.rated_power.to(
+                        "kilowatt"
+                    ).magnitude
+        return der_power
+
+    def select(self, selector: "BusSelector") -> list[str]:
+        """Returns the names of the buses chosen by the selector."""
+        return list(self.names[selector(self)])
+
+
+class BusSelector:
+    """Vectorized predicate choosing buses from a `BusTable`.
+
+    Selectors are combined with `&`, `|` and `~`, the combined selector is still
+    evaluated column-wise over all buses at once.
+
+    Parameters
+    ----------
+    func : Callable[[BusTable], np.ndarray]
+        Function returning a boolean mask aligned with `BusTable.names`.
+    """
+
+    def __init__(self, func: Callable[[BusTable], np.ndarray]):
+        self._func = func
+
+    def __call__(self, table: BusTable) -> np.ndarray:
+        return np.asarray(self._func(table), dtype=bool)
+
+    def __and__(self, other: "BusSelector") -> "BusSelector":
+        return BusSelector(lambda table: self(table) & other(table))
+
+    def __or__(self, other: "BusSelector") -> "BusSelector":
+        return BusSelector(lambda table: self(table) | other(table))
+
+    def __invert__(self) -> "BusSelector":
+        return BusSelector(lambda table: ~self(table))
+
+
+def voltage_above(voltage: Voltage) -> BusSelector:
+    """Selects buses with a rated voltage above the threshold."""
+    threshold = voltage.to("kilovolt").magnitude
+    return BusSelector(lambda table: table.rated_voltage > threshold)
+
+
+def min_phases(num_phases: int) -> BusSelector:
+    """Selects buses with at least num_phases phases, the neutral is not counted."""
+    return BusSelector(lambda table: table.num_phases >= num_phases)
+
+
+def in_feeders(feeder_names: Iterable[str]) -> BusSelector:
+    """Selects buses belonging to one of the feeders."""
+    feeder_names = list(feeder_names)
+    return BusSelector(lambda table: np.isin(table.feeder, feeder_names))
+
+
+def within_distance(distance: Distance) -> BusSelector:
+    """Selects buses closer to the source bus than distance along the network."""
+    threshold = distance.to("km").magnitude
+    return BusSelector(lambda table: table.distance <= threshold)
+
+
+def bus_names(names: Iterable[str]) -> BusSelector:
+    """Selects the listed buses, e.g. monitored buses."""
+    names = list(names)
+    return BusSelector(lambda table: np.isin(table.names, names))
+
+
+def der_above(power: ActivePower) -> BusSelector:
+    """Selects buses whose connected solar and battery rated power exceeds the threshold."""
+    threshold = power.to("kilowatt").magnitude
+    return BusSelector(lambda table: table.der_power > threshold)
@@ -0,0 +1,177 @@
+"""This module merges chains of series line segments into single equivalent branches."""
+
+from uuid import uuid4
+
+from loguru import logger
+import networkx as nx
+
+from gdm.distribution.components.base.distribution_branch_base import DistributionBranchBase
+from gdm.distribution.components.matrix_impedance_branch import MatrixImpedanceBranch
+from gdm.distribution.components.geometry_branch import GeometryBranch
+from gdm.distribution.components.distribution_bus import DistributionBus
+from gdm.distribution.equipment.matrix_impedance_branch_equipment import (
+    MatrixImpedanceBranchEquipment,
+)
+from gdm.distribution.distribution_system import DistributionSystem
+from gdm.quantities import (
+    CapacitancePULength,
+    ResistancePULength,
+    ReactancePULength,
+    Distance,
+    Current,
+)
+
+MERGEABLE_BRANCH_TYPES = (MatrixImpedanceBranch, GeometryBranch)
+
+
+def _get_mergeable_branches(
+    dist_system: DistributionSystem, graph: nx.MultiGraph, bus: DistributionBus
+) -> list[DistributionBranchBase] | None:
+    """Returns the two segments meeting at bus if the bus can be removed, None otherwise.
+
+    A bus can be removed when exactly two line segments with identical phasing connect to it
+    and nothing else references it.
+    """
+    if graph.degree(bus.name) != 2 or len(set(graph.neighbors(bus.name))) != 2:
+        return None
+    parents = dist_system.list_parent_components(bus)
+    if len(parents) != 2 or any(type(comp) not in MERGEABLE_BRANCH_TYPES for comp in parents):
+        return None
+    first, second = parents
+    if first.phases != second.phases or first.in_service != second.in_service:
+        return None
+    return parents
+
+
+def _walk_chain(
+    start: str,
+    branch: DistributionBranchBase,
+    removable: dict[str, list[DistributionBranchBase]],
+) -> tuple[list[str], list[DistributionBranchBase]]:
+    """Follows removable buses from start through branch until a kept bus or start again."""
+    buses, branches = [start], [branch]
+    node = start
+    while True:
+        node = next(bus.name for bus in branch.buses if bus.name != node)
+        buses.append(node)
+        if node not in removable or node == start:
+            return buses, branches
+        branch = next(item for item in removable[node] if item is not branch)
+        branches.append(branch)
+
+
+def _merge_matrix_branches(
+    branches: list[DistributionBranchBase], buses: list[DistributionBus]
+) -> MatrixImpedanceBranch:
+    """Returns a branch whose impedance is the series sum of the branches."""
+    segments = [
+        branch.to_matrix_representation() if isinstance(branch, GeometryBranch) else branch
+        for branch in branches
+    ]
+    length = sum(branch.length.to("km").magnitude for branch in segments)
+
+    def _sum_over_length(field: str, unit: str):
+        return sum(
+            getattr(branch.equipment, field).to(unit).magnitude * branch.length.to("km").magnitude
+            for branch in segments
+        )
+
+    name = branches[0].name
+    return MatrixImpedanceBranch(
+        name=name,
+        buses=buses,
+        length=Distance(length, "km"),
+        phases=branches[0].phases,
+        substation=branches[0].substation,
+        feeder=branches[0].feeder,
+        in_service=branches[0].in_service,
+        equipment=MatrixImpedanceBranchEquipment(
+            name=f"{name}_equipment",
+            construction=segments[0].equipment.construction,
+            r_matrix=ResistancePULength(_sum_over_length("r_matrix", "ohm/km") / length, "ohm/km"),
+            x_matrix=ReactancePULength(_sum_over_length("x_matrix", "ohm/km") / length, "ohm/km"),
+            c_matrix=CapacitancePULength(
+                _sum_over_length("c_matrix", "nanofarad/km") / length, "nanofarad/km"
+            ),
+            ampacity=Current(_sum_over_length("ampacity", "ampere") / length, "ampere"),
+        ),
+    )
+
+
+def _merge_branches(
+    branches: list[DistributionBranchBase], buses: list[DistributionBus]
+) -> DistributionBranchBase:
+    """Returns the equivalent branch of a chain of series segments."""
+    first = branches[0]
+    if all(
+        isinstance(branch, GeometryBranch) and branch.equipment.uuid == first.equipment.uuid
+        for branch in branches
+    ):
+        return first.model_copy(
+            update={
+                "uuid": uuid4(),
+                "buses": buses,
+                "length": Distance(sum(b.length.to("km").magnitude for b in branches), "km"),
+            }
+        )
+    return _merge_matrix_branches(branches, buses)
+
+
+def merge_series_branches(dist_system: DistributionSystem) -> dict[str, list[str]]:
+    """Merges chains of line segments joined by otherwise unused buses, in place.
+
+    A bus is removed when it connects exactly two `MatrixImpedanceBranch` or `GeometryBranch`
+    segments with identical phasing and no other component references it. Every chain of such
+    buses is replaced by a single branch between the kept end buses. The per unit length
+    matrices of the merged branch are the length weighted average of the segments, so its
+    total impedance is the sum of the segment impedances, and the ampacity is length weighted.
+    Geometry segments sharing the same equipment are merged into a longer geometry branch,
+    other chains are converted to a `MatrixImpedanceBranch`.
+
+    Parameters
+    ----------
+    dist_system : DistributionSystem
+        System to simplify.
+
+    Returns
+    -------
+    dict[str, list[str]]
+        Mapping of merged branch names to the names of the segments they replace.
+    """
+    graph = dist_system.get_undirected_graph()
+    removable: dict[str, list[DistributionBranchBase]] = {}
+    for bus in dist_system.get_components(DistributionBus):
+        branches = _get_mergeable_branches(dist_system, graph, bus)
+        if branches is not None:
+            removable[bus.name] = branches
+
+    chains: list[tuple[list[str], list[DistributionBranchBase]]] = []
+    visited: set[str] = set()
+    for bus_name, (first, second) in removable.items():
+        if bus_name in visited:
+            continue
+        upstream_buses, upstream_branches = _walk_chain(bus_name, first, removable)
+        downstream_buses, downstream_branches = _walk_chain(bus_name, second, removable)
+        chain_buses = upstream_buses[::-1] + downstream_buses[1:]
+        visited.update(chain_buses[1:-1])
+        if chain_buses[0] == chain_buses[-1]:
+            # Loops have no two distinct end buses to connect the merged branch to.
+            continue
+        chains.append((chain_buses, upstream_branches[::-1] + downstream_branches))
+
+    provenance: dict[str, list[str]] = {}
+    for chain_buses, chain_branches in chains:
+        end_buses = [dist_system.get_component(DistributionBus, chain_buses[i]) for i in (0, -1)]
+        merged = _merge_branches(chain_branches, end_buses)
+        # Added first so the end buses stay referenced while the segments are removed, the
+        # intermediate buses and unused equipment are removed along with the segments.
+        dist_system.add_component(merged)
+        for branch in chain_branches:
+            dist_system.remove_component(branch)
+        provenance[merged.name] = [branch.name for branch in chain_branches]
+
+    logger.info(
+        f"Merged {sum(len(v) for v in provenance.values())} line segments "
+        f"into {len(provenance)} branches."
+    )
+    return provenance
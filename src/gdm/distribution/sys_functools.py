@@ -4,7 +4,6 @@ from functools import singledispatch
 import pandas as pd
 
 from infrasys.time_series_models import (
-    SingleTimeSeriesMetadata,
     NonSequentialTimeSeries,
     TimeSeriesMetadata,
     SingleTimeSeries,
@@ -29,7 +28,7 @@ from gdm.exceptions import (
     GDMQuantityError,
     GDMQuantityUnitsError,
 )
-from gdm.quantities import ActivePower
+from gdm.quantities import ActivePower, ReactivePower
 
 
 def get_timeseries_actual_data(
@@ -242,11 +241,37 @@ def get_aggregated_solar_timeseries(
         )
 
 
+def _get_battery_power_scale(
+    battery: DistributionBattery, metadata: TimeSeriesMetadata, units: str
+) -> float:
+    """Internal function to return the multiplier converting a battery profile to power."""
+
+    if metadata.features is None:
+        msg = f"The {metadata.name} data is not a GDM quantity: {metadata.get_time_series_data_type()}"
+        raise GDMQuantityError(msg)
+
+    user_attr = UserAttributes.model_validate(metadata.features)
+    if user_attr.use_actual:
+        return 1.0
+
+    if metadata.name in {"active_power", "reactive_power"}:
+        return battery.equipment.rated_power.to(units).magnitude
+    msg = f"{metadata.name} is not supported for battery power calculation."
+    raise UnsupportedVariableError(msg)
+
+
 def get_aggregated_battery_timeseries(
-    sys: DistributionSystem, batteries: list[DistributionBattery], var_name: str
-) -> SingleTimeSeries:
+    sys: DistributionSystem,
+    batteries: list[DistributionBattery],
+    var_name: str,
+    time_series_type: Type[TimeSeriesData] = SingleTimeSeries,
+) -> TimeSeriesData:
     """Method to return combined battery time series data.
 
+    Battery profiles are stacked into a matrix and combined in a single matrix product. Profiles
+    flagged with `use_actual` are summed as is, the remaining profiles are treated as multipliers
+    of the battery rated power, for both `active_power` and `reactive_power`.
+
     Parameters
     ----------
     sys: DistributionSystem
@@ -255,30 +280,68 @@ def get_aggregated_battery_timeseries(
         List of battery for aggregating timeseries data.
     var_name: str
         Variable name used for time series aggregation.
+    time_series_type: Type[TimeSeriesData]
+        Type of time series data. Defaults to: SingleTimeSeries
 
     Returns
     -------
-    SingleTimeSeries
+    TimeSeriesData
     """
-    ts_components: list[SingleTimeSeries] = [
-        sys.get_time_series(battery, var_name) for battery in batteries
+    if time_series_type.__name__ not in {"SingleTimeSeries", "NonSequentialTimeSeries"}:
+        msg = f"Incompatible time series data: {time_series_type.__name__}"
+        raise IncompatibleTimeSeries(msg)
+
+    if var_name not in {"active_power", "reactive_power"}:
+        msg = f"{var_name=} is not supported for battery timeseries aggregation."
+        raise UnsupportedVariableError(msg)
+
+    ts_components: list[TimeSeriesData] = [
+        sys.get_time_series(battery, var_name, time_series_type=time_series_type)
+        for battery in batteries
     ]
-    _check_for_timeseries_consistency(ts_components)
-    ts_metadata: list[SingleTimeSeriesMetadata] = [
-        sys.list_time_series_metadata(battery, var_name)[0] for battery in batteries
+    times_series_sample = ts_components[0]
+    _check_for_timeseries_consistency(times_series_sample, ts_components)
+
+    ts_metadata: list[TimeSeriesMetadata] = [
+        sys.list_time_series_metadata(battery, var_name, time_series_type=time_series_type)[0]
+        for battery in batteries
     ]
     _check_for_timeseries_metadata_consistency(ts_metadata)
-    ts_battery_data = [
-        _get_load_power(battery, ts_data, metadata)
-        for battery, ts_data, metadata in zip(batteries, ts_components, ts_metadata)
-    ]
-    return SingleTimeSeries(
-        data=sum(ts_battery_data),
-        name=var_name,
-        normalization=None,
-        initial_timestamp=ts_components[0].initial_timestamp,
-        resolution=ts_components[0].resolution,
+
+    units = "kilowatt" if var_name == "active_power" else "kilovar"
+    quantity_type = ActivePower if var_name == "active_power" else ReactivePower
+    scales = np.array(
+        [
+            _get_battery_power_scale(battery, metadata, units)
+            for battery, metadata in zip(batteries, ts_metadata)
+        ]
     )
+    profiles = []
+    for ts_data, metadata in zip(ts_components, ts_metadata):
+        denormalized_data = get_timeseries_actual_data(ts_data)
+        if UserAttributes.model_validate(metadata.features).use_actual:
+            if not isinstance(denormalized_data, Quantity):
+                msg = f"Denormalized data is not a pint Quantity: {type(denormalized_data)}"
+                raise GDMQuantityError(msg)
+            denormalized_data = denormalized_data.to(units)
+        profiles.append(np.asarray(getattr(denormalized_data, "magnitude", denormalized_data)))
+    ts_battery_data = quantity_type(scales @ np.vstack(profiles), units)
+
+    if isinstance(times_series_sample, SingleTimeSeries):
+        return SingleTimeSeries(
+            data=ts_battery_data,
+            name=var_name,
+            normalization=None,
+            initial_timestamp=times_series_sample.initial_timestamp,
+            resolution=times_series_sample.resolution,
+        )
+    else:
+        return NonSequentialTimeSeries(
+            data=ts_battery_data,
+            timestamps=times_series_sample.timestamps,
+            name=var_name,
+            normalization=None,
+        )
 
 
 def get_aggregated_load_timeseries(
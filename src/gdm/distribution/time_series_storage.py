@@ -0,0 +1,130 @@
+"""This module contains time series storage shared between a system and its subsystems."""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+import shutil
+
+from infrasys.time_series_models import TimeSeriesData, TimeSeriesMetadata
+from infrasys.time_series_storage_base import TimeSeriesStorageBase
+from infrasys.time_series_manager import TimeSeriesManager
+from infrasys.arrow_storage import ArrowTimeSeriesStorage, EXTENSION
+from infrasys.exceptions import ISNotStored
+
+
+class SharedTimeSeriesStorage(TimeSeriesStorageBase):
+    """Time series storage that references arrays held by a parent storage.
+
+    Arrays linked from the parent are read directly from the parent storage and are never
+    duplicated. Arrays added to the owning system are written to a private storage that is
+    created on first use. Removing a linked array only drops the reference, the parent data
+    is left untouched. Linked arrays are shared, not copied on write: the parent must keep
+    them, reading a linked array removed from the parent raises `ISNotStored`.
+
+    Parameters
+    ----------
+    parent : TimeSeriesStorageBase
+        Storage of the system the arrays are shared from.
+    """
+
+    def __init__(self, parent: TimeSeriesStorageBase) -> None:
+        self._parent = parent
+        self._linked: dict[UUID, TimeSeriesMetadata] = {}
+        self._owned: dict[UUID, TimeSeriesMetadata] = {}
+        self._storage: TimeSeriesStorageBase | None = None
+
+    @property
+    def parent(self) -> TimeSeriesStorageBase:
+        """Return the parent storage."""
+        return self._parent
+
+    def link_time_series(self, metadata: TimeSeriesMetadata) -> None:
+        """Reference an array stored in the parent storage without copying it."""
+        if metadata.time_series_uuid not in self._owned:
+            self._linked[metadata.time_series_uuid] = metadata
+
+    def is_linked(self, time_series_uuid: UUID) -> bool:
+        """Return True if the array is read from the parent storage."""
+        return time_series_uuid in self._linked
+
+    def _get_storage(self) -> TimeSeriesStorageBase:
+        if self._storage is None:
+            self._storage = TimeSeriesManager.create_new_storage()
+        return self._storage
+
+    def add_time_series(
+        self,
+        metadata: TimeSeriesMetadata,
+        time_series: TimeSeriesData,
+        context: Any = None,
+    ) -> None:
+        if metadata.time_series_uuid in self._linked:
+            return
+        self._get_storage().add_time_series(metadata, time_series, context=context)
+        self._owned[metadata.time_series_uuid] = metadata
+
+    def get_time_series_directory(self) -> Path | None:
+        return self._get_storage().get_time_series_directory()
+
+    def get_time_series(
+        self,
+        metadata: TimeSeriesMetadata,
+        start_time: datetime | None = None,
+        length: int | None = None,
+        context: Any = None,
+    ) -> TimeSeriesData:
+        if metadata.time_series_uuid in self._linked:
+            try:
+                return self._parent.get_time_series(
+                    metadata, start_time=start_time, length=length, context=context
+                )
+            except (FileNotFoundError, ISNotStored) as err:
+                msg = (
+                    f"Time series {metadata.time_series_uuid} was removed from the parent "
+                    "storage it is shared from."
+                )
+                raise ISNotStored(msg) from err
+        if self._storage is None:
+            msg = f"No time series with {metadata.time_series_uuid} is stored"
+            raise ISNotStored(msg)
+        return self._storage.get_time_series(
+            metadata, start_time=start_time, length=length, context=context
+        )
+
+    def remove_time_series(self, metadata: TimeSeriesMetadata, context: Any = None) -> None:
+        if self._linked.pop(metadata.time_series_uuid, None) is not None:
+            return
+        if self._owned.pop(metadata.time_series_uuid, None) is None:
+            msg = f"No time series with {metadata.time_series_uuid} is stored"
+            raise ISNotStored(msg)
+        self._storage.remove_time_series(metadata, context=context)
+
+    def serialize(
+        self, data: dict[str, Any], dst: Path | str, src: Path | str | None = None
+    ) -> None:
+        """Write linked and owned arrays to dst using the Arrow layout."""
+        dst_path = Path(dst)
+        target = ArrowTimeSeriesStorage.create_with_permanent_directory(dst_path)
+        for storage, metadata_map in ((self._parent, self._linked), (self._storage, self._owned)):
+            for ts_uuid, metadata in metadata_map.items():
+                if isinstance(storage, ArrowTimeSeriesStorage):
+                    fpath = storage.get_time_series_directory() / f"{ts_uuid}{EXTENSION}"
+                    shutil.copyfile(fpath, dst_path / fpath.name)
+                else:
+                    target.add_time_series(metadata, storage.get_time_series(metadata))
+        target.add_serialized_data(data)
+
+    @classmethod
+    def deserialize(
+        cls,
+        data: dict[str, Any],
+        time_series_dir: Path,
+        dst_time_series_directory: Path | None,
+        read_only: bool,
+        **kwargs: Any,
+    ) -> tuple[ArrowTimeSeriesStorage, None]:
+        # Shared storage is always serialized with the Arrow layout.
+        return ArrowTimeSeriesStorage.deserialize(
+            data, time_series_dir, dst_time_series_directory, read_only, **kwargs
+        )
@@ -19,24 +19,30 @@ change_map = {
 }
 
 
-def _replace_value(d, target, new):
+def _replace_values(d: dict) -> None:
+    """Renames the values found in change_map in a single recursive pass."""
     for k, v in d.items():
         if isinstance(v, dict):
-            _replace_value(v, target, new)
-        elif v == target:
-            d[k] = new
+            _replace_values(v)
+        elif isinstance(v, str) and v in change_map:
+            d[k] = change_map[v]
 
 
-def from__2_0_1__to__2_1_2(data: dict, from_version: str, to_version: str) -> dict:
+def upgrade_component(component: dict) -> dict:
+    _replace_values(component)
+    return component
+
+
+def upgrade_document(data: dict, from_version: str, to_version: str) -> dict:
     logger.info(f"Upgrading DistributionSystem from verion {from_version} to {to_version}")
     data["data_format_version"] = str(to_version)
+    return data
+
+
+def from__2_0_1__to__2_1_2(data: dict, from_version: str, to_version: str) -> dict:
+    data = upgrade_document(data, from_version, to_version)
     number_of_components_before = len(data["components"])
-    components = []
-    for component in data["components"]:
-        for c in change_map:
-            _replace_value(component, c, change_map[c])
-        components.append(component)
-    data["components"] = components
+    data["components"] = [upgrade_component(component) for component in data["components"]]
     number_of_components_after = len(data["components"])
     assert (
         number_of_components_before == number_of_components_after
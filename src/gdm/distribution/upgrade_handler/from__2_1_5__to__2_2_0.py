@@ -2,11 +2,20 @@ from loguru import logger
 from infrasys.migrations.metadata_migration import migrate_component_metadata
 
 
-def from__2_1_5__to__2_2_0(data: dict, from_version: str, to_version: str) -> dict:
+def upgrade_component(component: dict) -> dict:
+    return migrate_component_metadata([component])[0]
+
+
+def upgrade_document(data: dict, from_version: str, to_version: str) -> dict:
     logger.info(f"Upgrading DistributionSystem from verion {from_version} to {to_version}")
     data["data_format_version"] = str(to_version)
+    return data
+
+
+def from__2_1_5__to__2_2_0(data: dict, from_version: str, to_version: str) -> dict:
+    data = upgrade_document(data, from_version, to_version)
     number_of_components_before = len(data["components"])
-    data["components"] = migrate_component_metadata(data["components"])
+    data["components"] = [upgrade_component(component) for component in data["components"]]
     number_of_components_after = len(data["components"])
     assert (
         number_of_components_before == number_of_components_after
@@ -1,5 +1,12 @@
 from collections import Counter
+from pathlib import Path
+from typing import Callable
+import importlib.metadata
+import hashlib
+import inspect
+import os
 
+from loguru import logger
 from pydantic import (
     GetCoreSchemaHandler,
     model_validator,
@@ -10,13 +17,17 @@ from pydantic import (
 from pydantic_core import core_schema
 
 from semver import Version
+import orjson
 
-from gdm.distribution.upgrade_handler.from__2_0_1__to__2_1_2 import from__2_0_1__to__2_1_2
+from gdm.streaming_serialization import _JSONStreamReader
+from gdm.distribution.upgrade_handler import (
+    from__2_0_1__to__2_1_2 as v2_1_2,
+    from__2_1_5__to__2_2_0 as v2_2_0,
+    from__2_2_0__to__2_2_1 as v2_2_1,
+)
 from gdm.distribution.upgrade_handler.from__2_1_2__to__2_1_3 import from__2_1_2__to__2_1_3
 from gdm.distribution.upgrade_handler.from__2_1_3__to__2_1_4 import from__2_1_3__to__2_1_4
 from gdm.distribution.upgrade_handler.from__2_1_4__to__2_1_5 import from__2_1_4__to__2_1_5
-from gdm.distribution.upgrade_handler.from__2_1_5__to__2_2_0 import from__2_1_5__to__2_2_0
-from gdm.distribution.upgrade_handler.from__2_2_0__to__2_2_1 import from__2_2_0__to__2_2_1
 
 
 def fix_version(version):
@@ -25,6 +36,41 @@ def fix_version(version):
     return version
 
 
+def _callable_fingerprint(method: Callable | None) -> str:
+    """Identifies a migration function by its qualified name and the source code of its module.
+
+    The whole module is hashed so editing a helper the function calls changes the fingerprint.
+    """
+    if method is None:
+        return ""
+    try:
+        source = inspect.getsource(inspect.getmodule(method) or method)
+    except (OSError, TypeError):
+        source = ""
+    name = f"{getattr(method, '__module__', '')}.{getattr(method, '__qualname__', '')}"
+    return f"{name}:{hashlib.sha256(source.encode()).hexdigest()}"
+
+
+def _hash_file(filename: Path) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f_in:
+        for chunk in iter(lambda: f_in.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _upgrade_components(data: dict, component_methods: list) -> dict:
+    """Applies the component methods of consecutive migrations in one pass over components."""
+    if component_methods:
+        components = []
+        for component in data["components"]:
+            for component_method in component_methods:
+                component = component_method(component)
+            components.append(component)
+        data["components"] = components
+    return data
+
+
 class SemanticVersion(Version):
     @classmethod
     def __get_pydantic_core_schema__(cls, source_type, handler: GetCoreSchemaHandler):
@@ -39,7 +85,19 @@ class SemanticVersion(Version):
 
 
 class UpgradeSchema(BaseModel):
+    """Migration of the serialized system from one data format version to the next.
+
+    method upgrades the document. component_method optionally upgrades one serialized
+    component, method then leaves the components alone, like the `upgrade_document` step of
+    a `from__X__to__Y` migration. The component methods of consecutive migrations are
+    applied in a single pass over the components after their document methods.
+    A method without a component method may read or rewrite the components, the pending
+    component methods are then applied before it unless reads_components is False.
+    """
+
     method: SkipValidation
+    component_method: SkipValidation[Callable | None] = None
+    reads_components: bool = True
     from_version: SemanticVersion
     to_version: SemanticVersion
 
@@ -65,32 +123,38 @@ class UpgradeSchema(BaseModel):
 class UpgradeHandler(BaseModel):
     upgrade_schemas: list[UpgradeSchema] = [
         UpgradeSchema(
-            method=from__2_0_1__to__2_1_2,
+            method=v2_1_2.upgrade_document,
+            component_method=v2_1_2.upgrade_component,
             from_version="2.0.1",
             to_version="2.1.2",
         ),
         UpgradeSchema(
             method=from__2_1_2__to__2_1_3,
+            reads_components=False,
             from_version="2.1.2",
             to_version="2.1.3",
         ),
         UpgradeSchema(
             method=from__2_1_3__to__2_1_4,
+            reads_components=False,
             from_version="2.1.3",
             to_version="2.1.4",
         ),
         UpgradeSchema(
             method=from__2_1_4__to__2_1_5,
+            reads_components=False,
             from_version="2.1.4",
             to_version="2.1.5",
         ),
         UpgradeSchema(
-            method=from__2_1_5__to__2_2_0,
+            method=v2_2_0.upgrade_document,
+            component_method=v2_2_0.upgrade_component,
             from_version="2.1.5",
             to_version="2.2.0",
         ),
         UpgradeSchema(
-            method=from__2_2_0__to__2_2_1,
+            method=v2_2_1.upgrade_document,
+            component_method=v2_2_1.upgrade_component,
             from_version="2.2.0",
             to_version="2.2.1",
         ),
@@ -142,7 +206,113 @@ class UpgradeHandler(BaseModel):
 
         return final_upgrade_handlers
 
+    def chain_fingerprint(self, from_version: str, to_version: str) -> str:
+        """Returns a hash identifying the migrations upgrading from_version to to_version.
+
+        The installed grid-data-models and infrasys versions are included, as the migrations
+        depend on helpers of both packages.
+        """
+        digest = hashlib.sha256()
+        for package in ("grid-data-models", "infrasys"):
+            digest.update(f"{package}=={importlib.metadata.version(package)}|".encode())
+        for handler in self._get_upgrade_handlers(from_version, to_version):
+            digest.update(
+                "|".join(
+                    [
+                        str(handler.from_version),
+                        str(handler.to_version),
+                        _callable_fingerprint(handler.method),
+                        _callable_fingerprint(handler.component_method),
+                    ]
+                ).encode()
+            )
+        return digest.hexdigest()
+
+    def upgrade_file(
+        self,
+        filename: Path | str,
+        to_version: str | None = None,
+        cache_dir: Path | str | None = None,
+    ) -> Path:
+        """Upgrades a system JSON file and caches the upgraded file for later loads.
+
+        The cached file is keyed by the content hash of the source file, the target version
+        and the fingerprint of the migrations in the chain, so editing the source file or a
+        migration invalidates it. Loading the returned file skips the upgrade entirely. Its
+        time series directory refers to the one of the source file.
+
+        Parameters
+        ----------
+        filename : Path | str
+            JSON file written by `to_json`.
+        to_version : str, optional
+            Target data format version, by default the installed grid-data-models version.
+        cache_dir : Path | str, optional
+            Directory of the upgraded files, by default the directory of the source file.
+
+        Returns
+        -------
+        Path
+            Upgraded JSON file, or filename if it is already at the target version.
+
+        Examples
+        --------
+        >>> filename = UpgradeHandler().upgrade_file("archive/feeder.json", cache_dir="cache")
+        >>> system = DistributionSystem.from_json(filename)
+        """
+        filename = Path(filename)
+        to_version = to_version or importlib.metadata.version("grid-data-models")
+        from_version = self._read_data_format_version(filename)
+        if from_version == to_version:
+            return filename
+
+        key = hashlib.sha256(
+            "|".join(
+                [
+                    _hash_file(filename),
+                    to_version,
+                    self.chain_fingerprint(from_version, to_version),
+                ]
+            ).encode()
+        ).hexdigest()
+        cache_dir = filename.parent if cache_dir is None else Path(cache_dir)
+        cached_file = cache_dir / f"{filename.stem}.upgraded-{key[:16]}.json"
+        if cached_file.exists():
+            logger.info(f"Using upgraded file {cached_file} of {filename}")
+            return cached_file
+
+        data = orjson.loads(filename.read_bytes())
+        data = self.upgrade(data, from_version, to_version)
+        time_series = data.get("time_series")
+        if isinstance(time_series, dict) and "directory" in time_series:
+            time_series["directory"] = str((filename.parent / time_series["directory"]).resolve())
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cached_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_bytes(orjson.dumps(data))
+        os.replace(tmp_file, cached_file)
+        logger.info(f"Wrote upgraded file {cached_file} of {filename}")
+        return cached_file
+
+    @staticmethod
+    def _read_data_format_version(filename: Path) -> str:
+        """Reads the data format version, stored before the components by `to_json`."""
+        with open(filename, "r", encoding="utf-8") as f_in:
+            reader = _JSONStreamReader(f_in, 1 << 16)
+            for key in reader.iter_object():
+                if key == "data_format_version":
+                    return reader.decode_value()
+                reader.decode_value()
+        msg = f"{filename} has no data_format_version."
+        raise ValueError(msg)
+
     def upgrade(self, data, from_version, to_version):
         handlers = self._get_upgrade_handlers(from_version, to_version)
+        component_methods = []
         for handler in handlers:
+            if handler.component_method is None and handler.reads_components:
+                data = _upgrade_components(data, component_methods)
+                component_methods = []
             data = handler.method(data, handler.from_version, handler.to_version)
+            if handler.component_method is not None:
+                component_methods.append(handler.component_method)
+        return _upgrade_components(data, component_methods)
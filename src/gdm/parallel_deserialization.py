@@ -0,0 +1,260 @@
+"""This module constructs the components of a system in worker processes while loading it.
+
+Components are grouped by level, leaf components like equipment referring to no other
+component come first and every other component comes in the level after the deepest
+component it refers to. The components of a level are independent of each other, so they
+are validated in forked workers which inherit the components of the previous levels.
+Pickled quantities lose their type and the units defined by this package, and pickled
+components would duplicate the components they refer to, so workers return the validated
+field values with component references replaced by UUIDs and quantities by their magnitude
+and units. The parent process reassembles the components without validating them again.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Container
+from uuid import UUID
+import multiprocessing
+import os
+
+from infrasys import Component
+from infrasys.component_manager import ComponentManager
+from infrasys.serialization import TYPE_METADATA, SerializedTypeMetadata
+from pydantic import BaseModel
+from loguru import logger
+import orjson
+import pint
+
+from gdm.streaming_serialization import _ReferencesResolvedTypeHelper, _referenced_uuids
+
+# State inherited by forked workers, so the system and the records are never pickled.
+_worker_state: dict[str, Any] = {}
+
+
+# Tags of the tuples replacing component references, quantities and models in encoded values.
+class _Reference:
+    pass
+
+
+class _Quantity:
+    pass
+
+
+class _Model:
+    pass
+
+
+class _ParallelComponents(list):
+    """Serialized components to construct in worker processes."""
+
+    def __init__(self, components: list[dict[str, Any]], max_workers: int, chunk_size: int):
+        super().__init__(components)
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+
+
+def _rebuild_sequence(sequence: list | tuple, items: list) -> list | tuple:
+    """Returns items in a sequence of the same type, including named tuples."""
+    if isinstance(sequence, tuple) and hasattr(sequence, "_fields"):
+        return type(sequence)(*items)
+    return type(sequence)(items)
+
+
+def _encode_model(model: BaseModel, shared: Container[UUID] | None = None) -> tuple:
+    return (
+        _Model,
+        type(model),
+        [_encode(model.__dict__[field], shared) for field in type(model).model_fields],
+        list(model.model_fields_set),
+    )
+
+
+def _encode(value: Any, shared: Container[UUID] | None = None) -> Any:
+    """Replaces components and quantities by values that can be sent between processes.
+
+    Components are replaced by a reference to their UUID, or encoded like other models if
+    shared is given and does not contain their UUID.
+    """
+    if isinstance(value, Component) and (shared is None or value.uuid in shared):
+        return (_Reference, value.uuid.int)
+    if isinstance(value, pint.Quantity):
+        return (_Quantity, type(value), value.magnitude, str(value.units))
+    if isinstance(value, BaseModel):
+        return _encode_model(value, shared)
+    if isinstance(value, (list, tuple)):
+        return _rebuild_sequence(value, [_encode(item, shared) for item in value])
+    if isinstance(value, dict):
+        return {key: _encode(item, shared) for key, item in value.items()}
+    return value
+
+
+class _Decoder:
+    """Reverses `_encode`, the models are constructed without validation."""
+
+    def __init__(self, manager: ComponentManager):
+        self._manager = manager
+        self._units: dict[tuple[type, str], Any] = {}
+
+    def decode(self, value: Any) -> Any:
+        if isinstance(value, tuple) and value:
+            tag = value[0]
+            if tag is _Reference:
+                return self._manager.get_by_uuid(UUID(int=value[1]))
+            if tag is _Quantity:
+                return self._decode_quantity(*value[1:])
+            if tag is _Model:
+                return self._decode_model(*value[1:])
+        if isinstance(value, (list, tuple)):
+            return _rebuild_sequence(value, [self.decode(item) for item in value])
+        if isinstance(value, dict):
+            return {key: self.decode(item) for key, item in value.items()}
+        return value
+
+    def _decode_quantity(self, quantity_type: type, magnitude: Any, units: str) -> Any:
+        # Parsing unit names dominates the construction of quantities, so units are cached.
+        key = (quantity_type, units)
+        unit = self._units.get(key)
+        if unit is None:
+            unit = self._units[key] = quantity_type._REGISTRY.Unit(units)
+        return quantity_type(magnitude, unit)
+
+    def _decode_model(self, model_type: type, values: list, fields_set: list[str]) -> Any:
+        fields = {field: self.decode(item) for field, item in zip(model_type.model_fields, values)}
+        return model_type.model_construct(_fields_set=set(fields_set), **fields)
+
+
+def _component_levels(components: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+    """Groups serialized components by the depth of the components they refer to."""
+    records = {component["uuid"]: component for component in components}
+    depths: dict[str, int] = {}
+    in_progress: set[str] = set()
+    for root in records:
+        stack = [root]
+        while stack:
+            uuid = stack[-1]
+            if uuid in depths:
+                stack.pop()
+                continue
+            references = list(_referenced_uuids(records[uuid]))
+            missing = [ref for ref in references if ref not in records]
+            if missing:
+                msg = f"Component {uuid} refers to components missing from the file: {missing}"
+                raise ValueError(msg)
+            pending = [ref for ref in references if ref not in depths]
+            if pending:
+                if uuid in in_progress:
+                    # Reached again from one of its own references.
+                    msg = f"Component {uuid} is part of a reference cycle."
+                    raise ValueError(msg)
+                in_progress.add(uuid)
+                stack.extend(pending)
+                continue
+            in_progress.discard(uuid)
+            depths[uuid] = 1 + max((depths[ref] for ref in references), default=-1)
+            stack.pop()
+
+    levels: list[list[dict[str, Any]]] = [[] for _ in range(max(depths.values(), default=-1) + 1)]
+    for uuid, record in records.items():
+        levels[depths[uuid]].append(record)
+    return levels
+
+
+def _init_worker(system, records: list[dict[str, Any]]) -> None:
+    _worker_state.update(system=system, records=records)
+
+
+def _build_chunk(start: int, end: int) -> list[tuple]:
+    """Validates a range of serialized components of the current level."""
+    system = _worker_state["system"]
+    cached_types = _ReferencesResolvedTypeHelper()
+    results = []
+    for record in _worker_state["records"][start:end]:
+        values = system._deserialize_fields(record, cached_types)
+        metadata = SerializedTypeMetadata.validate_python(record[TYPE_METADATA])
+        component = cached_types.get_type(metadata)(**values)
+        results.append(_encode_model(component))
+    return results
+
+
+class ParallelDeserializationMixin:
+    """Adds `from_json_parallel` to infrasys `System` subclasses."""
+
+    @classmethod
+    def from_json_parallel(
+        cls,
+        filename: Path | str,
+        upgrade_handler: Callable | None = None,
+        max_workers: int | None = None,
+        chunk_size: int = 500,
+        **kwargs,
+    ):
+        """Deserialize a system from a JSON file, validating components in worker processes.
+
+        Components are constructed level by level, leaf components like equipment first and
+        then the components referring to them. The components of a level are split into
+        chunks of chunk_size components validated by forked workers and reassembled in the
+        current process. Levels smaller than two chunks are constructed in the current
+        process. Components are constructed serially when max_workers is 1 or the platform
+        does not support forking.
+
+        Parameters
+        ----------
+        filename : Path | str
+            JSON file containing the system data.
+        upgrade_handler : Callable | None
+            Optional function to handle data format upgrades, same as in `from_json`.
+        max_workers : int, optional
+            Maximum number of worker processes, by default the number of CPUs.
+        chunk_size : int, optional
+            Number of components validated by a worker at once, by default 500.
+
+        Examples
+        --------
+        >>> system = DistributionSystem.from_json_parallel("systems/fleet.json", max_workers=32)
+        """
+        filename = Path(filename)
+        data = orjson.loads(filename.read_bytes())
+        max_workers = max_workers or os.cpu_count() or 1
+        data["components"] = _ParallelComponents(data["components"], max_workers, chunk_size)
+
+        def upgrade(system_data, from_version, to_version):
+            upgrade_handler(system_data, from_version, to_version)
+            system_data["components"] = _ParallelComponents(
+                system_data["components"], max_workers, chunk_size
+            )
+
+        return cls.from_dict(
+            data,
+            filename.parent,
+            upgrade_handler=None if upgrade_handler is None else upgrade,
+            **kwargs,
+        )
+
+    def _deserialize_components(self, components) -> None:
+        if not isinstance(components, _ParallelComponents):
+            super()._deserialize_components(components)
+            return
+
+        parallel = components.max_workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+        cached_types = _ReferencesResolvedTypeHelper()
+        for level, records in enumerate(_component_levels(components)):
+            if not parallel or len(records) < 2 * components.chunk_size:
+                for record in records:
+                    self._try_deserialize_component(record, cached_types)
+                continue
+
+            logger.debug(f"Constructing {len(records)} components of level {level} in parallel.")
+            starts = list(range(0, len(records), components.chunk_size))
+            ends = [start + components.chunk_size for start in starts]
+            decoder = _Decoder(self._components)
+            with ProcessPoolExecutor(
+                max_workers=min(components.max_workers, len(starts)),
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+                initargs=(self, records),
+            ) as executor:
+                for results in executor.map(_build_chunk, starts, ends):
+                    self._components.add(
+                        *(decoder.decode(result) for result in results),
+                        deserialization_in_progress=True,
+                    )
@@ -0,0 +1,163 @@
+"""This module runs many tracked change scenarios over a shared base system in parallel."""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable
+from collections import defaultdict
+from datetime import datetime
+import multiprocessing
+import os
+
+from loguru import logger
+
+from gdm.tracked_changes import ScenarioOverlay, TrackedChange
+from gdm.distribution import CatalogSystem, DistributionSystem
+
+ScenarioCallback = Callable[[str, DistributionSystem], Any]
+ProgressCallback = Callable[[int, int, str], None]
+
+# State inherited by forked workers, so the base system is never pickled.
+_worker_state: dict[str, Any] = {}
+
+
+def _init_worker(
+    system: DistributionSystem,
+    catalog: DistributionSystem | CatalogSystem,
+    scenarios: dict[str, list[TrackedChange]],
+    callback: ScenarioCallback,
+    system_date: datetime | None,
+) -> None:
+    _worker_state.update(
+        system=system,
+        catalog=catalog,
+        scenarios=scenarios,
+        callback=callback,
+        system_date=system_date,
+    )
+
+
+def _run_scenario(scenario_name: str) -> Any:
+    """Applies the changes of a scenario to a copy of the base system and runs the callback."""
+    overlay = ScenarioOverlay.from_tracked_changes(
+        _worker_state["scenarios"][scenario_name],
+        _worker_state["system"],
+        _worker_state["catalog"],
+        system_date=_worker_state["system_date"],
+    )
+    return _worker_state["callback"](scenario_name, overlay.materialize())
+
+
+def _report_progress(progress: ProgressCallback | None, done: int, total: int, name: str):
+    logger.info(f"Scenario {name} completed ({done}/{total}).")
+    if progress is not None:
+        progress(done, total, name)
+
+
+def _run_in_pool(
+    names: list[str],
+    results: dict[str, Any],
+    max_workers: int,
+    progress: ProgressCallback | None,
+    *initargs,
+) -> None:
+    """Runs the scenarios in forked workers, keeping at most 2 * max_workers queued."""
+    total = len(names)
+    pending: dict[Future, str] = {}
+    remaining = iter(names)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=initargs,
+    ) as executor:
+        while True:
+            for name in remaining:
+                pending[executor.submit(_run_scenario, name)] = name
+                if len(pending) >= 2 * max_workers:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    logger.error(f"Scenario {name} failed.")
+                    for other in pending:
+                        other.cancel()
+                    raise
+                _report_progress(progress, len(results), total, name)
+
+
+def run_scenarios(
+    tracked_changes: list[TrackedChange],
+    system: DistributionSystem,
+    catalog: DistributionSystem | CatalogSystem,
+    callback: ScenarioCallback,
+    system_date: datetime | None = None,
+    max_workers: int | None = None,
+    progress: ProgressCallback | None = None,
+) -> dict[str, Any]:
+    """Applies every scenario to the base system and collects the callback results.
+
+    Tracked changes are grouped by scenario name. Worker processes are forked after the base
+    system and the catalog are loaded, so they share them copy-on-write instead of receiving
+    a serialized copy. Each worker applies the changes of a scenario to its own copy of the
+    base system and calls `callback(scenario_name, updated_system)`, only the returned value
+    is sent back to the parent process. At most `2 * max_workers` scenarios are queued at any
+    time. Scenarios run serially in the current process when `max_workers` is 1 or the
+    platform does not support forking.
+
+    Parameters
+    ----------
+    tracked_changes : list[TrackedChange]
+        Tracked changes of all scenarios.
+    system : DistributionSystem
+        Base distribution system, it is not modified.
+    catalog : DistributionSystem | CatalogSystem
+        The catalog used to retrieve components by UUID for additions.
+    callback : Callable[[str, DistributionSystem], Any]
+        Function run on every updated system, e.g. an export or a metric. Its return value
+        must be picklable when running in parallel.
+    system_date : datetime, optional
+        Only changes with a timestamp less than or equal to this date are applied.
+    max_workers : int, optional
+        Maximum number of worker processes, by default the number of CPUs.
+    progress : Callable[[int, int, str], None], optional
+        Called with the number of completed scenarios, the total and the completed scenario
+        name every time a scenario completes.
+
+    Returns
+    -------
+    dict[str, Any]
+        Callback results by scenario name, in the order scenarios first appear.
+
+    Examples
+    --------
+    >>> results = run_scenarios(
+    ...     tracked_changes, system, catalog, lambda name, sys: sys.to_json(f"{name}.json")
+    ... )
+    """
+    scenarios: dict[str, list[TrackedChange]] = defaultdict(list)
+    for change in tracked_changes:
+        scenarios[change.scenario_name].append(change)
+    scenarios = dict(scenarios)
+    names = list(scenarios)
+    total = len(names)
+    max_workers = min(max_workers or os.cpu_count() or 1, max(total, 1))
+    results: dict[str, Any] = {}
+
+    if max_workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        _init_worker(system, catalog, scenarios, callback, system_date)
+        try:
+            for name in names:
+                results[name] = _run_scenario(name)
+                _report_progress(progress, len(results), total, name)
+        finally:
+            _worker_state.clear()
+        return results
+
+    _run_in_pool(
+        names, results, max_workers, progress, system, catalog, scenarios, callback, system_date
+    )
+    return {name: results[name] for name in names}
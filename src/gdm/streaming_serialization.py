@@ -0,0 +1,517 @@
+"""This module loads systems from JSON files without holding the whole document in memory.
+
+The JSON file written by `to_json` is read in chunks. The components array is decoded one
+component at a time and every component is constructed as soon as the components it refers
+to exist, so the raw dictionary is released right away. Components referring to components
+stored later in the file are parked until those are constructed. Optionally only some
+component types are constructed while loading, the other components are kept as serialized
+records and constructed on first access.
+"""
+
+from collections import defaultdict
+from json import JSONDecodeError, JSONDecoder
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TextIO
+from uuid import UUID
+import json
+import os
+import re
+
+from infrasys import Component
+from infrasys.component_manager import ComponentManager
+from infrasys.migrations.metadata_migration import (
+    component_needs_metadata_migration,
+    migrate_component_metadata,
+)
+from infrasys.serialization import (
+    TYPE_METADATA,
+    CachedTypeHelper,
+    SerializedComponentReference,
+    SerializedQuantityType,
+    SerializedTypeMetadata,
+)
+from loguru import logger
+import orjson
+
+_WHITESPACE = " \t\n\r"
+_STREAMED_KEY = "components"
+# Key written by `to_json` right after the components.
+_TAIL_KEY = b'"supplemental_attributes"'
+# Everything up to the next bracket, strings included, so brackets in strings are skipped.
+_UNTIL_BRACKET = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+class _JSONStreamReader:
+    """Incremental reader of a JSON document from a text file."""
+
+    def __init__(self, file: TextIO, chunk_size: int):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Reads the next chunk, dropping the consumed part of the buffer."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Returns the next non whitespace character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                msg = "Unexpected end of JSON document."
+                raise JSONDecodeError(msg, self._buffer, self._pos)
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            msg = f"Expected {char!r}."
+            raise JSONDecodeError(msg, self._buffer, self._pos)
+        self._pos += 1
+
+    def decode_value(self) -> Any:
+        """Decodes the next value, reading chunks until it is complete."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number may continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def skip_value(self) -> None:
+        """Skips the next value without decoding it, only brackets are counted."""
+        if self._peek() not in "[{":
+            self.decode_value()
+            return
+        depth = 0
+        while True:
+            self._pos = _UNTIL_BRACKET.match(self._buffer, self._pos).end()
+            if self._pos == len(self._buffer) or self._buffer[self._pos] == '"':
+                # The chunk ends, possibly inside a string kept in the buffer.
+                if not self._fill():
+                    msg = "Unexpected end of JSON document."
+                    raise JSONDecodeError(msg, self._buffer, self._pos)
+                continue
+            depth += 1 if self._buffer[self._pos] in "[{" else -1
+            self._pos += 1
+            if depth == 0:
+                return
+
+    def iter_array(self) -> Iterator[Any]:
+        """Decodes the next array one element at a time."""
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            if self._peek() == "]":
+                self._pos += 1
+                return
+            self._expect(",")
+
+    def iter_object(self) -> Iterator[str]:
+        """Yields the keys of the next object, the caller consumes every value."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self._expect(":")
+            yield key
+            if self._peek() == "}":
+                self._pos += 1
+                return
+            self._expect(",")
+
+
+class _ComponentStream:
+    """Components array of a JSON file decoded lazily.
+
+    `from_dict` reads the first component to detect the serialization format of the metadata
+    before deserializing the components, so the first element is read eagerly and is the only
+    one available by index.
+    """
+
+    def __init__(
+        self,
+        filename: Path,
+        chunk_size: int,
+        component_types: Iterable[type[Component]] | None = None,
+    ):
+        self._filename = filename
+        self._chunk_size = chunk_size
+        self.component_types = None if component_types is None else tuple(component_types)
+        iterator = self._iter()
+        self._first = next(iterator, None)
+        self._iterator = iterator
+
+    def _iter(self) -> Iterator[dict[str, Any]]:
+        with open(self._filename, "r", encoding="utf-8") as f_in:
+            reader = _JSONStreamReader(f_in, self._chunk_size)
+            for key in reader.iter_object():
+                if key == _STREAMED_KEY:
+                    yield from reader.iter_array()
+                    return
+                reader.skip_value()
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        if index != 0 or self._first is None:
+            raise IndexError(index)
+        return self._first
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        yield from self._iterator
+
+
+def _read_tail(filename: Path, chunk_size: int) -> dict[str, Any] | None:
+    """Reads the top level entries stored after the components from the end of the file.
+
+    Quotes inside strings are escaped, so the key following the components is found by
+    reading the file backwards in chunks. An occurrence nested in a value is not a valid end
+    of the document and is skipped. Returns None if the key is not found.
+    """
+    with open(filename, "rb") as f_in:
+        end = f_in.seek(0, os.SEEK_END)
+        tail = b""
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f_in.seek(start)
+            tail = f_in.read(end - start) + tail
+            # Occurrences spanning the previous chunk boundary are searched again.
+            pos = tail.rfind(_TAIL_KEY, 0, end - start + len(_TAIL_KEY))
+            while pos >= 0:
+                try:
+                    entries = json.loads(b"{" + tail[pos:])
+                except ValueError:
+                    pos = tail.rfind(_TAIL_KEY, 0, pos)
+                    continue
+                return None if _STREAMED_KEY in entries else entries
+            end = start
+    return None
+
+
+def _read_system_data(filename: Path, chunk_size: int) -> dict[str, Any]:
+    """Reads every top level entry of a system JSON file except the components.
+
+    Entries stored before the components are read from the start of the file and entries
+    stored after them from the end of the file, so the components are not read. When the end
+    of the components is not found that way, they are skipped without being decoded.
+    """
+    data: dict[str, Any] = {}
+    with open(filename, "r", encoding="utf-8") as f_in:
+        reader = _JSONStreamReader(f_in, chunk_size)
+        keys = reader.iter_object()
+        for key in keys:
+            if key == _STREAMED_KEY:
+                break
+            data[key] = reader.decode_value()
+        else:
+            return data
+        tail = _read_tail(filename, chunk_size)
+        if tail is not None:
+            data.update(tail)
+            return data
+        reader.skip_value()
+        for key in keys:
+            data[key] = reader.decode_value()
+    return data
+
+
+def _is_reference(value: Any) -> bool:
+    """Return True if a serialized value is a reference to a component."""
+    metadata = value.get(TYPE_METADATA) if isinstance(value, dict) else None
+    return isinstance(metadata, dict) and metadata.get("serialized_type") == "composed_component"
+
+
+def _referenced_uuids(component: dict[str, Any]) -> Iterator[str]:
+    """Yields the UUIDs of the components referenced by a serialized component."""
+    for key, value in component.items():
+        if key == TYPE_METADATA:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            if not _is_reference(item):
+                break
+            yield item[TYPE_METADATA]["uuid"]
+
+
+def _deserialize_value(system, value: Any, cached_types: CachedTypeHelper) -> Any:
+    """Deserializes a field value, the components it refers to must be in the system."""
+    if isinstance(value, list) and value and _is_reference(value[0]):
+        return [system.get_component_by_uuid(UUID(x[TYPE_METADATA]["uuid"])) for x in value]
+    if not isinstance(value, dict) or TYPE_METADATA not in value:
+        return value
+    metadata = SerializedTypeMetadata.validate_python(value[TYPE_METADATA])
+    if isinstance(metadata, SerializedComponentReference):
+        return system.get_component_by_uuid(metadata.uuid)
+    if isinstance(metadata, SerializedQuantityType):
+        return cached_types.get_type(metadata)(value=value["value"], units=value["units"])
+    msg = f"Unhandled serialized type: {value=}"
+    raise NotImplementedError(msg)
+
+
+def _deserialize_component(
+    system, component: dict[str, Any], cached_types: CachedTypeHelper
+) -> Component:
+    """Constructs a serialized component and adds it to the system with the public system API.
+
+    The components it refers to must already be in the system.
+    """
+    values = {
+        field: _deserialize_value(system, value, cached_types)
+        for field, value in component.items()
+        if field != TYPE_METADATA
+    }
+    metadata = SerializedTypeMetadata.validate_python(component[TYPE_METADATA])
+    instance = cached_types.get_type(metadata)(**values)
+    system.add_component(instance, deserialization_in_progress=True)
+    return instance
+
+
+class _ReferencesResolvedTypeHelper(CachedTypeHelper):
+    """Type helper for components whose references were checked to exist."""
+
+    def allowed_to_deserialize(self, component_type: type) -> bool:
+        return True
+
+
+class LazyComponentManager(ComponentManager):
+    """Component manager holding part of the components as serialized records.
+
+    Records are kept as compact JSON bytes and built, with the components they refer to, the
+    first time they are looked up by UUID or type. Operations needing every component, like
+    `iter_all`, build all the remaining records.
+    """
+
+    def __init__(self, auto_add_composed_components: bool, builder: Callable):
+        super().__init__(auto_add_composed_components)
+        self._builder = builder
+        self._records: dict[UUID, bytes] = {}
+        self._record_types: dict[type, set[UUID]] = defaultdict(set)
+
+    @property
+    def num_records(self) -> int:
+        """Number of components not built yet."""
+        return len(self._records)
+
+    def add_record(self, component_type: type, uuid: UUID, record: dict[str, Any]) -> None:
+        """Stores the serialized form of a component to build it on first access."""
+        self._records[uuid] = orjson.dumps(record)
+        self._record_types[component_type].add(uuid)
+
+    def has_record(self, uuid: UUID) -> bool:
+        """Return True if the component with this UUID is not built yet."""
+        return uuid in self._records
+
+    def pop_record(self, uuid: UUID) -> dict[str, Any]:
+        """Removes and returns the serialized form of a component."""
+        record = orjson.loads(self._records.pop(uuid))
+        for uuids in self._record_types.values():
+            uuids.discard(uuid)
+        return record
+
+    def materialize(self, *component_types: type) -> None:
+        """Builds the records of the types, including subtypes, or all records if no type."""
+        uuids = [
+            uuid
+            for record_type, uuids in self._record_types.items()
+            if not component_types or issubclass(record_type, component_types)
+            for uuid in uuids
+        ]
+        if uuids:
+            logger.debug("Building {} lazily loaded components.", len(uuids))
+            self._builder([self.pop_record(uuid) for uuid in uuids])
+
+    def get(self, component_type: type[Component], name: str) -> Any:
+        self.materialize(component_type)
+        return super().get(component_type, name)
+
+    def get_num_components(self) -> int:
+        return super().get_num_components() + len(self._records)
+
+    def get_num_components_by_type(self) -> dict[type, int]:
+        counts = super().get_num_components_by_type()
+        for record_type, uuids in self._record_types.items():
+            if uuids:
+                counts[record_type] += len(uuids)
+        return counts
+
+    def get_by_label(self, label: str) -> Any:
+        self.materialize()
+        return super().get_by_label(label)
+
+    def get_types(self) -> Iterable[type[Component]]:
+        self.materialize()
+        return super().get_types()
+
+    def iter(self, *component_types: type[Component], filter_func: Callable | None = None):
+        self.materialize(*component_types)
+        return super().iter(*component_types, filter_func=filter_func)
+
+    def get_by_uuid(self, uuid: UUID) -> Any:
+        if uuid in self._records:
+            self._builder([self.pop_record(uuid)])
+        return super().get_by_uuid(uuid)
+
+    def iter_all(self) -> Iterable[Any]:
+        self.materialize()
+        return super().iter_all()
+
+    def list_parent_components(
+        self, component: Component, component_type: type[Component] | None = None
+    ) -> list[Component]:
+        self.materialize()
+        return super().list_parent_components(component, component_type=component_type)
+
+
+class StreamingDeserializationMixin:
+    """Adds `from_json_streaming` to infrasys `System` subclasses."""
+
+    @classmethod
+    def from_json_streaming(
+        cls,
+        filename: Path | str,
+        upgrade_handler: Callable | None = None,
+        chunk_size: int = 1 << 20,
+        component_types: Iterable[type[Component]] | None = None,
+        **kwargs,
+    ):
+        """Deserialize a system from a JSON file, constructing components as they are parsed.
+
+        The system attributes stored after the components are read first from the end of the
+        file, then the components are read in chunks. Peak memory stays close to the final object
+        graph plus the components waiting for a component stored later in the file. Data
+        format upgrades need the whole document, so the regular `from_json` is used when an
+        upgrade handler is passed.
+
+        When component_types is passed, only the components of these types, including
+        subtypes, and the components they refer to are built. The others are kept as
+        serialized records and built the first time they are looked up, e.g. with
+        `get_components` or `get_component_by_uuid`. Operations on all components, like
+        `iter_all_components` or `to_json`, build every remaining record.
+
+        Parameters
+        ----------
+        filename : Path | str
+            JSON file containing the system data.
+        upgrade_handler : Callable | None
+            Optional function to handle data format upgrades, same as in `from_json`.
+        chunk_size : int, optional
+            Number of characters read at once, by default 1 MiB.
+        component_types : Iterable[type[Component]], optional
+            Component types to build while loading, by default all types.
+
+        Examples
+        --------
+        >>> system = DistributionSystem.from_json_streaming("systems/system1.json")
+        >>> topology = DistributionSystem.from_json_streaming(
+        ...     "systems/system1.json", component_types=[DistributionBus, DistributionBranchBase]
+        ... )
+        """
+        if upgrade_handler is not None:
+            logger.info("Data format upgrades need the whole document, using from_json.")
+            return cls.from_json(filename, upgrade_handler=upgrade_handler, **kwargs)
+        filename = Path(filename)
+        data = _read_system_data(filename, chunk_size)
+        data[_STREAMED_KEY] = _ComponentStream(filename, chunk_size, component_types)
+        return cls.from_dict(data, filename.parent, **kwargs)
+
+    def _deserialize_components(self, components) -> None:
+        # `from_dict` passes the components stored in data, i.e. the stream set above.
+        if not isinstance(components, _ComponentStream):
+            super()._deserialize_components(components)
+            return
+
+        cached_types = CachedTypeHelper()
+        waiting: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        built: set[UUID] = set()
+        manager = None
+        if components.component_types is not None:
+            manager = LazyComponentManager(
+                self._component_mgr.auto_add_composed_components,
+                lambda records: self._build_components(records, cached_types, waiting, built),
+            )
+            self._component_mgr.close()
+            self._component_mgr = manager
+
+        for component_dict in components:
+            if component_needs_metadata_migration(component_dict):
+                component_dict = migrate_component_metadata([component_dict])[0]
+            if manager is not None and component_dict["uuid"] not in waiting:
+                metadata = SerializedTypeMetadata.validate_python(component_dict[TYPE_METADATA])
+                component_type = cached_types.get_type(metadata)
+                if not issubclass(component_type, components.component_types):
+                    manager.add_record(
+                        component_type, UUID(component_dict["uuid"]), component_dict
+                    )
+                    continue
+            self._build_components([component_dict], cached_types, waiting, built)
+
+        if waiting:
+            missing = [UUID(uuid) for uuid in waiting]
+            msg = f"Components refer to components missing from the file: {missing[:5]}"
+            raise ValueError(msg)
+        if manager is not None:
+            logger.info(
+                "Built {} components, {} are loaded on first access.",
+                len(built),
+                manager.num_records,
+            )
+
+    def _build_components(
+        self,
+        records: list[dict[str, Any]],
+        cached_types: CachedTypeHelper,
+        waiting: dict[str, list[dict[str, Any]]],
+        built: set[UUID],
+    ) -> None:
+        """Builds serialized components once the components they refer to are built.
+
+        Components referring to a lazily loaded record build it first. Components referring
+        to a component not read yet are parked in waiting until it is built. The UUIDs of the
+        built components are added to built.
+        """
+        manager = self._component_mgr
+        stack = list(records)
+        while stack:
+            component_dict = stack.pop()
+            missing = next(
+                (
+                    UUID(uuid)
+                    for uuid in _referenced_uuids(component_dict)
+                    if UUID(uuid) not in built
+                ),
+                None,
+            )
+            if missing is None:
+                component = _deserialize_component(self, component_dict, cached_types)
+                built.add(component.uuid)
+                stack.extend(waiting.pop(str(component.uuid), []))
+            elif isinstance(manager, LazyComponentManager) and manager.has_record(missing):
+                stack.append(component_dict)
+                stack.append(manager.pop_record(missing))
+            else:
+                waiting[str(missing)].append(component_dict)
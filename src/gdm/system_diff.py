@@ -0,0 +1,266 @@
+"""This module expresses the difference between two distribution systems as tracked changes."""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Hashable
+from uuid import UUID
+
+from infrasys import Component
+from pydantic import BaseModel
+from loguru import logger
+import numpy as np
+import pint
+
+from gdm.tracked_changes import PropertyEdit, TrackedChange
+from gdm.distribution import CatalogSystem, DistributionSystem
+
+_IGNORED_FIELDS = ("name", "uuid")
+
+
+def _field_key(value: Any, mapping: dict[UUID, UUID]) -> Hashable:
+    """Returns a hashable key equal for equal field values.
+
+    Components are keyed by their UUID translated through mapping instead of their content, so
+    a key never depends on more than one component.
+    """
+    if isinstance(value, Component):
+        return ("component", mapping.get(value.uuid, value.uuid))
+    if isinstance(value, pint.Quantity):
+        return ("quantity", str(value.units), _field_key(value.magnitude, mapping))
+    if isinstance(value, np.ndarray):
+        return ("array", value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return (type(value).__name__, *(_field_key(item, mapping) for item in value))
+    if isinstance(value, dict):
+        return ("dict", *((key, _field_key(item, mapping)) for key, item in value.items()))
+    if isinstance(value, BaseModel):
+        return (
+            type(value).__name__,
+            *(_field_key(getattr(value, field), mapping) for field in type(value).model_fields),
+        )
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def _content_key(component: Component, mapping: dict[UUID, UUID]) -> dict[str, Hashable]:
+    """Returns the field keys of a component, ignoring its name and UUID like `hash_model`."""
+    return {
+        field: _field_key(getattr(component, field), mapping)
+        for field in type(component).model_fields
+        if field not in _IGNORED_FIELDS
+    }
+
+
+def _content_hash(component: Component, mapping: dict[UUID, UUID]) -> int:
+    return hash((type(component), tuple(_content_key(component, mapping).values())))
+
+
+def _list_references(value: Any) -> list[Component]:
+    """Returns the components directly referenced by a field value."""
+    if isinstance(value, Component):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [ref for item in value for ref in _list_references(item)]
+    return []
+
+
+def _to_base_value(value: Any, mapping: dict[UUID, UUID], base_index: dict[UUID, Component]):
+    """Replaces components of the updated system matched to a base component by the latter."""
+    if isinstance(value, Component) and value.uuid in mapping:
+        return base_index[mapping[value.uuid]]
+    if isinstance(value, list):
+        return [_to_base_value(item, mapping, base_index) for item in value]
+    return value
+
+
+def _dependency_order(components: list[Component]) -> list[Component]:
+    """Returns components after the components they refer to, leaves first."""
+    ordered: dict[UUID, Component] = {}
+    in_progress: set[UUID] = set()
+    for root in components:
+        stack = [(root, False)]
+        while stack:
+            component, expanded = stack.pop()
+            if component.uuid in ordered:
+                continue
+            if expanded:
+                in_progress.discard(component.uuid)
+                ordered[component.uuid] = component
+                continue
+            if component.uuid in in_progress:
+                msg = f"{component.label} is part of a reference cycle."
+                raise ValueError(msg)
+            in_progress.add(component.uuid)
+            stack.append((component, True))
+            stack.extend(
+                (ref, False)
+                for field in type(component).model_fields
+                for ref in _list_references(getattr(component, field))
+                if ref.uuid not in ordered
+            )
+    return list(ordered.values())
+
+
+def _match_by_content(
+    unmatched_base: list[Component],
+    unmatched_updated: list[Component],
+    mapping: dict[UUID, UUID],
+) -> None:
+    """Pairs unmatched components with identical type and content, updating mapping.
+
+    Components are matched leaves first, so the references of a component are matched before
+    its own content is compared.
+    """
+    candidates: dict[int, list[Component]] = defaultdict(list)
+    for component in unmatched_base:
+        candidates[_content_hash(component, {})].append(component)
+    unmatched = {component.uuid for component in unmatched_updated}
+    for component in _dependency_order(unmatched_updated):
+        if component.uuid not in unmatched:
+            continue
+        matches = candidates.get(_content_hash(component, mapping), [])
+        key = _content_key(component, mapping)
+        for i, candidate in enumerate(matches):
+            if type(candidate) is type(component) and _content_key(candidate, {}) == key:
+                mapping[component.uuid] = matches.pop(i).uuid
+                break
+
+
+def _rebuild_additions(
+    additions: list[Component],
+    mapping: dict[UUID, UUID],
+    base_index: dict[UUID, Component],
+) -> CatalogSystem:
+    """Returns a catalog of the additions referring to matched base components.
+
+    Additions are rebuilt leaves first under their own UUID, so additions referring to other
+    additions refer to the rebuilt ones.
+    """
+    catalog = CatalogSystem(auto_add_composed_components=True)
+    index = dict(base_index)
+    rebuilt_mapping = dict(mapping)
+    added = {component.uuid for component in additions}
+    for component in _dependency_order(additions):
+        if component.uuid not in added:
+            continue
+        updates = {}
+        for field in type(component).model_fields:
+            value = getattr(component, field)
+            base_value = _to_base_value(value, rebuilt_mapping, index)
+            if base_value is not value:
+                updates[field] = base_value
+        rebuilt = component.model_copy(update=updates)
+        index[rebuilt.uuid] = rebuilt
+        rebuilt_mapping[rebuilt.uuid] = rebuilt.uuid
+        catalog.add_component(rebuilt)
+    return catalog
+
+
+def diff_systems(
+    base: DistributionSystem,
+    updated: DistributionSystem,
+    scenario_name: str = "",
+    timestamp: datetime | None = None,
+) -> tuple[TrackedChange, CatalogSystem]:
+    """Returns the tracked change turning the base system into the updated system.
+
+    Components are matched by UUID through a single index of the base system. Components
+    left unmatched on both sides are then paired, leaves first, when they have the same type
+    and content, ignoring names and UUIDs like `hash_model`, so components exported again
+    under new UUIDs are not reported as deleted and added. Matched components whose contents differ
+    are compared field by field and every changed field becomes a `PropertyEdit`. References
+    to other components are compared by matched UUID and never by content, so every component
+    is visited a constant number of times.
+
+    The additions are returned in a catalog to use when applying the change. They are copies
+    of the components of the updated system whose references point at the matched base
+    components. Name changes are not reported because the system indexes components by name,
+    a warning lists them instead. Deletions only list the deleted components not referenced
+    by other deleted components, the rest are removed by cascade.
+
+    Parameters
+    ----------
+    base : DistributionSystem
+        Original system.
+    updated : DistributionSystem
+        Modified system.
+    scenario_name : str, optional
+        Scenario name of the tracked change.
+    timestamp : datetime, optional
+        Timestamp of the tracked change.
+
+    Returns
+    -------
+    tuple[TrackedChange, CatalogSystem]
+        Additions, deletions and property edits from base to updated and the catalog of the
+        added components.
+
+    Examples
+    --------
+    >>> change, catalog = diff_systems(feeder_v1, feeder_v2, scenario_name="v2")
+    >>> feeder = apply_updates_to_system([change], feeder_v1, catalog=catalog)
+    """
+    base_index = {component.uuid: component for component in base.iter_all_components()}
+    updated_components = list(updated.iter_all_components())
+    mapping = {comp.uuid: comp.uuid for comp in updated_components if comp.uuid in base_index}
+
+    matched_base = set(mapping.values())
+    _match_by_content(
+        [comp for uuid, comp in base_index.items() if uuid not in matched_base],
+        [comp for comp in updated_components if comp.uuid not in mapping],
+        mapping,
+    )
+    updated_index = {mapping.get(comp.uuid, comp.uuid): comp for comp in updated_components}
+
+    edits: list[PropertyEdit] = []
+    additions: list[Component] = []
+    renamed: list[str] = []
+    for component in updated_components:
+        if component.uuid not in mapping:
+            additions.append(component)
+            continue
+        base_component = base_index[mapping[component.uuid]]
+        if type(base_component) is not type(component):
+            raise TypeError(
+                f"{base_component.label} and {component.label} share a UUID but not a type."
+            )
+        if base_component.name != component.name:
+            renamed.append(base_component.label)
+        base_key = _content_key(base_component, {})
+        for field, key in _content_key(component, mapping).items():
+            if key != base_key[field]:
+                edits.append(
+                    PropertyEdit(
+                        component_uuid=base_component.uuid,
+                        name=field,
+                        value=_to_base_value(getattr(component, field), mapping, base_index),
+                    )
+                )
+
+    deleted = [comp for uuid, comp in base_index.items() if uuid not in updated_index]
+    referenced = {
+        ref.uuid
+        for component in deleted
+        for field in type(component).model_fields
+        for ref in _list_references(getattr(component, field))
+    }
+    deletions = [comp.uuid for comp in deleted if comp.uuid not in referenced]
+
+    if renamed:
+        logger.warning(
+            f"Name changes of {len(renamed)} components are not tracked, e.g. {renamed[0]}."
+        )
+    logger.info(
+        f"Found {len(additions)} additions, {len(deleted)} deletions and {len(edits)} edits."
+    )
+    change = TrackedChange(
+        scenario_name=scenario_name,
+        timestamp=timestamp,
+        additions=[component.uuid for component in additions],
+        edits=edits,
+        deletions=deletions,
+    )
+    return change, _rebuild_additions(additions, mapping, base_index)
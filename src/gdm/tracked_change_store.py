@@ -0,0 +1,135 @@
+"""This module indexes tracked changes by scenario and timestamp and checkpoints system states."""
+
+from bisect import bisect_right
+from datetime import datetime
+
+from loguru import logger
+
+from gdm.tracked_changes import TrackedChange, _apply_tracked_changes
+from gdm.distribution import CatalogSystem, DistributionSystem
+
+
+def _sort_key(timestamp: datetime | None) -> tuple[bool, datetime | None]:
+    """Sorts changes without a timestamp first, whatever the time zone of the others."""
+    return (timestamp is not None, timestamp)
+
+
+class TrackedChangeStore:
+    """Tracked changes indexed by (scenario, timestamp) with materialized checkpoints.
+
+    Changes of every scenario are kept sorted by timestamp, changes sharing a timestamp keep
+    the order they were added in and changes without a timestamp come first. A system state
+    is produced by copying the closest checkpoint before the requested date and applying only
+    the changes in between. While replaying, a checkpoint is stored every
+    `checkpoint_interval` changes, so consecutive snapshots of a long plan replay a bounded
+    number of changes instead of the whole history. Adding a change drops the checkpoints it
+    invalidates. Checkpoints and returned systems copy the components but read the time
+    series arrays from the base system instead of duplicating them, so a checkpoint costs
+    the size of the components only.
+
+    Parameters
+    ----------
+    system : DistributionSystem
+        Base distribution system, it is not modified. It must keep its time series arrays
+        while the store or the systems it returned are in use.
+    catalog : DistributionSystem | CatalogSystem
+        The catalog used to retrieve components by UUID for additions.
+    checkpoint_interval : int, optional
+        Number of applied changes between checkpoints, by default 10. Every checkpoint holds
+        a copy of the components of the system.
+
+    Examples
+    --------
+    >>> store = TrackedChangeStore(system, catalog)
+    >>> store.extend(tracked_changes)
+    >>> snapshots = [
+    ...     store.get_system("expansion", datetime(year, 1, 1)) for year in range(2025, 2045)
+    ... ]
+    """
+
+    def __init__(
+        self,
+        system: DistributionSystem,
+        catalog: DistributionSystem | CatalogSystem,
+        checkpoint_interval: int = 10,
+    ):
+        if checkpoint_interval < 1:
+            raise ValueError(f"{checkpoint_interval=} must be a positive integer.")
+        self.system = system
+        self.catalog = catalog
+        self.checkpoint_interval = checkpoint_interval
+        self._keys: dict[str, list[tuple[bool, datetime | None]]] = {}
+        self._changes: dict[str, list[TrackedChange]] = {}
+        self._checkpoints: dict[str, dict[int, DistributionSystem]] = {}
+
+    @property
+    def scenarios(self) -> list[str]:
+        """Names of the stored scenarios."""
+        return list(self._changes)
+
+    def add(self, tracked_change: TrackedChange) -> None:
+        """Inserts a tracked change in its scenario at the position of its timestamp."""
+        scenario = tracked_change.scenario_name
+        keys = self._keys.setdefault(scenario, [])
+        key = _sort_key(tracked_change.timestamp)
+        position = bisect_right(keys, key)
+        keys.insert(position, key)
+        self._changes.setdefault(scenario, []).insert(position, tracked_change)
+        checkpoints = self._checkpoints.setdefault(scenario, {})
+        for count in [count for count in checkpoints if count > position]:
+            del checkpoints[count]
+
+    def extend(self, tracked_changes: list[TrackedChange]) -> None:
+        """Inserts tracked changes."""
+        for tracked_change in tracked_changes:
+            self.add(tracked_change)
+
+    def _count(self, scenario_name: str, timestamp: datetime | None) -> int:
+        """Number of changes of the scenario at or before the timestamp."""
+        if scenario_name not in self._changes:
+            raise KeyError(f"No tracked changes stored for scenario {scenario_name!r}.")
+        if timestamp is None:
+            return len(self._changes[scenario_name])
+        return bisect_right(self._keys[scenario_name], _sort_key(timestamp))
+
+    def get_changes(
+        self, scenario_name: str, timestamp: datetime | None = None
+    ) -> list[TrackedChange]:
+        """Returns the changes of the scenario at or before the timestamp, in order."""
+        return self._changes[scenario_name][: self._count(scenario_name, timestamp)]
+
+    def get_system(
+        self, scenario_name: str, timestamp: datetime | None = None
+    ) -> DistributionSystem:
+        """Returns the system with every change of the scenario up to the timestamp applied.
+
+        Parameters
+        ----------
+        scenario_name : str
+            Name of the scenario.
+        timestamp : datetime, optional
+            Date of the system state, by default after the last change.
+
+        Returns
+        -------
+        DistributionSystem
+            A new system, modifying it does not affect the store.
+        """
+        count = self._count(scenario_name, timestamp)
+        checkpoints = self._checkpoints[scenario_name]
+        start = max((item for item in checkpoints if item <= count), default=0)
+        system = (checkpoints[start] if start else self.system).deepcopy(share_timeseries=True)
+        logger.debug(f"Replaying {count - start} changes of {scenario_name} from {start}.")
+
+        for index in range(start, count):
+            system = _apply_tracked_changes(
+                system=system,
+                tracked_change=self._changes[scenario_name][index],
+                catalog=self.catalog,
+            )
+            if (index + 1) % self.checkpoint_interval == 0:
+                # The replayed system becomes the checkpoint and is never handed out, so the
+                # copies reading its time series arrays can rely on it keeping them.
+                checkpoints[index + 1] = system
+                system = system.deepcopy(share_timeseries=True)
+        return system
@@ -1,6 +1,7 @@
-from typing import Any, Annotated
+from typing import Any, Annotated, Callable, Iterable, Type, TypeVar
 from datetime import datetime
 
+from infrasys.exceptions import ISNotStored
 from infrasys.models import InfraSysBaseModel
 from gdm.distribution import DistributionSystem, CatalogSystem
 
@@ -10,6 +11,8 @@ from infrasys import Component
 from rich.table import Table
 from uuid import UUID
 
+T = TypeVar("T", bound=Component)
+
 
 class PropertyEdit(InfraSysBaseModel):
     name: str
@@ -164,6 +167,21 @@ def _get_bus_names(component):
     return bus_names
 
 
+def _sort_tracked_changes(
+    tracked_changes: list[TrackedChange], system_date: datetime | None = None
+) -> list[TrackedChange]:
+    """Orders the changes by timestamp, drops those after system_date and checks the scenario."""
+    if None not in [change.timestamp for change in tracked_changes]:
+        tracked_changes = sorted(tracked_changes, key=lambda x: x.timestamp, reverse=False)
+    if system_date:
+        tracked_changes = list(filter(lambda x: x.timestamp <= system_date, tracked_changes))
+
+    unique_scenarios = {change.scenario_name for change in tracked_changes}
+    if len(unique_scenarios) != 1:
+        raise ValueError("Scenario name should be consistant across all tracked changes.")
+    return tracked_changes
+
+
 def apply_updates_to_system(
     tracked_changes: list[TrackedChange],
     system: DistributionSystem,
@@ -210,15 +228,7 @@ def apply_updates_to_system(
     ... )
     """
 
-    if None not in [change.timestamp for change in tracked_changes]:
-        tracked_changes = sorted(tracked_changes, key=lambda x: x.timestamp, reverse=False)
-    if system_date:
-        tracked_changes = list(filter(lambda x: x.timestamp <= system_date, tracked_changes))
-
-    unique_scenarios = {change.scenario_name for change in tracked_changes}
-    if len(unique_scenarios) != 1:
-        raise ValueError("Scenario name should be consistant across all tracked changes.")
-
+    tracked_changes = _sort_tracked_changes(tracked_changes, system_date)
     log = []
     system_copy = system.deepcopy()
     for change in tracked_changes:
@@ -231,11 +241,308 @@ def apply_updates_to_system(
     return system_copy
 
 
+class ScenarioOverlay:
+    """Copy-on-write view of a scenario applied to a base distribution system.
+
+    Tracked changes are recorded as deltas instead of being applied to a copy of the system:
+    added components are referenced from the catalog, deleted components are remembered by
+    UUID and edits are stored per component. Lookups resolve through the deltas, an edited
+    component is returned as a validated copy carrying its edited fields, created when the
+    edits are recorded. References held by returned components point to base or catalog
+    instances. The base system and the catalog are never modified, so memory grows with the
+    size of the scenario rather than the size of the system. Call `materialize` to build a
+    real system, added catalog components are copied into it before they are edited.
+
+    Parameters
+    ----------
+    system : DistributionSystem
+        Base distribution system the scenario applies to.
+    catalog : DistributionSystem | CatalogSystem
+        The catalog used to retrieve components by UUID for additions.
+
+    Examples
+    --------
+    >>> overlay = ScenarioOverlay.from_tracked_changes(tracked_changes, system, catalog)
+    >>> capacitor = overlay.get_component_by_uuid(capacitor_uuid)
+    >>> updated_system = overlay.materialize()
+    """
+
+    def __init__(self, system: DistributionSystem, catalog: DistributionSystem | CatalogSystem):
+        self.system = system
+        self.catalog = catalog
+        self.scenario_name = ""
+        self.timestamp: datetime | None = None
+        self._added: dict[UUID, Component] = {}
+        self._deleted: set[UUID] = set()
+        self._edits: dict[UUID, dict[str, Any]] = {}
+        self._views: dict[UUID, Component] = {}
+
+    @classmethod
+    def from_tracked_changes(
+        cls,
+        tracked_changes: list[TrackedChange],
+        system: DistributionSystem,
+        catalog: DistributionSystem | CatalogSystem,
+        system_date: datetime | None = None,
+    ) -> "ScenarioOverlay":
+        """Builds the overlay of a scenario, same arguments as `apply_updates_to_system`."""
+        overlay = cls(system, catalog)
+        for change in _sort_tracked_changes(tracked_changes, system_date):
+            overlay.apply(change)
+        return overlay
+
+    def apply(self, tracked_change: TrackedChange) -> None:
+        """Records the additions, deletions and edits of a tracked change.
+
+        Raises
+        ------
+        AttributeError
+            If an edit specifies a property that does not exist on a component.
+        ISNotStored
+            If a deletion or an edit refers to a component missing from the overlay.
+        ValidationError
+            If the edited values of a component are not valid.
+        """
+        self.scenario_name = tracked_change.scenario_name
+        self.timestamp = tracked_change.timestamp or self.timestamp
+
+        for model_uuid in tracked_change.additions:
+            if model_uuid in self._deleted:
+                self._deleted.discard(model_uuid)
+            elif not self._has_uuid(model_uuid):
+                self._added[model_uuid] = self.catalog.get_component_by_uuid(model_uuid)
+
+        for model_uuid in tracked_change.deletions:
+            self.get_component_by_uuid(model_uuid)
+            if self._added.pop(model_uuid, None) is None:
+                self._deleted.add(model_uuid)
+            self._edits.pop(model_uuid, None)
+            self._views.pop(model_uuid, None)
+
+        for edit_model in tracked_change.edits:
+            component = self.get_component_by_uuid(edit_model.component_uuid)
+            if not hasattr(component, edit_model.name):
+                raise AttributeError(
+                    f"{component.label} does not have a property called {edit_model.name}"
+                )
+            self._edits.setdefault(edit_model.component_uuid, {})[edit_model.name] = (
+                edit_model.value
+            )
+            self._views.pop(edit_model.component_uuid, None)
+        for model_uuid in {edit_model.component_uuid for edit_model in tracked_change.edits}:
+            self.get_component_by_uuid(model_uuid)
+
+    def _has_uuid(self, model_uuid: UUID) -> bool:
+        if model_uuid in self._added:
+            return True
+        if model_uuid in self._deleted:
+            return False
+        try:
+            self.system.get_component_by_uuid(model_uuid)
+        except ISNotStored:
+            return False
+        return True
+
+    def _resolve(self, component: Component) -> Component:
+        """Returns the component with the recorded edits applied, without modifying it."""
+        edits = self._edits.get(component.uuid)
+        if not edits:
+            return component
+        if component.uuid not in self._views:
+            fields = type(component).model_fields
+            values = {
+                name: component.__dict__[name] for name in fields if name in component.__dict__
+            }
+            self._views[component.uuid] = type(component).model_validate({**values, **edits})
+        return self._views[component.uuid]
+
+    def get_component_by_uuid(self, model_uuid: UUID) -> Component:
+        """Returns the component with the UUID as seen by the scenario.
+
+        Raises
+        ------
+        ISNotStored
+            If the component was deleted by the scenario or is not stored in the base system.
+        """
+        if model_uuid in self._deleted:
+            raise ISNotStored(f"Component with UUID={model_uuid} was deleted by the scenario")
+        component = self._added.get(model_uuid) or self.system.get_component_by_uuid(model_uuid)
+        return self._resolve(component)
+
+    def has_component(self, component: Component) -> bool:
+        """Returns True if the component is part of the scenario."""
+        return self._has_uuid(component.uuid)
+
+    def get_component(self, component_type: Type[T], name: str) -> T:
+        """Returns the component with the type and name as seen by the scenario.
+
+        Raises
+        ------
+        ISNotStored
+            If no such component is part of the scenario.
+        """
+        for component in self.get_components(component_type, filter_func=lambda x: x.name == name):
+            return component
+        raise ISNotStored(f"{component_type.__name__}.{name} is not part of the scenario")
+
+    def get_components(
+        self, *component_types: Type[T], filter_func: Callable | None = None
+    ) -> Iterable[T]:
+        """Returns the components with the passed type(s) as seen by the scenario.
+
+        filter_func is evaluated on the edited components.
+        """
+        for component in self.system.get_components(*component_types):
+            if component.uuid in self._deleted:
+                continue
+            component = self._resolve(component)
+            if filter_func is None or filter_func(component):
+                yield component
+        for component in self._added.values():
+            if isinstance(component, component_types):
+                component = self._resolve(component)
+                if filter_func is None or filter_func(component):
+                    yield component
+
+    def iter_all_components(self) -> Iterable[Component]:
+        """Returns every component as seen by the scenario."""
+        return self.get_components(Component)
+
+    def to_tracked_change(self) -> TrackedChange:
+        """Returns the net changes of the scenario as a single tracked change."""
+        return TrackedChange(
+            scenario_name=self.scenario_name,
+            timestamp=self.timestamp,
+            additions=list(self._added),
+            deletions=sorted(self._deleted),
+            edits=[
+                PropertyEdit(component_uuid=model_uuid, name=name, value=value)
+                for model_uuid, edits in self._edits.items()
+                for name, value in edits.items()
+            ],
+        )
+
+    def materialize(self, show_table: bool = False) -> DistributionSystem:
+        """Returns a copy of the base system with the net changes of the scenario applied."""
+        return _apply_tracked_changes(
+            system=self.system.deepcopy(),
+            tracked_change=self.to_tracked_change(),
+            catalog=self.catalog,
+            show_table=show_table,
+        )
+
+
+def apply_property_edits(system: DistributionSystem, edits: list[PropertyEdit]) -> list[Component]:
+    """
+    Applies property edits to a distribution system model in a single batch.
+
+    Edits are grouped by component, so every component is looked up once and validated once
+    with all of its edited fields, instead of once per edit. When several edits set the same
+    property, the last one wins. A component is left unchanged if its validation fails.
+    Components in edited values are replaced by the system components with the same UUIDs.
+    When an edit changes the components a component refers to, the component associations of
+    the system are rebuilt, so the components it no longer refers to can be removed.
+
+    Parameters
+    ----------
+    system : DistributionSystem
+        The distribution system whose components are edited in place.
+    edits : list[PropertyEdit]
+        The property edits to apply.
+
+    Returns
+    -------
+    list[Component]
+        The edited components, in the order they are first edited.
+
+    Raises
+    ------
+    AttributeError
+        If an edit specifies a property that does not exist on a component.
+    ValidationError
+        If the edited values of a component are not valid.
+
+    Examples
+    --------
+    >>> edited = apply_property_edits(system, tracked_change.edits)
+    """
+    grouped_edits: dict[UUID, dict[str, Any]] = {}
+    for edit_model in edits:
+        grouped_edits.setdefault(edit_model.component_uuid, {})[edit_model.name] = edit_model.value
+
+    components = []
+    copies: dict[UUID, Component] = {}
+    references_changed = False
+    try:
+        for model_uuid, updates in grouped_edits.items():
+            component = system.get_component_by_uuid(model_uuid)
+            updates = {
+                name: _attach_value(value, system, copies) for name, value in updates.items()
+            }
+            fields = type(component).model_fields
+            for name in updates:
+                if name not in fields:
+                    msg = f"{component.label} does not have a property called {name}"
+                    raise AttributeError(msg)
+            values = {
+                name: component.__dict__[name] for name in fields if name in component.__dict__
+            }
+            validated = type(component).model_validate({**values, **updates})
+            for name in updates:
+                component.__dict__[name] = validated.__dict__[name]
+            component.__pydantic_fields_set__.update(updates)
+            components.append(component)
+            references_changed |= any(_is_reference(value) for value in updates.values())
+    finally:
+        if references_changed:
+            system.rebuild_component_associations()
+    return components
+
+
+def _is_reference(value: Any) -> bool:
+    if isinstance(value, list):
+        return any(isinstance(item, Component) for item in value)
+    return isinstance(value, Component)
+
+
+def _attach_references(
+    component: Component, system: DistributionSystem, copies: dict[UUID, Component]
+) -> Component:
+    """Returns the component referring to the components of system with the same UUIDs.
+
+    Components of a catalog refer to catalog instances, which are replaced by the instances
+    stored in the system. Referenced components missing from the system are copied the same
+    way. The component is always copied, so editing it in the system leaves the catalog
+    unchanged.
+    """
+    updates = {}
+    for field in type(component).model_fields:
+        value = getattr(component, field)
+        attached = _attach_value(value, system, copies)
+        if attached is not value:
+            updates[field] = attached
+    return component.model_copy(update=updates)
+
+
+def _attach_value(value: Any, system: DistributionSystem, copies: dict[UUID, Component]) -> Any:
+    if isinstance(value, Component):
+        if value.uuid not in copies:
+            try:
+                copies[value.uuid] = system.get_component_by_uuid(value.uuid)
+            except ISNotStored:
+                copies[value.uuid] = _attach_references(value, system, copies)
+        return copies[value.uuid]
+    if isinstance(value, list):
+        items = [_attach_value(item, system, copies) for item in value]
+        return items if any(a is not b for a, b in zip(items, value)) else value
+    return value
+
+
 def _apply_tracked_changes(
     system: DistributionSystem,
     tracked_change: TrackedChange,
     catalog: DistributionSystem | CatalogSystem,
-    log: list = [],
+    log: list | None = None,
     show_table: bool = False,
 ):
     """
@@ -243,15 +550,15 @@ def _apply_tracked_changes(
 
     This function processes additions, deletions, and edits specified in the
     `TrackedChange` object and applies them to the given `system`. It updates
-    the system by adding new components, removing existing ones, and modifying
-    attributes of components. The changes are logged in the `log` list, and an
-    optional table display of the changes can be shown.
+    the system by adding new components, modifying attributes of components with
+    `apply_property_edits` and then removing deleted components. The changed components are
+    recorded in the `log` list and only formatted when the table is displayed.
 
     Args:
         system (DistributionSystem): The distribution system to which changes are applied.
         tracked_change (TrackedChange): The object containing lists of additions, deletions, and edits.
         catalog (DistributionSystem | CatalogSystem): The catalog used to retrieve components by UUID.
-        log (list, optional): A list to store logs of the changes applied. Defaults to an empty list.
+        log (list, optional): A list to store logs of the changes applied. Defaults to a new list.
         show_table (bool, optional): If True, displays a table of the changes applied. Defaults to False.
 
     Returns:
@@ -260,76 +567,51 @@ def _apply_tracked_changes(
     Raises:
         AttributeError: If an edit specifies a property that does not exist on a component.
     """
+    log = [] if log is None else log
+    timestamp, scenario_name = tracked_change.timestamp, tracked_change.scenario_name
 
     for model_uuid in tracked_change.additions:
         component = catalog.get_component_by_uuid(model_uuid)
         if not system.has_component(component):
+            component = _attach_references(component, system, {})
             system.add_component(component)
-            bus_names = _get_bus_names(component)
-            _update_temporal_table(
-                log,
-                tracked_change.timestamp,
-                "Addition",
-                component,
-                bus_names,
-                tracked_change.scenario_name,
-            )
+            log.append((timestamp, "Addition", component, scenario_name))
+
+    # Process edits: Update component attributes. Edits run before deletions, so components
+    # no longer referenced once edited, e.g. a replaced equipment, can be removed.
+    for component in apply_property_edits(system, tracked_change.edits):
+        log.append((timestamp, "Edit", component, scenario_name))
 
     # Process deletions: Remove components from the system.
     for model_uuid in tracked_change.deletions:
         component = system.get_component_by_uuid(model_uuid)
         if system.has_component(component):
             system.remove_component(component)
-            bus_names = _get_bus_names(component)
-            _update_temporal_table(
-                log,
-                tracked_change.timestamp,
-                "Deletion",
-                component,
-                bus_names,
-                tracked_change.scenario_name,
-            )
-
-    # Process edits: Update component attributes.
-    for edit_model in tracked_change.edits:
-        component = system.get_component_by_uuid(edit_model.component_uuid)
-        if not hasattr(component, edit_model.name):
-            raise AttributeError(
-                f"{component.label} does not have a property called {edit_model.name}"
-            )
-        setattr(component, edit_model.name, edit_model.value)
-        component = system.get_component_by_uuid(edit_model.component_uuid)
-        bus_names = _get_bus_names(component)
-
-        _update_temporal_table(
-            log,
-            tracked_change.timestamp,
-            "Edit",
-            component,
-            bus_names,
-            tracked_change.scenario_name,
-        )
+            log.append((timestamp, "Deletion", component, scenario_name))
 
     if show_table:
         _update_log(log)
     return system
 
 
-def _update_log(update_log: list[str]):
+def _update_log(update_log: list[tuple], max_rows: int = 1000):
     """
     Displays a table of updates applied to the system from a given scenario.
 
     Args:
-        scenario_name (str): The name of the scenario from which updates are applied.
-        update_log (list[str]): A list of update entries, where each entry is a list
-            containing details such as timestamp, operation, UUID, component type,
-            component name, and connected bus.
+        update_log (list[tuple]): A list of update entries, where each entry is a tuple
+            of the timestamp, the operation, the changed component and the scenario name.
+        max_rows (int, optional): Maximum number of rows displayed, the remaining updates
+            are summarized in the title. Defaults to 1000.
 
     Returns:
         None
     """
 
-    table = Table(title="Updates applied to the system")
+    title = "Updates applied to the system"
+    if len(update_log) > max_rows:
+        title += f" (first {max_rows} of {len(update_log)})"
+    table = Table(title=title)
     table.add_column("Timestamp", justify="right", style="cyan", no_wrap=True)
     table.add_column("Operation", style="magenta")
     table.add_column("UUID", justify="right", style="bright_magenta")
@@ -337,8 +619,13 @@ def _update_log(update_log: list[str]):
     table.add_column("Component Name", justify="right", style="green")
     table.add_column("Connected bus", justify="right", style="bright_red")
     table.add_column("Scenario", justify="right", style="turquoise2")
-    for log in update_log:
-        table.add_row(*log)
+    rows = []
+    for timestamp, change_type, component, scenario_name in update_log[:max_rows]:
+        _update_temporal_table(
+            rows, timestamp, change_type, component, _get_bus_names(component), scenario_name
+        )
+    for row in rows:
+        table.add_row(*row)
 
     console = Console()
     console.print(table)
@@ -0,0 +1,367 @@
+"""This module stores tracked changes in a columnar Parquet file."""
+
+from datetime import datetime
+from importlib import import_module
+from itertools import groupby
+from pathlib import Path
+from typing import Any
+from enum import Enum
+from uuid import UUID
+import json
+
+from infrasys import Component
+from pydantic import BaseModel
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import pyarrow as pa
+import numpy as np
+import pint
+
+from gdm.tracked_changes import PropertyEdit, TrackedChange
+
+TRACKED_CHANGES_SCHEMA = pa.schema(
+    [
+        pa.field("change_id", pa.int64(), nullable=False),
+        pa.field("scenario", pa.dictionary(pa.int32(), pa.string()), nullable=False),
+        pa.field("timestamp", pa.timestamp("us")),
+        pa.field("operation", pa.dictionary(pa.int8(), pa.string())),
+        pa.field("component_uuid", pa.string()),
+        pa.field("property", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("value_kind", pa.dictionary(pa.int8(), pa.string())),
+        pa.field("value_class", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("value_number", pa.float64()),
+        pa.field("value_integer", pa.int64()),
+        pa.field("value_text", pa.string()),
+        pa.field("value_units", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("value_json", pa.string()),
+    ]
+)
+
+
+# Packages whose enums, quantities and models can be named in a file, see `_import_class`.
+_ALLOWED_PACKAGES = ("gdm", "infrasys.quantities")
+
+
+def _is_allowed_module(module: str) -> bool:
+    return any(module == pkg or module.startswith(f"{pkg}.") for pkg in _ALLOWED_PACKAGES)
+
+
+def _class_path(value: Any) -> str:
+    return f"{type(value).__module__}.{type(value).__qualname__}"
+
+
+def _readable_class_path(value: Any) -> str:
+    """Returns the class path of an enum, quantity or model that `_import_class` can read."""
+    path = _class_path(value)
+    if not _is_allowed_module(type(value).__module__):
+        msg = (
+            f"{path} is not a grid-data-models class and could not be read back, "
+            "use the matching class of gdm.quantities or infrasys.quantities instead."
+        )
+        raise ValueError(msg)
+    return path
+
+
+def _import_class(path: str, base: type) -> type:
+    """Returns the class named in a file if it is a subclass of base defined by this package.
+
+    Files are exchanged between users, so only grid-data-models enums, quantities and models
+    are imported and no other callable named in a file is ever called.
+    """
+    module, _, name = path.rpartition(".")
+    if not _is_allowed_module(module):
+        msg = f"{path} is not a grid-data-models class."
+        raise ValueError(msg)
+    value_class = getattr(import_module(module), name, None)
+    if not isinstance(value_class, type) or not issubclass(value_class, base):
+        msg = f"{path} is not a subclass of {base.__name__}."
+        raise ValueError(msg)
+    return value_class
+
+
+def _timestamp_type(tracked_changes: list[TrackedChange]) -> pa.DataType:
+    """Returns the timestamp column type, in UTC if the timestamps are time zone aware."""
+    aware = {
+        change.timestamp.utcoffset() is not None
+        for change in tracked_changes
+        if change.timestamp is not None
+    }
+    if len(aware) > 1:
+        msg = "Tracked change timestamps must be either all time zone aware or all naive."
+        raise ValueError(msg)
+    return pa.timestamp("us", tz="UTC") if aware == {True} else pa.timestamp("us")
+
+
+def _timestamp_scalar(value: datetime, timestamp_type: pa.TimestampType) -> pa.Scalar:
+    if (value.utcoffset() is not None) != (timestamp_type.tz is not None):
+        msg = f"{value} and the timestamps of the file must be both time zone aware or naive."
+        raise ValueError(msg)
+    return pa.scalar(value, timestamp_type)
+
+
+def _to_json_value(value: Any) -> Any:
+    """Converts a value to plain JSON, tagging the types it cannot represent."""
+    if isinstance(value, Component):
+        return {"__component__": str(value.uuid)}
+    if isinstance(value, pint.Quantity):
+        magnitude = value.magnitude
+        return {
+            "__quantity__": _readable_class_path(value),
+            "magnitude": magnitude.tolist() if isinstance(magnitude, np.ndarray) else magnitude,
+            "units": str(value.units),
+        }
+    if isinstance(value, Enum):
+        return {"__enum__": _readable_class_path(value), "value": value.value}
+    if isinstance(value, BaseModel):
+        return {
+            "__model__": _readable_class_path(value),
+            "fields": {key: _to_json_value(item) for key, item in value},
+        }
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+    if isinstance(value, UUID):
+        return {"__uuid__": str(value)}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    return value
+
+
+def _from_json_value(value: Any, components: dict[UUID, Component] | None) -> Any:
+    """Reverses `_to_json_value`."""
+    if isinstance(value, list):
+        return [_from_json_value(item, components) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "__component__" in value:
+        return _resolve_component(UUID(value["__component__"]), components)
+    if "__quantity__" in value:
+        magnitude = value["magnitude"]
+        magnitude = np.array(magnitude) if isinstance(magnitude, list) else magnitude
+        return _import_class(value["__quantity__"], pint.Quantity)(magnitude, value["units"])
+    if "__enum__" in value:
+        return _import_class(value["__enum__"], Enum)(value["value"])
+    if "__model__" in value:
+        fields = {k: _from_json_value(v, components) for k, v in value["fields"].items()}
+        return _import_class(value["__model__"], BaseModel)(**fields)
+    if "__uuid__" in value:
+        return UUID(value["__uuid__"])
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    return {key: _from_json_value(item, components) for key, item in value.items()}
+
+
+def _resolve_component(
+    model_uuid: UUID, components: dict[UUID, Component] | None
+) -> Component | UUID:
+    if components is None:
+        return model_uuid
+    return components[model_uuid]
+
+
+def _encode_value(value: Any) -> dict[str, Any]:
+    """Returns the value columns of a property value, scalars get a typed column."""
+    if value is None:
+        return {"value_kind": "null"}
+    if isinstance(value, bool):
+        return {"value_kind": "bool", "value_integer": int(value)}
+    if isinstance(value, int) and not isinstance(value, Enum):
+        return {"value_kind": "int", "value_integer": value}
+    if isinstance(value, float):
+        return {"value_kind": "float", "value_number": value}
+    if isinstance(value, str) and not isinstance(value, Enum):
+        return {"value_kind": "str", "value_text": value}
+    if isinstance(value, pint.Quantity) and np.ndim(value.magnitude) == 0:
+        return {
+            "value_kind": "quantity",
+            "value_class": _readable_class_path(value),
+            "value_number": float(value.magnitude),
+            "value_units": str(value.units),
+        }
+    if isinstance(value, Component):
+        return {
+            "value_kind": "component",
+            "value_class": _class_path(value),
+            "value_text": str(value.uuid),
+        }
+    return {"value_kind": "json", "value_json": json.dumps(_to_json_value(value))}
+
+
+def _decode_value(row: dict[str, Any], components: dict[UUID, Component] | None) -> Any:
+    kind = row["value_kind"]
+    if kind == "null":
+        return None
+    if kind == "bool":
+        return bool(row["value_integer"])
+    if kind == "int":
+        return row["value_integer"]
+    if kind == "float":
+        return row["value_number"]
+    if kind == "str":
+        return row["value_text"]
+    if kind == "quantity":
+        quantity_class = _import_class(row["value_class"], pint.Quantity)
+        return quantity_class(row["value_number"], row["value_units"])
+    if kind == "component":
+        return _resolve_component(UUID(row["value_text"]), components)
+    return _from_json_value(json.loads(row["value_json"]), components)
+
+
+def _to_rows(change_id: int, change: TrackedChange) -> list[dict[str, Any]]:
+    common = {
+        "change_id": change_id,
+        "scenario": change.scenario_name,
+        "timestamp": change.timestamp,
+    }
+    rows = [
+        {**common, "operation": "addition", "component_uuid": str(model_uuid)}
+        for model_uuid in change.additions
+    ]
+    rows += [
+        {
+            **common,
+            "operation": "edit",
+            "component_uuid": str(edit.component_uuid),
+            "property": edit.name,
+            **_encode_value(edit.value),
+        }
+        for edit in change.edits
+    ]
+    rows += [
+        {**common, "operation": "deletion", "component_uuid": str(model_uuid)}
+        for model_uuid in change.deletions
+    ]
+    # Changes without additions, edits or deletions are kept as a single empty row.
+    return rows or [common]
+
+
+def write_tracked_changes(
+    tracked_changes: list[TrackedChange],
+    filename: Path | str,
+    row_group_size: int = 100_000,
+) -> None:
+    """Writes tracked changes to a Parquet file with one row per addition, edit or deletion.
+
+    Rows are sorted by scenario and timestamp so the row group statistics let readers skip
+    the row groups of other scenarios and dates. Scalar property values are stored in typed
+    columns and units in a dictionary encoded column, other values are stored as tagged JSON.
+    Component references are stored by UUID. Time zone aware timestamps are stored in UTC,
+    timestamps must be either all aware or all naive.
+
+    Parameters
+    ----------
+    tracked_changes : list[TrackedChange]
+        Tracked changes to write.
+    filename : Path | str
+        Parquet file to write.
+    row_group_size : int, optional
+        Maximum number of rows per row group, by default 100,000.
+
+    Raises
+    ------
+    ValueError
+        If a property value names an enum, quantity or model class that is not defined by
+        grid-data-models or infrasys.quantities, e.g. a plain `pint.Quantity`, as
+        `read_tracked_changes` rejects it.
+
+    Examples
+    --------
+    >>> write_tracked_changes(tracked_changes, "tracked_changes.parquet")
+    """
+    timestamp_type = _timestamp_type(tracked_changes)
+    schema = TRACKED_CHANGES_SCHEMA.set(
+        TRACKED_CHANGES_SCHEMA.get_field_index("timestamp"),
+        pa.field("timestamp", timestamp_type),
+    )
+    # Changes without a timestamp come first.
+    ordered = sorted(
+        enumerate(tracked_changes),
+        key=lambda x: (
+            x[1].scenario_name,
+            x[1].timestamp is not None,
+            x[1].timestamp,
+            x[0],
+        ),
+    )
+    rows = [row for change_id, change in ordered for row in _to_rows(change_id, change)]
+    table = pa.Table.from_pylist(rows, schema=schema)
+    pq.write_table(table, filename, row_group_size=row_group_size)
+
+
+def read_tracked_changes(
+    filename: Path | str,
+    scenario_names: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    components: dict[UUID, Component] | None = None,
+) -> list[TrackedChange]:
+    """Reads tracked changes written by `write_tracked_changes`.
+
+    Filters are pushed down to the Parquet reader, so row groups of other scenarios or dates
+    are skipped without being decoded. When filtering by date, changes without a timestamp
+    are left out. Time zone aware timestamps are returned in UTC. Property values can only
+    name grid-data-models enums, quantities and models, files naming other classes are
+    rejected.
+
+    Parameters
+    ----------
+    filename : Path | str
+        Parquet file to read.
+    scenario_names : list[str], optional
+        Only read the changes of these scenarios.
+    start : datetime, optional
+        Only read the changes with a timestamp greater than or equal to start.
+    end : datetime, optional
+        Only read the changes with a timestamp less than or equal to end.
+    components : dict[UUID, Component], optional
+        Components by UUID used to resolve property values referring to components, e.g.
+        built from `system.iter_all_components()`. References are returned as UUIDs if None.
+
+    Returns
+    -------
+    list[TrackedChange]
+        Tracked changes ordered by scenario and timestamp.
+
+    Examples
+    --------
+    >>> changes = read_tracked_changes(
+    ...     "tracked_changes.parquet", ["scenario_1"], end=datetime(2030, 1, 1)
+    ... )
+    """
+    timestamp_type = pq.read_schema(filename).field("timestamp").type
+    filters = []
+    if scenario_names is not None:
+        filters.append(pc.field("scenario").isin(scenario_names))
+    if start is not None:
+        filters.append(pc.field("timestamp") >= _timestamp_scalar(start, timestamp_type))
+    if end is not None:
+        filters.append(pc.field("timestamp") <= _timestamp_scalar(end, timestamp_type))
+    expression = None
+    for item in filters:
+        expression = item if expression is None else expression & item
+
+    rows = pq.read_table(filename, filters=expression).to_pylist()
+    tracked_changes = []
+    for _, group in groupby(rows, key=lambda row: row["change_id"]):
+        group = list(group)
+        tracked_changes.append(
+            TrackedChange(
+                scenario_name=group[0]["scenario"],
+                timestamp=group[0]["timestamp"],
+                additions=[
+                    UUID(row["component_uuid"]) for row in group if row["operation"] == "addition"
+                ],
+                edits=[
+                    PropertyEdit.model_construct(
+                        name=row["property"],
+                        value=_decode_value(row, components),
+                        component_uuid=UUID(row["component_uuid"]),
+                    )
+                    for row in group
+                    if row["operation"] == "edit"
+                ],
+                deletions=[
+                    UUID(row["component_uuid"]) for row in group if row["operation"] == "deletion"
+                ],
+            )
+        )
+    return tracked_changes
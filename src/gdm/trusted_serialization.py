@@ -0,0 +1,215 @@
+"""This module loads systems written by this package without validating the components again.
+
+`to_json(trusted=True)` embeds a hash of the serialized components. When a file is loaded with
+`trusted=True` and the hash of its components matches, the components are constructed with
+`model_construct`, so field constraints and model validators are skipped. Field values JSON
+cannot represent, like enums or UUIDs, are still converted to their annotated types. Any
+edit to the components changes the hash and the file is validated as usual.
+"""
+
+from importlib import import_module
+from pathlib import Path
+from types import UnionType
+from typing import Any, Callable, Union, get_args, get_origin
+import hashlib
+
+from infrasys import Component
+from infrasys.serialization import TYPE_METADATA, SerializedType
+from pydantic import TypeAdapter
+from loguru import logger
+import orjson
+
+COMPONENTS_HASH_KEY = "components_hash"
+_JSON_NATIVE_TYPES = (str, int, float, bool, type(None), Any)
+
+
+def hash_components(components: list[dict[str, Any]], data_format_version: str | None) -> str:
+    """Returns the hash of serialized components embedded by `to_json`."""
+    digest = hashlib.sha256(str(data_format_version).encode())
+    digest.update(orjson.dumps(components))
+    return digest.hexdigest()
+
+
+def _is_json_native(annotation: Any) -> bool:
+    """Return True if JSON values of the annotated type need no conversion."""
+    if annotation in _JSON_NATIVE_TYPES:
+        return True
+    if get_origin(annotation) in (Union, UnionType):
+        return all(_is_json_native(arg) for arg in get_args(annotation))
+    return False
+
+
+class _TrustedComponents(list):
+    """Serialized components whose hash matches the hash embedded in the file."""
+
+
+class TrustedDeserializationMixin:
+    """Adds trusted loading of files written by this package to infrasys `System` subclasses."""
+
+    _embed_components_hash = False
+
+    def to_json(
+        self,
+        filename: Path | str,
+        overwrite: bool = False,
+        indent: int | None = None,
+        data: dict | None = None,
+        trusted: bool = False,
+    ) -> None:
+        """Write the contents of a system to a JSON file, see `System.to_json`.
+
+        Parameters
+        ----------
+        trusted : bool, optional
+            Embed a hash of the components so the file can be loaded with
+            `from_json(trusted=True)`, by default False. Hashing serializes the components a
+            second time.
+
+        Examples
+        --------
+        >>> system.to_json("systems/system1.json", trusted=True)
+        """
+        self._embed_components_hash = trusted
+        try:
+            super().to_json(filename, overwrite=overwrite, indent=indent, data=data)
+        finally:
+            del self._embed_components_hash
+
+    def serialize_system_attributes(self) -> dict[str, Any]:
+        data = super().serialize_system_attributes()
+        if self._embed_components_hash:
+            components = [x.model_dump_custom() for x in self._component_mgr.iter_all()]
+            data[COMPONENTS_HASH_KEY] = hash_components(components, self.data_format_version)
+        return data
+
+    @classmethod
+    def from_json(
+        cls,
+        filename: Path | str,
+        upgrade_handler: Callable | None = None,
+        trusted: bool = False,
+        **kwargs,
+    ):
+        """Deserialize a system from a JSON file.
+
+        Parameters
+        ----------
+        filename : Path | str
+            JSON file containing the system data.
+        upgrade_handler : Callable | None
+            Optional function to handle data format upgrades.
+        trusted : bool, optional
+            Skip the validation of the components if the file was written by
+            `to_json(trusted=True)` and its components were not modified since, by default
+            False. Files failing this check are validated as usual.
+
+        Examples
+        --------
+        >>> system = DistributionSystem.from_json("systems/system1.json", trusted=True)
+        """
+        if not trusted:
+            return super().from_json(filename, upgrade_handler=upgrade_handler, **kwargs)
+
+        filename = Path(filename)
+        data = orjson.loads(filename.read_bytes())
+        expected = data.get(COMPONENTS_HASH_KEY)
+        if expected is not None and expected == hash_components(
+            data["components"], data.get("data_format_version")
+        ):
+            data["components"] = _TrustedComponents(data["components"])
+        else:
+            logger.warning(f"Components of {filename} do not match their hash, validating them.")
+
+        def upgrade(system_data, from_version, to_version):
+            # Upgraded components differ from the hashed ones.
+            upgrade_handler(system_data, from_version, to_version)
+            system_data["components"] = list(system_data["components"])
+
+        return cls.from_dict(
+            data,
+            filename.parent,
+            upgrade_handler=None if upgrade_handler is None else upgrade,
+            **kwargs,
+        )
+
+    def _deserialize_components(self, components) -> None:
+        if not isinstance(components, _TrustedComponents):
+            super()._deserialize_components(components)
+            return
+
+        builder = _TrustedComponentBuilder(components)
+        for record in components:
+            builder.build(record["uuid"])
+        self._components.add(*builder.components.values(), deserialization_in_progress=True)
+
+
+class _TrustedComponentBuilder:
+    """Constructs serialized components and the components they refer to without validation.
+
+    Values JSON cannot represent, like enums or UUIDs, are converted with a type adapter of the
+    field annotation, which excludes the field constraints. Quantities are constructed with
+    cached units because parsing unit names dominates their construction.
+    """
+
+    def __init__(self, components: list[dict[str, Any]]):
+        self.components: dict[str, Component] = {}
+        self._records = {record["uuid"]: record for record in components}
+        self._types: dict[tuple[str, str], type] = {}
+        self._units: dict[tuple[type, str], Any] = {}
+        self._adapters: dict[tuple[type, str], TypeAdapter | None] = {}
+
+    def build(self, uuid: str) -> Component:
+        component = self.components.get(uuid)
+        if component is not None:
+            return component
+        record = self._records.get(uuid)
+        if record is None:
+            msg = f"No component with {uuid=} is stored in the file."
+            raise ValueError(msg)
+
+        component_type = self._get_type(record[TYPE_METADATA])
+        fields = component_type.model_fields
+        values = {
+            name: self._convert(component_type, name, value)
+            for name, value in record.items()
+            if name in fields
+        }
+        component = self.components[uuid] = component_type.model_construct(**values)
+        return component
+
+    def _get_type(self, metadata: dict[str, Any]) -> type:
+        key = (metadata["module"], metadata["type"])
+        value_type = self._types.get(key)
+        if value_type is None:
+            value_type = self._types[key] = getattr(import_module(key[0]), key[1])
+        return value_type
+
+    def _convert(self, component_type: type, name: str, value: Any) -> Any:
+        if isinstance(value, dict) and TYPE_METADATA in value:
+            return self._convert_serialized(value)
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            if TYPE_METADATA in value[0]:
+                return [self._convert_serialized(item) for item in value]
+        if value is None:
+            return value
+        key = (component_type, name)
+        if key not in self._adapters:
+            annotation = component_type.model_fields[name].annotation
+            self._adapters[key] = None if _is_json_native(annotation) else TypeAdapter(annotation)
+        adapter = self._adapters[key]
+        return value if adapter is None else adapter.validate_python(value)
+
+    def _convert_serialized(self, value: dict[str, Any]) -> Any:
+        metadata = value[TYPE_METADATA]
+        serialized_type = metadata["serialized_type"]
+        if serialized_type == SerializedType.COMPOSED_COMPONENT.value:
+            return self.build(metadata["uuid"])
+        if serialized_type == SerializedType.QUANTITY.value:
+            quantity_type = self._get_type(metadata)
+            key = (quantity_type, value["units"])
+            unit = self._units.get(key)
+            if unit is None:
+                unit = self._units[key] = quantity_type._REGISTRY.Unit(value["units"])
+            return quantity_type(value["value"], unit)
+        msg = f"Bug: unhandled serialized type: {value=}"
+        raise NotImplementedError(msg)
@@ -58,3 +58,20 @@ def test_dataset_system(dataset_system):
             capital_dollars=234.45,
             operating_dollars=10.0,
         )
+
+
+def test_dataset_system_binary_serialization(tmp_path):
+    """Test dataset system binary serialization."""
+    dataset_system = DatasetSystem()
+    conductor = BareConductorEquipment.example()
+    dataset_system.add_component(conductor)
+    dataset_system.add_cost(
+        catalog=conductor, cost=CostModel.example().model_copy(update={"name": "cost-1"})
+    )
+
+    dataset_system.to_binary(tmp_path / "dataset.gdmb")
+    dataset_system2 = DatasetSystem.from_binary(tmp_path / "dataset.gdmb")
+    assert dataset_system2.catalog_cost_mapping == dataset_system.catalog_cost_mapping
+    conductor2 = dataset_system2.get_component_by_uuid(conductor.uuid)
+    assert conductor2.ac_resistance == conductor.ac_resistance
+    assert dataset_system2.get_costs(conductor2)[0].name == "cost-1"
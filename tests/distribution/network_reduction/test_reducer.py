@@ -1,22 +1,58 @@
 from datetime import timedelta, datetime
+from uuid import uuid4
+
+import networkx as nx
+import numpy as np
 import pytest
 
 from infrasys.time_series_models import SingleTimeSeries, NonSequentialTimeSeries
 
 from gdm.distribution.model_reduction import reduce_to_three_phase_system, reduce_to_primary_system
+from gdm.distribution.model_reduction.reduction_context import ReductionContext
+from gdm.distribution.model_reduction.reducer import (
+    _get_primary_buses,
+    _get_three_phase_buses,
+    _reduce_system,
+)
+from gdm.distribution.model_reduction import (
+    ReductionReport,
+    benchmark_reduction,
+    reduce_system,
+    bus_names,
+    der_above,
+    collapse_parallel_branches,
+    in_feeders,
+    merge_series_branches,
+    min_phases,
+    voltage_above,
+    within_distance,
+)
+from gdm.distribution.model_reduction.selectors import BusTable
 from gdm.distribution.sys_functools import (
+    get_aggregated_battery_timeseries,
     get_aggregated_load_timeseries,
     get_aggregated_solar_timeseries,
 )
-from gdm.distribution.components import DistributionLoad, DistributionBus, DistributionSolar
+from gdm.distribution.components import (
+    DistributionBattery,
+    DistributionLoad,
+    DistributionBus,
+    DistributionFeeder,
+    DistributionSolar,
+    MatrixImpedanceBranch,
+    MatrixImpedanceSwitch,
+)
+from gdm.distribution.enums import Phase
 from gdm.distribution import DistributionSystem
+from gdm.hashing_utils import hash_model
 
 from gdm.exceptions import (
     IncompatibleTimeSeries,
     UnsupportedVariableError,
     InconsistentTimeseriesAggregation,
 )
-from gdm.quantities import ActivePower, Irradiance
+from gdm.quantities import ActivePower, Distance, Irradiance, Voltage
+from gdm.distribution.equipment import BatteryEquipment
 
 
 class CustomTimeSeries:
@@ -312,3 +348,332 @@ def test_reduce_to_primary_system(distribution_system_with_single_timeseries):
 
     assert get_total_kvar(reducer_total_load) == get_total_kvar(gdm_total_load), f"""Reactive power Reduced: {get_total_kvar(reducer_total_load)} Mvar,
         Original: {get_total_kvar(gdm_total_load)} Mvar"""
+
+
+def add_batteries(gdm_sys: DistributionSystem, time_series_type) -> list[DistributionBattery]:
+    batteries = []
+    for i, (bus_name, phases) in enumerate(
+        [("bus_3", [Phase.A, Phase.B, Phase.C]), ("split_phase_bus_5", [Phase.S1, Phase.S2])]
+    ):
+        bus = gdm_sys.get_component(DistributionBus, bus_name)
+        battery = DistributionBattery.example().model_copy(
+            update={
+                "name": f"battery_{i}",
+                "bus": bus,
+                "phases": phases,
+                "controller": None,
+                "equipment": BatteryEquipment.example().model_copy(
+                    update={
+                        "name": f"battery_equipment_{i}",
+                        "rated_power": ActivePower(i + 1, "kW"),
+                    }
+                ),
+            }
+        )
+        gdm_sys.add_component(battery)
+        batteries.append(battery)
+
+    if time_series_type == SingleTimeSeries:
+        profile = SingleTimeSeries.from_array(
+            data=[0.5, -1.0, 0.0, 1.0, 0.25],
+            name="active_power",
+            initial_timestamp=datetime(2020, 1, 1),
+            resolution=timedelta(minutes=30),
+        )
+    else:
+        profile = NonSequentialTimeSeries.from_array(
+            data=[0.5, -1.0, 0.0, 1.0, 0.25],
+            timestamps=[datetime(2020, 1, day) for day in range(1, 6)],
+            name="active_power",
+        )
+    gdm_sys.add_time_series(
+        profile, *batteries, profile_type="PMult", profile_name="bess_profile", use_actual=False
+    )
+    gdm_sys.add_time_series(
+        profile.model_copy(update={"name": "reactive_power"}),
+        *batteries,
+        profile_type="QMult",
+        profile_name="bess_profile",
+        use_actual=False,
+    )
+    return batteries
+
+
+@pytest.mark.parametrize(
+    "fixture_name, time_series_type",
+    [
+        ("distribution_system_with_single_timeseries", SingleTimeSeries),
+        ("distribution_system_with_nonsequential_timeseries", NonSequentialTimeSeries),
+    ],
+)
+def test_battery_timeseries_aggregation(request, fixture_name, time_series_type):
+    gdm_sys: DistributionSystem = request.getfixturevalue(fixture_name)
+    batteries = add_batteries(gdm_sys, time_series_type)
+
+    ts_aggregate = get_aggregated_battery_timeseries(
+        gdm_sys, batteries, "active_power", time_series_type=time_series_type
+    )
+    assert isinstance(ts_aggregate, time_series_type)
+    assert ts_aggregate.data.to("kilowatt").magnitude.tolist() == [1.5, -3.0, 0.0, 3.0, 0.75]
+    ts_aggregate = get_aggregated_battery_timeseries(
+        gdm_sys, batteries, "reactive_power", time_series_type=time_series_type
+    )
+    assert ts_aggregate.data.to("kilovar").magnitude.tolist() == [1.5, -3.0, 0.0, 3.0, 0.75]
+
+    with pytest.raises(UnsupportedVariableError):
+        get_aggregated_battery_timeseries(
+            gdm_sys, batteries, "irradiance", time_series_type=time_series_type
+        )
+
+    reduced_sys = reduce_to_three_phase_system(
+        gdm_sys, name="reduced_system", agg_timeseries=True, time_series_type=time_series_type
+    )
+    reduced_batteries = list(reduced_sys.get_components(DistributionBattery))
+    assert sum(
+        battery.equipment.rated_power.to("kilowatt").magnitude for battery in reduced_batteries
+    ) == pytest.approx(3.0)
+    agg_battery = [battery for battery in reduced_batteries if battery.name != "battery_0"][0]
+    ts_reduced = reduced_sys.get_time_series(
+        agg_battery, "active_power", time_series_type=time_series_type
+    )
+    assert ts_reduced.data.to("kilowatt").magnitude.tolist() == [1.0, -2.0, 0.0, 2.0, 0.5]
+
+
+def test_reduction_context(distribution_system_with_single_timeseries):
+    gdm_sys: DistributionSystem = distribution_system_with_single_timeseries
+    context = ReductionContext(gdm_sys)
+    tree = gdm_sys.get_directed_graph()
+    for node in tree.nodes:
+        assert set(context.descendants(node)) == nx.descendants(tree, node)
+    assert context.split_phase_mapping == gdm_sys.get_split_phase_mapping()
+    load = next(gdm_sys.get_components(DistributionLoad))
+    assert load in context.bus_components[load.bus.name]
+
+
+def test_reduction_context_attachment_buses(distribution_system_with_single_timeseries):
+    gdm_sys: DistributionSystem = distribution_system_with_single_timeseries
+    context = ReductionContext(gdm_sys)
+    kept_buses = {"src_bus"} | {f"bus_{i}" for i in range(10)}
+    attachment_buses = context.get_attachment_buses(kept_buses)
+    assert attachment_buses == {f"split_phase_bus_{i}": "bus_9" for i in range(10)}
+
+    kept_buses.add("split_phase_bus_5")
+    attachment_buses = context.get_attachment_buses(kept_buses)
+    assert attachment_buses["split_phase_bus_4"] == "bus_9"
+    assert attachment_buses["split_phase_bus_6"] == "split_phase_bus_5"
+    assert "split_phase_bus_5" not in attachment_buses
+
+
+def test_parallel_feeder_reduction(distribution_system_with_single_timeseries):
+    gdm_sys: DistributionSystem = distribution_system_with_single_timeseries
+    secondary_feeder = DistributionFeeder(name="secondary_feeder")
+    for bus in gdm_sys.get_components(DistributionBus):
+        if bus.name.startswith("split_phase_bus") or bus.name in {"bus_5", "bus_6", "bus_7"}:
+            bus.feeder = secondary_feeder
+    kept_buses = [
+        bus.name
+        for bus in gdm_sys.get_components(DistributionBus)
+        if not bus.name.startswith("split_phase_bus") and bus.name not in {"bus_3", "bus_7"}
+    ]
+
+    serial_sys = _reduce_system(gdm_sys, kept_buses, "serial", agg_timeseries=True)
+    parallel_sys = _reduce_system(
+        gdm_sys, kept_buses, "parallel", agg_timeseries=True, max_workers=2
+    )
+
+    for model_type in (DistributionLoad, DistributionSolar):
+        serial_comps = {comp.name: comp for comp in serial_sys.get_components(model_type)}
+        parallel_comps = {comp.name: comp for comp in parallel_sys.get_components(model_type)}
+        assert list(serial_comps) == list(parallel_comps)
+        for name, serial_comp in serial_comps.items():
+            parallel_comp = parallel_comps[name]
+            assert parallel_comp.bus is parallel_sys.get_component(
+                DistributionBus, serial_comp.bus.name
+            )
+            assert hash_model(parallel_comp) == hash_model(serial_comp)
+            for metadata in serial_sys.list_time_series_metadata(serial_comp):
+                serial_ts = serial_sys.get_time_series(
+                    serial_comp, metadata.name, **metadata.features
+                )
+                parallel_ts = parallel_sys.get_time_series(
+                    parallel_comp, metadata.name, **metadata.features
+                )
+                assert (serial_ts.data == parallel_ts.data).all()
+
+
+def test_parallel_reduction_without_pruned_buses(distribution_system_with_single_timeseries):
+    gdm_sys: DistributionSystem = distribution_system_with_single_timeseries
+    all_buses = [bus.name for bus in gdm_sys.get_components(DistributionBus)]
+    reduced_sys = _reduce_system(
+        gdm_sys, all_buses, "parallel", agg_timeseries=True, max_workers=2
+    )
+    for model_type in (DistributionLoad, DistributionSolar):
+        assert {comp.name for comp in reduced_sys.get_components(model_type)} == {
+            comp.name for comp in gdm_sys.get_components(model_type)
+        }
+
+
+def test_reduce_system_with_selectors(distribution_system_with_single_timeseries):
+    gdm_sys: DistributionSystem = distribution_system_with_single_timeseries
+    table = BusTable(ReductionContext(gdm_sys))
+    primary = table.select(voltage_above(Voltage(1, "kilovolt")))
+    assert set(primary) == set(_get_primary_buses(gdm_sys))
+    three_phase = table.select(min_phases(3))
+    assert set(three_phase) == set(_get_three_phase_buses(gdm_sys))
+    assert table.select(~min_phases(3) & bus_names(["split_phase_bus_3", "bus_3"])) == [
+        "split_phase_bus_3"
+    ]
+    assert set(table.select(within_distance(Distance(0, "km")))) == {"src_bus", "bus_0"}
+    assert not table.select(in_feeders(["unknown_feeder"]))
+    assert (
+        table.distance[table.index["split_phase_bus_5"]]
+        > table.distance[table.index["split_phase_bus_4"]]
+    )
+    solar_buses = {solar.bus.name for solar in gdm_sys.get_components(DistributionSolar)}
+    assert set(table.select(der_above(ActivePower(0, "kilowatt")))) == solar_buses
+
+    reduced_sys = reduce_system(
+        gdm_sys,
+        keep=min_phases(3) | bus_names(["split_phase_bus_5"]),
+        name="reduced_system",
+        agg_timeseries=True,
+    )
+    kept_buses = {bus.name for bus in reduced_sys.get_components(DistributionBus)}
+    assert kept_buses == set(three_phase) | {f"split_phase_bus_{i}" for i in range(6)}
+    assert nx.is_connected(reduced_sys.get_undirected_graph())
+    assert sum(get_total_kw(load) for load in reduced_sys.get_components(DistributionLoad)) == (
+        pytest.approx(sum(get_total_kw(load) for load in gdm_sys.get_components(DistributionLoad)))
+    )
+
+
+def test_merge_series_branches(simple_distribution_system):
+    gdm_sys: DistributionSystem = simple_distribution_system
+
+    def get_impedance(system, bus_1, bus_2):
+        path = nx.shortest_path(system.get_undirected_graph(), bus_1, bus_2)
+        z = 0
+        for u, v in zip(path[:-1], path[1:]):
+            data = next(iter(system.get_undirected_graph().get_edge_data(u, v).values()))
+            branch = system.get_component(data["type"], data["name"])
+            z = z + (branch.equipment.r_matrix * branch.length).to("ohm").magnitude
+        return z
+
+    impedance = get_impedance(gdm_sys, "bus_0", "bus_9")
+    num_buses = len(list(gdm_sys.get_components(DistributionBus)))
+
+    provenance = merge_series_branches(gdm_sys)
+
+    removed_buses = {"bus_1", "bus_2", "bus_6"} | {f"split_phase_bus_{i}" for i in (1, 2, 4, 6, 8)}
+    remaining_buses = {bus.name for bus in gdm_sys.get_components(DistributionBus)}
+    assert not removed_buses & remaining_buses
+    assert len(remaining_buses) == num_buses - len(removed_buses)
+    assert sorted(len(segments) for segments in provenance.values()) == [2, 2, 2, 2, 3, 3]
+    assert provenance["line_bus_0_bus_1"] == [
+        "line_bus_0_bus_1",
+        "line_bus_1_bus_2",
+        "line_bus_2_bus_3",
+    ]
+    assert get_impedance(gdm_sys, "bus_0", "bus_9") == pytest.approx(impedance)
+    assert nx.is_tree(gdm_sys.get_undirected_graph())
+    assert not merge_series_branches(gdm_sys)
+
+
+def test_collapse_parallel_branches(simple_distribution_system):
+    gdm_sys: DistributionSystem = simple_distribution_system
+    line = gdm_sys.get_component(MatrixImpedanceBranch, "line_bus_3_bus_4")
+    gdm_sys.add_component(line.model_copy(update={"name": "line_bus_3_bus_4_2", "uuid": uuid4()}))
+    partial_equipment = line.equipment.model_copy(
+        update={
+            "name": "partial_equipment",
+            "uuid": uuid4(),
+            "r_matrix": line.equipment.r_matrix[:2, :2],
+            "x_matrix": line.equipment.x_matrix[:2, :2],
+            "c_matrix": line.equipment.c_matrix[:2, :2],
+        }
+    )
+    gdm_sys.add_component(
+        line.model_copy(
+            update={
+                "name": "line_bus_3_bus_4_3",
+                "uuid": uuid4(),
+                "buses": line.buses[::-1],
+                "phases": [Phase.A, Phase.B],
+                "equipment": partial_equipment,
+            }
+        )
+    )
+    num_edges = gdm_sys.get_undirected_graph().number_of_edges()
+
+    provenance = collapse_parallel_branches(gdm_sys)
+
+    assert provenance == {
+        "line_bus_3_bus_4": ["line_bus_3_bus_4", "line_bus_3_bus_4_2", "line_bus_3_bus_4_3"]
+    }
+    assert gdm_sys.get_undirected_graph().number_of_edges() == num_edges - 2
+    equivalent = gdm_sys.get_component(MatrixImpedanceBranch, "line_bus_3_bus_4")
+    z_line = (line.equipment.r_matrix + 1j * line.equipment.x_matrix).to("ohm/km").magnitude
+    y_expected = 2 * np.linalg.inv(z_line)
+    y_expected[:2, :2] += np.linalg.inv(z_line[:2, :2])
+    z_equivalent = (equivalent.equipment.r_matrix + 1j * equivalent.equipment.x_matrix).to(
+        "ohm/km"
+    )
+    assert np.allclose(np.linalg.inv(z_equivalent.magnitude), y_expected)
+    assert equivalent.equipment.ampacity == 3 * line.equipment.ampacity
+    assert not collapse_parallel_branches(gdm_sys)
+
+
+def test_collapse_parallel_branches_with_switches(simple_distribution_system):
+    gdm_sys: DistributionSystem = simple_distribution_system
+    line = gdm_sys.get_component(MatrixImpedanceBranch, "line_bus_4_bus_5")
+    zero = line.equipment.r_matrix * 0
+    jumper_equipment = line.equipment.model_copy(
+        update={"name": "jumper_equipment", "uuid": uuid4(), "r_matrix": zero, "x_matrix": zero}
+    )
+    jumper = line.model_copy(
+        update={"name": "jumper_bus_4_bus_5", "uuid": uuid4(), "equipment": jumper_equipment}
+    )
+    gdm_sys.add_component(jumper)
+    other_line = gdm_sys.get_component(MatrixImpedanceBranch, "line_bus_5_bus_6")
+    switch = MatrixImpedanceSwitch.example().model_copy(
+        update={"name": "switch_bus_5_bus_6", "buses": other_line.buses}
+    )
+    gdm_sys.add_component(switch)
+    num_edges = gdm_sys.get_undirected_graph().number_of_edges()
+
+    provenance = collapse_parallel_branches(gdm_sys)
+
+    assert provenance == {
+        "jumper_bus_4_bus_5": ["jumper_bus_4_bus_5", "line_bus_4_bus_5"],
+        "line_bus_5_bus_6": ["line_bus_5_bus_6", "switch_bus_5_bus_6"],
+    }
+    assert gdm_sys.get_undirected_graph().number_of_edges() == num_edges - 2
+    assert gdm_sys.get_component(MatrixImpedanceBranch, "jumper_bus_4_bus_5") is jumper
+    assert not list(gdm_sys.get_components(MatrixImpedanceSwitch))
+    gdm_sys.get_directed_graph()
+
+
+@pytest.mark.parametrize("reducer", [reduce_to_three_phase_system, reduce_to_primary_system])
+def test_benchmark_reduction(simple_distribution_system, reducer, tmp_path):
+    gdm_sys: DistributionSystem = simple_distribution_system
+    reduced_sys, report = benchmark_reduction(gdm_sys, reducer, name="reduced_system")
+
+    assert report.is_conservative
+    assert set(report.stage_times) == {
+        "graph",
+        "bus_selection",
+        "subsystem",
+        "attachment",
+        "aggregation",
+    }
+    assert report.peak_memory_mb > 0
+    assert report.original.component_counts["DistributionBus"] == 21
+    assert report.reduced.component_counts["DistributionBus"] == len(
+        list(reduced_sys.get_components(DistributionBus))
+    )
+
+    report.write(tmp_path / "report.json")
+    assert ReductionReport.model_validate_json((tmp_path / "report.json").read_text()) == report
+    report.write(tmp_path / "report.md")
+    markdown = (tmp_path / "report.md").read_text()
+    assert f"# Reduction report: {reducer.__name__}" in markdown
+    assert "| load_kw |" in markdown
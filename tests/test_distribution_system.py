@@ -1,5 +1,15 @@
+import pytest
+from infrasys.location import GeographicInfo
+from infrasys.exceptions import ISNotStored
+
 from gdm.distribution import DistributionSystem
-from gdm.distribution.components import GeometryBranch, MatrixImpedanceBranch
+from gdm.distribution.components import (
+    GeometryBranch,
+    MatrixImpedanceBranch,
+    DistributionLoad,
+    DistributionBus,
+)
+from gdm.distribution.time_series_storage import SharedTimeSeriesStorage
 from gdm.distribution.equipment import GeometryBranchEquipment
 
 
@@ -27,3 +37,86 @@ def test_geometry_conversion(distribution_system_with_single_timeseries):
     assert len(list(sys.get_components(MatrixImpedanceBranch))) == 18
     assert len(list(sys.get_components(GeometryBranch))) == 0
     assert len(list(sys.get_components(GeometryBranchEquipment))) == 0
+
+
+def test_subsystem_shares_time_series_storage(
+    distribution_system_with_single_timeseries, tmp_path
+):
+    sys = distribution_system_with_single_timeseries
+    load = next(sys.get_components(DistributionLoad))
+    bus_names = [bus.name for bus in sys.get_components(DistributionBus)]
+    ts_dir = sys.get_time_series_directory()
+    num_files = len(list(ts_dir.iterdir()))
+
+    subsystem = sys.get_subsystem(bus_names, "subsystem", keep_timeseries=True)
+    assert len(list(ts_dir.iterdir())) == num_files
+    storage = subsystem.time_series.storage
+    assert isinstance(storage, SharedTimeSeriesStorage)
+    assert storage.parent is sys.time_series.storage
+
+    ts_data = subsystem.get_time_series(load, "active_power")
+    assert ts_data.data.tolist() == sys.get_time_series(load, "active_power").data.tolist()
+
+    subsystem.remove_time_series(load, name="active_power")
+    assert sys.has_time_series(load, "active_power")
+    assert len(list(ts_dir.iterdir())) == num_files
+
+    subsystem.to_json(tmp_path / "subsystem.json")
+    new_subsystem = DistributionSystem.from_json(tmp_path / "subsystem.json")
+    new_load = new_subsystem.get_component(DistributionLoad, load.name)
+    assert not new_subsystem.has_time_series(new_load, "active_power")
+    assert new_subsystem.has_time_series(new_load, "reactive_power")
+
+    # Shared arrays are not copied when this system removes them.
+    for parent_load in sys.get_components(DistributionLoad):
+        sys.remove_time_series(parent_load, name="reactive_power")
+    with pytest.raises(ISNotStored):
+        subsystem.get_time_series(load, "reactive_power")
+
+
+@pytest.mark.parametrize("share_timeseries", [True, False])
+def test_deepcopy(distribution_system_with_single_timeseries, share_timeseries, tmp_path):
+    sys = distribution_system_with_single_timeseries
+    line = sys.get_component(MatrixImpedanceBranch, "line_bus_8_bus_9")
+    sys.get_component(MatrixImpedanceBranch, "line_bus_7_bus_8").equipment = line.equipment
+    geo_info = GeographicInfo.example()
+    sys.add_supplemental_attribute(sys.get_component(DistributionBus, "bus_8"), geo_info)
+    sys_copy = sys.deepcopy(share_timeseries=share_timeseries)
+    assert len(list(sys_copy.iter_all_components())) == len(list(sys.iter_all_components()))
+    assert isinstance(sys_copy.time_series.storage, SharedTimeSeriesStorage) == share_timeseries
+    assert not isinstance(sys.deepcopy().time_series.storage, SharedTimeSeriesStorage)
+    geo_info_copy = sys_copy.get_supplemental_attribute_by_uuid(geo_info.uuid)
+    assert geo_info_copy is not geo_info
+    assert sys_copy.get_components_with_supplemental_attribute(geo_info_copy) == [
+        sys_copy.get_component(DistributionBus, "bus_8")
+    ]
+
+    line_copy = sys_copy.get_component(MatrixImpedanceBranch, "line_bus_8_bus_9")
+    other_line_copy = sys_copy.get_component(MatrixImpedanceBranch, "line_bus_7_bus_8")
+    assert line_copy is not line and line_copy.uuid == line.uuid
+    assert line_copy.equipment is other_line_copy.equipment
+    assert line_copy.buses[0] is other_line_copy.buses[1]
+    assert line_copy.buses[0] is sys_copy.get_component(DistributionBus, "bus_8")
+    assert sys_copy.list_parent_components(line_copy.buses[0]) == sys_copy.list_parent_components(
+        sys_copy.get_component(DistributionBus, "bus_8")
+    )
+
+    line_copy.equipment.r_matrix[0, 0] = line.equipment.r_matrix[0, 0] * 2
+    line_copy.length = line.length * 2
+    assert line_copy.equipment.r_matrix[0, 0] != line.equipment.r_matrix[0, 0]
+    assert line_copy.length != line.length
+
+    load = next(sys.get_components(DistributionLoad))
+    load_copy = sys_copy.get_component(DistributionLoad, load.name)
+    ts_data = sys_copy.get_time_series(load_copy, "active_power")
+    assert ts_data.data.tolist() == sys.get_time_series(load, "active_power").data.tolist()
+    sys_copy.remove_time_series(load_copy, name="active_power")
+    assert sys.has_time_series(load, "active_power")
+    if not share_timeseries:
+        expected = sys.get_time_series(load, "reactive_power").data.tolist()
+        sys.remove_time_series(load, name="reactive_power")
+        assert sys_copy.get_time_series(load_copy, "reactive_power").data.tolist() == expected
+
+    sys_copy.to_json(tmp_path / "copy.json")
+    new_sys = DistributionSystem.from_json(tmp_path / "copy.json")
+    assert len(list(new_sys.iter_all_components())) == len(list(sys.iter_all_components()))
@@ -1,8 +1,30 @@
+import tracemalloc
+
+import pytest
+import orjson
+
+from infrasys.exceptions import ISOperationNotAllowed
 from infrasys.time_series_models import SingleTimeSeries, NonSequentialTimeSeries
 
-from gdm.distribution.components import DistributionLoad, DistributionSolar
+from gdm.distribution.components import (
+    DistributionBranchBase,
+    DistributionLoad,
+    DistributionSolar,
+    MatrixImpedanceBranch,
+)
 from gdm.distribution.model_reduction import reduce_to_three_phase_system
+from gdm.binary_serialization import (
+    pack_system_data,
+    serialize_system_data,
+    unpack_system_data,
+    zstandard,
+)
+from gdm.component_archive import ComponentArchive
+from gdm import component_archive as component_archive_module
+from gdm.trusted_serialization import COMPONENTS_HASH_KEY, _TrustedComponentBuilder
+from gdm.parallel_deserialization import _component_levels
 from gdm.distribution import DistributionSystem
+from gdm.hashing_utils import hash_model
 
 
 def test_serialization_deserialization_single_time_series(
@@ -186,3 +208,277 @@ def test_serialization_deserialization_non_sequential_time_series_with_reduction
                 component2, name="irradiance", time_series_type=NonSequentialTimeSeries
             )
             assert ts1 == ts2
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [
+        "none",
+        "zlib",
+        pytest.param(
+            "zstd",
+            marks=pytest.mark.skipif(zstandard is None, reason="zstandard is not installed"),
+        ),
+    ],
+)
+def test_binary_serialization(tmp_path, distribution_system_with_single_timeseries, compression):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    system.to_json(tmp_path / "system.json")
+    data = orjson.loads((tmp_path / "system.json").read_bytes())
+    assert unpack_system_data(pack_system_data(data, compression)) == data
+
+    filename = tmp_path / "system.gdmb"
+    system.to_binary(filename, compression=compression)
+    system2 = DistributionSystem.from_binary(filename)
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    components = list(system.iter_all_components())
+    assert len(list(system2.iter_all_components())) == len(components)
+    for component in components:
+        component2 = system2.get_component_by_uuid(component.uuid)
+        assert hash_model(component2) == hash_model(
+            system_json.get_component_by_uuid(component.uuid)
+        )
+        if isinstance(component, DistributionLoad):
+            assert system.get_time_series(
+                component, name="active_power", time_series_type=SingleTimeSeries
+            ) == system2.get_time_series(
+                component2, name="active_power", time_series_type=SingleTimeSeries
+            )
+
+
+def test_serialize_system_data(tmp_path, distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    (tmp_path / "json").mkdir()
+    system.to_json(tmp_path / "json" / "system.json")
+    data = orjson.loads((tmp_path / "json" / "system.json").read_bytes())
+    assert serialize_system_data(system, tmp_path / "system.gdmb", False) == data
+    assert (tmp_path / "system_time_series" / system.DB_FILENAME).exists()
+    assert not (tmp_path / "system.gdmb").exists()
+
+
+@pytest.mark.parametrize("components_last", [False, True])
+@pytest.mark.parametrize("chunk_size", [7, 1 << 20])
+def test_streaming_deserialization(
+    tmp_path, distribution_system_with_single_timeseries, chunk_size, components_last
+):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    system.to_json(tmp_path / "system.json")
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    # Reversing the components makes every reference point to a component stored later.
+    data = orjson.loads((tmp_path / "system.json").read_bytes())
+    data["components"].reverse()
+    if components_last:
+        # The entries stored after the components are then read by skipping the components.
+        data["components"] = data.pop("components")
+    (tmp_path / "system.json").write_bytes(orjson.dumps(data))
+    system2 = DistributionSystem.from_json_streaming(
+        tmp_path / "system.json", chunk_size=chunk_size
+    )
+    assert system2.name == system_json.name
+    assert system2.uuid == system_json.uuid
+    components = list(system_json.iter_all_components())
+    assert len(list(system2.iter_all_components())) == len(components)
+    for component in components:
+        component2 = system2.get_component_by_uuid(component.uuid)
+        assert hash_model(component2) == hash_model(component)
+        if isinstance(component, DistributionLoad):
+            assert system_json.get_time_series(
+                component, name="active_power", time_series_type=SingleTimeSeries
+            ) == system2.get_time_series(
+                component2, name="active_power", time_series_type=SingleTimeSeries
+            )
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_deserialization_memory(tmp_path):
+    system = DistributionSystem(auto_add_composed_components=True)
+    for i in range(200):
+        branch = MatrixImpedanceBranch.example()
+        system.add_component(branch.model_copy(update={"name": f"branch_{i}"}))
+    system.to_json(tmp_path / "system.json")
+
+    filename = tmp_path / "system.json"
+    peak_json = _peak_memory(lambda: DistributionSystem.from_json(filename))
+    peak_streaming = _peak_memory(lambda: DistributionSystem.from_json_streaming(filename))
+    assert peak_streaming < peak_json / 2
+
+
+def test_lazy_component_loading(tmp_path, distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    system.to_json(tmp_path / "system.json")
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    num_components = system_json._components.get_num_components()
+    system2 = DistributionSystem.from_json_streaming(
+        tmp_path / "system.json", component_types=[DistributionBranchBase]
+    )
+    manager = system2._components
+    assert 0 < manager.num_records < num_components
+    assert manager.get_num_components() == num_components
+    for branch in system2.get_components(DistributionBranchBase):
+        assert branch.buses[0].uuid in manager._components_by_uuid
+
+    loads = list(system2.get_components(DistributionLoad))
+    assert len(loads) == len(list(system_json.get_components(DistributionLoad)))
+    for load in loads:
+        assert hash_model(load) == hash_model(system_json.get_component_by_uuid(load.uuid))
+        assert system_json.get_time_series(
+            system_json.get_component_by_uuid(load.uuid), name="active_power"
+        ) == system2.get_time_series(load, name="active_power")
+
+    assert len(list(system2.iter_all_components())) == num_components
+    assert manager.num_records == 0
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_parallel_deserialization(
+    tmp_path, distribution_system_with_single_timeseries, max_workers
+):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    system.to_json(tmp_path / "system.json")
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    system2 = DistributionSystem.from_json_parallel(
+        tmp_path / "system.json", max_workers=max_workers, chunk_size=5
+    )
+    components = list(system_json.iter_all_components())
+    assert len(list(system2.iter_all_components())) == len(components)
+    for component in components:
+        component2 = system2.get_component_by_uuid(component.uuid)
+        assert hash_model(component2) == hash_model(component)
+        assert component2.model_fields_set == component.model_fields_set
+        if isinstance(component, DistributionLoad):
+            assert system_json.get_time_series(
+                component, name="active_power", time_series_type=SingleTimeSeries
+            ) == system2.get_time_series(
+                component2, name="active_power", time_series_type=SingleTimeSeries
+            )
+
+
+def test_component_levels():
+    def record(uuid, *references):
+        refs = [
+            {"__metadata__": {"serialized_type": "composed_component", "uuid": ref}}
+            for ref in references
+        ]
+        return {"uuid": uuid, "refs": refs}
+
+    # Shared references are not cycles.
+    levels = _component_levels([record("A", "B", "C"), record("C", "B"), record("B")])
+    assert [[item["uuid"] for item in level] for level in levels] == [["B"], ["C"], ["A"]]
+
+    with pytest.raises(ValueError, match="reference cycle"):
+        _component_levels([record("A", "B"), record("B", "C"), record("C", "A")])
+
+
+def test_trusted_deserialization(
+    tmp_path, monkeypatch, distribution_system_with_single_timeseries
+):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    system.to_json(tmp_path / "untrusted.json")
+    assert COMPONENTS_HASH_KEY not in orjson.loads((tmp_path / "untrusted.json").read_bytes())
+    system.to_json(tmp_path / "system.json", trusted=True)
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    built = []
+    build = _TrustedComponentBuilder.build
+    monkeypatch.setattr(
+        _TrustedComponentBuilder,
+        "build",
+        lambda self, uuid: built.append(uuid) or build(self, uuid),
+    )
+    system2 = DistributionSystem.from_json(tmp_path / "system.json", trusted=True)
+    monkeypatch.undo()
+    components = list(system_json.iter_all_components())
+    assert len(list(system2.iter_all_components())) == len(components)
+    assert set(built) == {str(component.uuid) for component in components}
+    for component in components:
+        component2 = system2.get_component_by_uuid(component.uuid)
+        assert type(component2) is type(component)
+        assert hash_model(component2) == hash_model(component)
+        if isinstance(component, DistributionLoad):
+            assert system_json.get_time_series(
+                component, name="active_power", time_series_type=SingleTimeSeries
+            ) == system2.get_time_series(
+                component2, name="active_power", time_series_type=SingleTimeSeries
+            )
+
+    # An edited file is validated again.
+    data = orjson.loads((tmp_path / "system.json").read_bytes())
+    load = next(x for x in data["components"] if x["__metadata__"]["type"] == "DistributionLoad")
+    load["name"] += "_edited"
+    (tmp_path / "system.json").write_bytes(orjson.dumps(data))
+
+    def fail(*args):
+        raise AssertionError("The components should be validated.")
+
+    monkeypatch.setattr(_TrustedComponentBuilder, "build", fail)
+    system3 = DistributionSystem.from_json(tmp_path / "system.json", trusted=True)
+    assert system3.get_component(DistributionLoad, load["name"])
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_component_archive(tmp_path, distribution_system_with_single_timeseries, use_mmap):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    filename = tmp_path / "system.gdma"
+    system.to_archive(filename, block_size=4, compression="zlib")
+    system.to_json(tmp_path / "system.json")
+    system_json = DistributionSystem.from_json(tmp_path / "system.json")
+    load = next(iter(system.get_components(DistributionLoad)))
+
+    with ComponentArchive(filename, use_mmap=use_mmap) as archive:
+        assert archive.get_num_components() == len(list(system.iter_all_components()))
+        decompress = archive._decompress
+        num_blocks = []
+        archive._decompress = lambda data: num_blocks.append(1) or decompress(data)
+        load2 = archive.get_component(DistributionLoad, load.name)
+        assert hash_model(load2) == hash_model(system_json.get_component_by_uuid(load.uuid))
+        assert 0 < len(num_blocks) < len(archive._blocks)
+        assert archive.get_component_by_uuid(load.uuid) is load2
+        branches = {x.name for x in system.get_components(DistributionBranchBase)}
+        assert {x.name for x in archive.get_components(DistributionBranchBase)} == branches
+
+    system2 = DistributionSystem.from_archive(filename)
+    components = list(system_json.iter_all_components())
+    assert len(list(system2.iter_all_components())) == len(components)
+    for component in components:
+        assert hash_model(system2.get_component_by_uuid(component.uuid)) == hash_model(component)
+    assert system.get_time_series(
+        load, name="active_power", time_series_type=SingleTimeSeries
+    ) == system2.get_time_series(
+        system2.get_component_by_uuid(load.uuid),
+        name="active_power",
+        time_series_type=SingleTimeSeries,
+    )
+
+
+def test_component_archive_validation(
+    tmp_path, distribution_system_with_single_timeseries, monkeypatch
+):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    opened = []
+
+    def tracked_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(component_archive_module, "open", tracked_open, raising=False)
+    (tmp_path / "system.json").write_bytes(b"{}" * 16)
+    with pytest.raises(ValueError):
+        ComponentArchive(tmp_path / "system.json", use_mmap=True)
+    assert opened[-1].closed
+
+    # Components of an older data format are not upgraded on the random access path.
+    system.data_format_version = "2.0.1"
+    filename = tmp_path / "system.gdma"
+    system.to_archive(filename, compression="zlib")
+    load = next(iter(system.get_components(DistributionLoad)))
+    with ComponentArchive(filename) as archive:
+        assert archive.get_record(load.uuid)["name"] == load.name
+        with pytest.raises(ISOperationNotAllowed):
+            archive.get_component(DistributionLoad, load.name)
@@ -1,17 +1,34 @@
-from datetime import datetime
-from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pint
 import pytest
+import json
+
+from infrasys.exceptions import ISNotStored
+from pydantic import ValidationError
 
 from gdm.distribution.components import DistributionLoad
 from gdm.quantities import ReactivePower
 from gdm.distribution import DistributionSystem
+from gdm.distribution.enums import Phase
 from gdm.distribution.equipment import (
     PhaseCapacitorEquipment,
     LoadEquipment,
 )
+from gdm.tracked_changes_io import read_tracked_changes, write_tracked_changes
+from gdm.tracked_change_store import TrackedChangeStore
+from gdm.distribution.time_series_storage import SharedTimeSeriesStorage
+from gdm import tracked_change_store as tracked_change_store_module
+from gdm.system_diff import diff_systems
+from gdm.hashing_utils import hash_model
+from gdm.scenario_runner import run_scenarios
 from gdm.tracked_changes import (
     filter_tracked_changes_by_name_and_date,
     apply_updates_to_system,
+    apply_property_edits,
+    ScenarioOverlay,
     TrackedChange,
     PropertyEdit,
 )
@@ -133,3 +150,363 @@ def test_scenario_update_filter_by_scenario_name_and_date(
     )
     capacitor = updated_system.get_component_by_uuid(cap_uuid)
     assert capacitor.rated_reactive_power.to("kilovar").magnitude == 200.0
+
+
+def test_scenario_overlay(distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    tracked_changes, cap_uuid, load_1_uuid, _ = build_tracked_changes(system)
+    tracked_changes = filter_tracked_changes_by_name_and_date(
+        tracked_changes, scenario_name="scenario_1"
+    )
+    catalog = DistributionSystem(auto_add_composed_components=True)
+    load_equipment = LoadEquipment.example().model_copy(
+        update={
+            "uuid": UUID("aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"),
+            "name": "added_phase_load_model",
+        }
+    )
+    catalog.add_component(load_equipment)
+    overlay = ScenarioOverlay.from_tracked_changes(tracked_changes, system, catalog)
+
+    capacitor = overlay.get_component_by_uuid(cap_uuid)
+    assert capacitor.rated_reactive_power.to("kilovar").magnitude == 200.0
+    assert (
+        system.get_component_by_uuid(cap_uuid).rated_reactive_power
+        != capacitor.rated_reactive_power
+    )
+    with pytest.raises(ISNotStored):
+        overlay.get_component_by_uuid(load_1_uuid)
+    assert system.get_component_by_uuid(load_1_uuid) is not None
+    assert load_equipment in list(overlay.get_components(LoadEquipment))
+    assert len(list(overlay.get_components(DistributionLoad))) == (
+        len(list(system.get_components(DistributionLoad))) - 1
+    )
+
+    updated_system = overlay.materialize()
+    expected_system = apply_updates_to_system(
+        tracked_changes=tracked_changes, system=system, catalog=catalog
+    )
+    assert {comp.uuid for comp in updated_system.iter_all_components()} == {
+        comp.uuid for comp in expected_system.iter_all_components()
+    }
+    assert updated_system.get_component_by_uuid(cap_uuid) == capacitor
+
+    invalid_change = TrackedChange(
+        scenario_name="scenario_1",
+        edits=[PropertyEdit(component_uuid=cap_uuid, name="num_banks", value=0)],
+    )
+    with pytest.raises(ValidationError):
+        overlay.apply(invalid_change)
+
+
+def test_scenario_overlay_keeps_catalog(distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    catalog = DistributionSystem(auto_add_composed_components=True)
+    load_equipment = LoadEquipment.example().model_copy(update={"name": "catalog_load_model"})
+    catalog.add_component(load_equipment)
+    tracked_changes = [
+        TrackedChange(
+            scenario_name="scenario_1",
+            additions=[load_equipment.uuid],
+            edits=[
+                PropertyEdit(component_uuid=load_equipment.uuid, name="name", value="edited")
+            ],
+        )
+    ]
+
+    overlay = ScenarioOverlay.from_tracked_changes(tracked_changes, system, catalog)
+    updated_system = overlay.materialize()
+    assert updated_system.get_component_by_uuid(load_equipment.uuid).name == "edited"
+    updated_system = apply_updates_to_system(
+        tracked_changes=tracked_changes, system=system, catalog=catalog
+    )
+    assert updated_system.get_component_by_uuid(load_equipment.uuid).name == "edited"
+    assert catalog.get_component_by_uuid(load_equipment.uuid) is load_equipment
+    assert load_equipment.name == "catalog_load_model"
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_scenarios(distribution_system_with_single_timeseries, max_workers):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    tracked_changes, cap_uuid, load_1_uuid, load_2_uuid = build_tracked_changes(system)
+    catalog = DistributionSystem(auto_add_composed_components=True)
+    load_equipment = LoadEquipment.example().model_copy(
+        update={
+            "uuid": UUID("aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"),
+            "name": "added_phase_load_model",
+        }
+    )
+    catalog.add_component(load_equipment)
+    progress = []
+
+    results = run_scenarios(
+        tracked_changes,
+        system,
+        catalog,
+        lambda name, updated: sorted(
+            str(load.uuid) for load in updated.get_components(DistributionLoad)
+        ),
+        max_workers=max_workers,
+        progress=lambda done, total, name: progress.append((done, total)),
+    )
+
+    assert list(results) == ["scenario_1", "scenario_2"]
+    assert str(load_1_uuid) not in results["scenario_1"]
+    assert str(load_2_uuid) in results["scenario_1"]
+    assert str(load_2_uuid) not in results["scenario_2"]
+    assert sorted(progress) == [(1, 2), (2, 2)]
+    assert len(list(system.get_components(DistributionLoad))) == len(results["scenario_1"]) + 1
+
+
+def test_tracked_change_store(distribution_system_with_single_timeseries, monkeypatch):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    tracked_changes, cap_uuid, load_1_uuid, load_2_uuid = build_tracked_changes(system)
+    catalog = DistributionSystem(auto_add_composed_components=True)
+    load_equipment = LoadEquipment.example().model_copy(
+        update={
+            "uuid": UUID("aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"),
+            "name": "added_phase_load_model",
+        }
+    )
+    catalog.add_component(load_equipment)
+    store = TrackedChangeStore(system, catalog, checkpoint_interval=1)
+    store.extend(tracked_changes[::-1])
+
+    assert store.scenarios == ["scenario_2", "scenario_1"]
+    assert store.get_changes("scenario_1", datetime(2023, 6, 1)) == tracked_changes[:2]
+    assert store.get_changes("scenario_1", datetime(2021, 1, 1)) == []
+
+    for year in range(2021, 2026):
+        snapshot = store.get_system("scenario_1", datetime(year, 6, 1))
+        capacitor = snapshot.get_component_by_uuid(cap_uuid)
+        assert (capacitor.rated_reactive_power.to("kilovar").magnitude == 200.0) == (year >= 2022)
+        assert snapshot.has_component(load_equipment) == (year >= 2023)
+        loads = {load.uuid for load in snapshot.get_components(DistributionLoad)}
+        assert (load_1_uuid in loads) == (year < 2024)
+        assert load_2_uuid in loads
+    # Every state was checkpointed, so getting one again replays no change.
+    applied = []
+    apply = tracked_change_store_module._apply_tracked_changes
+    monkeypatch.setattr(
+        tracked_change_store_module,
+        "_apply_tracked_changes",
+        lambda **kwargs: applied.append(kwargs["tracked_change"]) or apply(**kwargs),
+    )
+    snapshot = store.get_system("scenario_1", datetime(2023, 6, 1))
+    assert applied == []
+
+    # Snapshots read the time series arrays through the checkpoints instead of copying them.
+    assert isinstance(snapshot.time_series.storage, SharedTimeSeriesStorage)
+    load = snapshot.get_component_by_uuid(load_1_uuid)
+    snapshot.remove_time_series(load)
+    snapshot = store.get_system("scenario_1", datetime(2023, 6, 1))
+    ts = snapshot.get_time_series(snapshot.get_component_by_uuid(load_1_uuid), "active_power")
+    base_ts = system.get_time_series(system.get_component_by_uuid(load_1_uuid), "active_power")
+    assert (ts.data == base_ts.data).all()
+
+    expected = apply_updates_to_system(
+        tracked_changes=tracked_changes[:3], system=system, catalog=catalog
+    )
+    assert {comp.uuid for comp in store.get_system("scenario_1").iter_all_components()} == {
+        comp.uuid for comp in expected.iter_all_components()
+    }
+    assert len(list(system.get_components(DistributionLoad))) == len(loads) + 1
+
+    aware = [
+        change.model_copy(update={"timestamp": change.timestamp.replace(tzinfo=timezone.utc)})
+        for change in tracked_changes[:2]
+    ]
+    untimed = TrackedChange(scenario_name="aware", timestamp=None)
+    store.extend([aware[1].model_copy(update={"scenario_name": "aware"}), untimed])
+    store.add(aware[0].model_copy(update={"scenario_name": "aware"}))
+    changes = store.get_changes("aware", datetime(2022, 6, 1, tzinfo=timezone.utc))
+    assert changes == [untimed, aware[0].model_copy(update={"scenario_name": "aware"})]
+
+
+def test_diff_systems(distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    updated = system.deepcopy()
+    capacitor = next(updated.get_components(PhaseCapacitorEquipment))
+    capacitor.rated_reactive_power = ReactivePower(200, "kvar")
+    load = next(updated.get_components(DistributionLoad))
+    updated.remove_component(load)
+    load_equipment = LoadEquipment.example().model_copy(update={"name": "added_load_model"})
+    added_load = load.model_copy(
+        update={"uuid": uuid4(), "name": "added_load", "equipment": load_equipment}
+    )
+    updated.add_component(added_load)
+
+    change, catalog = diff_systems(system, updated, scenario_name="updated")
+    assert {load_equipment.uuid, added_load.uuid} <= set(change.additions)
+    assert change.deletions == [load.uuid]
+    assert [(edit.component_uuid, edit.name) for edit in change.edits] == [
+        (capacitor.uuid, "rated_reactive_power")
+    ]
+
+    result = apply_updates_to_system([change], system, catalog=catalog)
+    assert {comp.uuid for comp in result.iter_all_components()} == {
+        comp.uuid for comp in updated.iter_all_components()
+    }
+    for component in updated.iter_all_components():
+        assert hash_model(result.get_component_by_uuid(component.uuid)) == hash_model(component)
+    result_load = result.get_component_by_uuid(added_load.uuid)
+    assert result_load.bus is result.get_component_by_uuid(load.bus.uuid)
+    assert result_load.equipment is result.get_component_by_uuid(load_equipment.uuid)
+    assert diff_systems(updated, result)[0].edits == []
+
+
+def test_diff_systems_replaced_equipment(distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    updated = system.deepcopy()
+    load = next(updated.get_components(DistributionLoad))
+    old_equipment = load.equipment
+    new_equipment = old_equipment.model_copy(
+        update={
+            "uuid": uuid4(),
+            "name": "replaced_load_model",
+            "phase_loads": [
+                phase_load.model_copy(
+                    update={"uuid": uuid4(), "real_power": phase_load.real_power * 2}
+                )
+                for phase_load in old_equipment.phase_loads
+            ],
+        }
+    )
+    updated.add_component(new_equipment)
+    load.equipment = new_equipment
+    updated.rebuild_component_associations()
+    updated.remove_component(old_equipment)
+
+    change, catalog = diff_systems(system, updated, scenario_name="updated")
+    assert old_equipment.uuid in change.deletions
+
+    result = apply_updates_to_system([change], system, catalog=catalog)
+    assert {comp.uuid for comp in result.iter_all_components()} == {
+        comp.uuid for comp in updated.iter_all_components()
+    }
+    for component in updated.iter_all_components():
+        assert hash_model(result.get_component_by_uuid(component.uuid)) == hash_model(component)
+    assert result.get_component_by_uuid(load.uuid).equipment is result.get_component_by_uuid(
+        new_equipment.uuid
+    )
+
+
+def test_diff_systems_matches_content(simple_distribution_system, tmp_path):
+    system: DistributionSystem = simple_distribution_system
+    system.to_json(tmp_path / "system.json")
+    text = (tmp_path / "system.json").read_text()
+    for component in system.iter_all_components():
+        text = text.replace(str(component.uuid), str(uuid4()))
+    (tmp_path / "exported.json").write_text(text)
+    exported = DistributionSystem.from_json(tmp_path / "exported.json")
+
+    change, catalog = diff_systems(system, exported)
+    assert change.additions == change.deletions == change.edits == []
+    assert list(catalog.iter_all_components()) == []
+
+
+def test_apply_property_edits(distribution_system_with_single_timeseries):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    capacitor = next(system.get_components(PhaseCapacitorEquipment))
+    num_banks = capacitor.num_banks
+    edits = [
+        PropertyEdit(component_uuid=capacitor.uuid, name="num_banks_on", value=num_banks + 1),
+        PropertyEdit(component_uuid=capacitor.uuid, name="num_banks", value=num_banks + 1),
+        PropertyEdit(
+            component_uuid=capacitor.uuid,
+            name="rated_reactive_power",
+            value=ReactivePower(100, "kvar"),
+        ),
+        PropertyEdit(
+            component_uuid=capacitor.uuid,
+            name="rated_reactive_power",
+            value=ReactivePower(200, "kvar"),
+        ),
+    ]
+
+    assert apply_property_edits(system, edits) == [capacitor]
+    assert capacitor.num_banks_on == capacitor.num_banks == num_banks + 1
+    assert capacitor.rated_reactive_power.to("kilovar").magnitude == 200.0
+
+    invalid_edit = PropertyEdit(component_uuid=capacitor.uuid, name="num_banks", value=0)
+    with pytest.raises(ValidationError):
+        apply_property_edits(system, [edits[-1].model_copy(), invalid_edit])
+    assert capacitor.num_banks == num_banks + 1
+
+    missing_edit = PropertyEdit(component_uuid=capacitor.uuid, name="num_phases", value=1)
+    with pytest.raises(AttributeError):
+        apply_property_edits(system, [missing_edit])
+
+
+def test_tracked_changes_parquet(distribution_system_with_single_timeseries, tmp_path):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    tracked_changes, cap_uuid, load_1_uuid, _ = build_tracked_changes(system)
+    load = system.get_component_by_uuid(load_1_uuid)
+    tracked_changes[2].edits = [
+        PropertyEdit(component_uuid=load_1_uuid, name=name, value=value)
+        for name, value in [
+            ("phases", [Phase.A, Phase.B]),
+            ("bus", load.bus),
+            ("in_service", False),
+            ("name", "renamed_load"),
+            ("feeder", None),
+        ]
+    ]
+    tracked_changes.append(TrackedChange(scenario_name="scenario_3"))
+    filename = tmp_path / "tracked_changes.parquet"
+    write_tracked_changes(tracked_changes, filename, row_group_size=2)
+
+    components = {comp.uuid: comp for comp in system.iter_all_components()}
+    assert read_tracked_changes(filename, components=components) == tracked_changes
+    assert read_tracked_changes(filename, ["scenario_2", "scenario_3"]) == tracked_changes[3:]
+    assert (
+        read_tracked_changes(
+            filename, ["scenario_1"], start=datetime(2022, 6, 1), end=datetime(2023, 6, 1)
+        )
+        == tracked_changes[1:2]
+    )
+    changes = read_tracked_changes(filename, end=datetime(2022, 6, 1))
+    assert changes == tracked_changes[:1]
+    assert changes[0].edits[0].value.to("kilovar").magnitude == 200.0
+    assert read_tracked_changes(filename, ["scenario_1"])[2].edits[1].value == load.bus.uuid
+
+
+def test_tracked_changes_parquet_safety(distribution_system_with_single_timeseries, tmp_path):
+    system: DistributionSystem = distribution_system_with_single_timeseries
+    load = next(system.get_components(DistributionLoad))
+    filename = tmp_path / "tracked_changes.parquet"
+    aware_changes = [
+        TrackedChange(
+            scenario_name="aware",
+            timestamp=datetime(2024, 1, 1, 12, tzinfo=timezone(timedelta(hours=-7))),
+            edits=[PropertyEdit(component_uuid=load.uuid, name="phases", value=[Phase.A])],
+        ),
+        TrackedChange(scenario_name="aware"),
+    ]
+    write_tracked_changes(aware_changes, filename)
+    changes = read_tracked_changes(filename, start=datetime(2024, 1, 1, 19, tzinfo=timezone.utc))
+    assert changes == aware_changes[:1]
+    assert changes[0].timestamp.utcoffset() == timedelta(0)
+    with pytest.raises(ValueError):
+        read_tracked_changes(filename, start=datetime(2024, 1, 1))
+    with pytest.raises(ValueError):
+        write_tracked_changes(
+            aware_changes + [TrackedChange(timestamp=datetime(2024, 1, 1))], filename
+        )
+
+    # Files cannot name classes outside of grid-data-models.
+    table = pq.read_table(filename)
+    value_json = json.dumps([{"__enum__": "os.system", "value": "echo unsafe"}])
+    column = pa.array([value_json] * len(table), pa.string())
+    pq.write_table(
+        table.set_column(table.schema.get_field_index("value_json"), "value_json", column),
+        filename,
+    )
+    with pytest.raises(ValueError, match="not a grid-data-models class"):
+        read_tracked_changes(filename)
+
+    # Values of classes the reader rejects are rejected when writing.
+    for value in [pint.Quantity(5, "kilowatt"), [pint.Quantity(5, "kilowatt")]]:
+        edit = PropertyEdit(component_uuid=load.uuid, name="phases", value=value)
+        with pytest.raises(ValueError, match="not a grid-data-models class"):
+            write_tracked_changes([TrackedChange(edits=[edit])], filename)
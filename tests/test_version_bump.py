@@ -1,9 +1,22 @@
 from pathlib import Path
+import importlib.util
+import sys
 
 
 from pydantic import ValidationError
+import orjson
 from gdm.distribution import DistributionSystem
 from gdm.distribution.upgrade_handler.upgrade_handler import UpgradeHandler, UpgradeSchema
+from gdm.distribution.upgrade_handler import upgrade_handler as upgrade_handler_module
+from gdm.distribution.upgrade_handler.from__2_0_1__to__2_1_2 import (
+    change_map,
+    from__2_0_1__to__2_1_2,
+)
+from gdm.distribution.upgrade_handler.from__2_1_2__to__2_1_3 import from__2_1_2__to__2_1_3
+from gdm.distribution.upgrade_handler.from__2_1_3__to__2_1_4 import from__2_1_3__to__2_1_4
+from gdm.distribution.upgrade_handler.from__2_1_4__to__2_1_5 import from__2_1_4__to__2_1_5
+from gdm.distribution.upgrade_handler.from__2_1_5__to__2_2_0 import from__2_1_5__to__2_2_0
+from gdm.distribution.upgrade_handler.from__2_2_0__to__2_2_1 import from__2_2_0__to__2_2_1
 
 import pytest
 
@@ -130,3 +143,127 @@ def test_version_chain_valid():
         ]
     )
     upgrade_handler.upgrade({}, "1.0.0", "3.0.0")
+
+
+def _iter_values(value):
+    if isinstance(value, dict):
+        yield value
+        for item in value.values():
+            yield from _iter_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _iter_values(item)
+    else:
+        yield value
+
+
+def test_upgrade_components_in_single_pass(monkeypatch):
+    data = orjson.loads(model_path.read_bytes())
+    num_components = len(data["components"])
+    passes = []
+    upgrade_components = upgrade_handler_module._upgrade_components
+
+    def count_passes(data, component_methods):
+        if component_methods:
+            passes.append(len(component_methods))
+        return upgrade_components(data, component_methods)
+
+    monkeypatch.setattr(upgrade_handler_module, "_upgrade_components", count_passes)
+    data = UpgradeHandler().upgrade(data, "2.0.1", "2.2.1")
+
+    assert passes == [3]
+    assert data["data_format_version"] == "2.2.1"
+    assert len(data["components"]) == num_components
+    values = list(_iter_values(data["components"]))
+    assert not any(isinstance(value, str) and value in change_map for value in values)
+    assert not any(
+        isinstance(value, dict) and "fields" in value.get("__metadata__", {}) for value in values
+    )
+
+    # A migration reading the components sees them upgraded by the previous migrations.
+    def document_method(data, from_version, to_version):
+        values = list(_iter_values(data["components"]))
+        assert not any(isinstance(value, str) and value in change_map for value in values)
+        return data
+
+    upgrade_schemas = list(UpgradeHandler().upgrade_schemas)
+    upgrade_schemas[1] = UpgradeSchema(
+        method=document_method, from_version="2.1.2", to_version="2.1.3"
+    )
+    passes.clear()
+    data = orjson.loads(model_path.read_bytes())
+    UpgradeHandler(upgrade_schemas=upgrade_schemas).upgrade(data, "2.0.1", "2.2.1")
+    assert passes == [1, 2]
+
+
+def test_migration_functions_match_single_pass():
+    data = orjson.loads(model_path.read_bytes())
+    for migration, from_version, to_version in [
+        (from__2_0_1__to__2_1_2, "2.0.1", "2.1.2"),
+        (from__2_1_2__to__2_1_3, "2.1.2", "2.1.3"),
+        (from__2_1_3__to__2_1_4, "2.1.3", "2.1.4"),
+        (from__2_1_4__to__2_1_5, "2.1.4", "2.1.5"),
+        (from__2_1_5__to__2_2_0, "2.1.5", "2.2.0"),
+        (from__2_2_0__to__2_2_1, "2.2.0", "2.2.1"),
+    ]:
+        data = migration(data, from_version, to_version)
+
+    fused = UpgradeHandler().upgrade(orjson.loads(model_path.read_bytes()), "2.0.1", "2.2.1")
+    assert data == fused
+    values = list(_iter_values(data["components"]))
+    assert not any(isinstance(value, str) and value in change_map for value in values)
+
+
+def test_upgrade_file_cache(tmp_path, monkeypatch):
+    upgrade_handler = UpgradeHandler()
+    filename = upgrade_handler.upgrade_file(model_path, cache_dir=tmp_path)
+    assert filename.parent == tmp_path
+    system = DistributionSystem.from_json(filename)
+    assert system.data_format_version == orjson.loads(filename.read_bytes())["data_format_version"]
+
+    def fail(*args):
+        raise AssertionError("The cached file should be used.")
+
+    monkeypatch.setattr(UpgradeHandler, "upgrade", fail)
+    assert upgrade_handler.upgrade_file(model_path, cache_dir=tmp_path) == filename
+    monkeypatch.undo()
+
+    upgrade_schemas = list(upgrade_handler.upgrade_schemas)
+    upgrade_schemas[1] = UpgradeSchema(
+        method=lambda data, from_version, to_version: data,
+        from_version="2.1.2",
+        to_version="2.1.3",
+    )
+    new_handler = UpgradeHandler(upgrade_schemas=upgrade_schemas)
+    assert new_handler.upgrade_file(model_path, cache_dir=tmp_path) != filename
+
+
+def test_chain_fingerprint_covers_module_source(tmp_path, monkeypatch):
+    module_file = tmp_path / "custom_migration.py"
+    module_file.write_text(
+        "def _rename(data):\n"
+        "    return data\n\n\n"
+        "def upgrade(data, from_version, to_version):\n"
+        "    return _rename(data)\n"
+    )
+    spec = importlib.util.spec_from_file_location("custom_migration", module_file)
+    custom_migration = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "custom_migration", custom_migration)
+    spec.loader.exec_module(custom_migration)
+
+    def fingerprint():
+        upgrade_schemas = list(UpgradeHandler().upgrade_schemas)
+        upgrade_schemas[1] = UpgradeSchema(
+            method=custom_migration.upgrade, from_version="2.1.2", to_version="2.1.3"
+        )
+        return UpgradeHandler(upgrade_schemas=upgrade_schemas).chain_fingerprint("2.0.1", "2.2.1")
+
+    before = fingerprint()
+    assert fingerprint() == before
+    module_file.write_text(
+        "def _rename(data):\n"
+        "    return {**data, 'renamed': True}\n\n\n"
+        "def upgrade(data, from_version, to_version):\n"
+        "    return _rename(data)\n"
+    )
+    assert fingerprint() != before